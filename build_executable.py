@@ -21,8 +21,8 @@ def build_exe():
         '--onefile',  # Un seul fichier .exe
         '--windowed',  # Pas de console
         '--add-data=database/schema.sql;database',  # Inclure le schéma SQL
+        '--add-data=database/migrations;database/migrations',  # Migrations numérotées
         '--add-data=config.py;.',  # Inclure config.py
-        '--collect-all=escpos',    # Collecter tout escpos (capabilities.json, etc.)
         '--collect-all=reportlab', # Collecter tout reportlab (fonts, etc.)
         '--hidden-import=PyQt5.QtCore',
         '--hidden-import=PyQt5.QtGui',
@@ -40,8 +40,7 @@ def build_exe():
         '--hidden-import=reportlab.lib.enums',
         '--hidden-import=matplotlib',
         '--hidden-import=PIL',
-        '--hidden-import=escpos.printer',
-        '--hidden-import=escpos.escpos',
+        '--hidden-import=serial',
         '--clean',  # Nettoyer avant de construire
         '--add-data=resources;resources',  # Include resources folder
         'main.py'
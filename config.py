@@ -58,6 +58,18 @@ STOCK_CONFIG = {
     "low_stock_threshold": 10,
     "alert_expiry_days": 30,  # Alerte si expiration dans 30 jours
     "auto_decrease_stock": True,  # Décrémenter automatiquement lors de vente
+    "reorder_window_days": 30,  # Fenêtre de calcul des ventes moyennes (réapprovisionnement)
+    "reorder_lead_time_days": 7,  # Délai de livraison fournisseur
+    "reorder_cover_days": 14,  # Jours de stock visés après réception
+    "costing_method": "average",  # Coût des ventes : 'average' (coût moyen pondéré) ou 'fifo'
+}
+
+# Programme de fidélité
+LOYALTY_CONFIG = {
+    "enabled": True,
+    "amount_per_point": 100.0,  # Montant d'achat (DA) pour gagner 1 point
+    "point_value": 1.0,  # Valeur d'un point utilisé (DA de remise)
+    "min_redeem_points": 100,  # Minimum de points par utilisation
 }
 
 # Paramètres d'impression
@@ -66,7 +78,25 @@ PRINTER_CONFIG = {
     "paper_width_mm": 80,  # Pour imprimantes thermiques
     "auto_print": False,  # Imprimer automatiquement après vente
     "print_copies": 1,
-    "thermal_printer_port": "COM1",  # Port série pour imprimante thermique
+    "thermal_printer_port": "COM1",  # Port série, périphérique (/dev/usb/lp0) ou "file:/chemin"
+    "thermal_printer_baudrate": 9600,
+    "thermal_codepage": "cp858",  # Page de code ESC/POS (accents et symbole €)
+    "thermal_print_logo": True,  # Imprimer le logo en tête des tickets thermiques
+    "spooler_max_attempts": 5,  # Tentatives avant abandon d'un ticket en file
+    "spooler_retry_base_seconds": 2,  # Délai avant la 1re nouvelle tentative (doublé ensuite)
+    "spooler_retry_max_seconds": 60,  # Délai maximum entre deux tentatives
+}
+
+# Paramètres de caisse (multi-caisses)
+REGISTER_CONFIG = {
+    "register_number": 1,  # Numéro de cette caisse
+    "offline_queue": True,  # File locale si la base du magasin est verrouillée
+    "queue_dir": DATA_DIR / "queue",
+    "checkout_busy_timeout_ms": 1500,  # Attente max du verrou avant mise en file
+    "sync_interval_seconds": 15,
+    "sync_batch_size": 50,
+    "sync_max_attempts": 10,  # Au-delà, la vente reste en erreur
+    "sequence_block_size": 50,  # Numéros de vente/retour réservés par écriture
 }
 
 # Paramètres de sauvegarde
@@ -121,6 +151,7 @@ PERMISSIONS = {
         "manage_settings",
         "make_sales",
         "process_returns",
+        "close_register",
         "manage_backups",
         "view_audit_log",
         "view_products",
@@ -132,6 +163,7 @@ PERMISSIONS = {
         "view_products",
         "view_customers",
         "process_returns",
+        "close_register",
     ],
 }
 
@@ -180,6 +212,7 @@ def get_config(section):
         "security": SECURITY_CONFIG,
         "stock": STOCK_CONFIG,
         "printer": PRINTER_CONFIG,
+        "register": REGISTER_CONFIG,
         "backup": BACKUP_CONFIG,
         "language": LANGUAGE_CONFIG,
         "log": LOG_CONFIG,
@@ -194,6 +227,7 @@ def update_config(section, key, value):
         "security": SECURITY_CONFIG,
         "stock": STOCK_CONFIG,
         "printer": PRINTER_CONFIG,
+        "register": REGISTER_CONFIG,
         "backup": BACKUP_CONFIG,
         "language": LANGUAGE_CONFIG,
         "ui": UI_CONFIG,
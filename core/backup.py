@@ -10,6 +10,7 @@ from typing import List, Optional, Dict
 import config
 from database.db_manager import db
 from .logger import logger
+from .sequence import sequence_generator
 
 
 class BackupManager:
@@ -124,6 +125,16 @@ class BackupManager:
                 shutil.rmtree(temp_dir)
             
             if success:
+                # Les blocs de numérotation en mémoire concernent l'ancienne base
+                sequence_generator.reset()
+                # Les rapports en cache mémoire aussi
+                from modules.reports.report_cache import report_cache
+                report_cache.clear(persistent=False)
+                # Et les compteurs du tableau de bord
+                from modules.reports.metrics_hub import metrics_hub
+                metrics_hub.reload()
+                from modules.products.alert_scheduler import alert_scheduler
+                alert_scheduler.reset()
                 logger.info(f"Base de données restaurée depuis: {backup_path}")
                 return True, "Restauration réussie"
             else:
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Générateur de numéros séquentiels (ventes, retours, codes clients...)
+
+Les valeurs sont réservées par blocs dans la table sequences : une seule
+écriture en base par bloc, les numéros suivants sont servis depuis la
+mémoire. Deux caisses (ou deux processus) ne reçoivent jamais le même bloc.
+"""
+import sqlite3
+import threading
+from typing import Dict, Callable, Optional
+import config
+from database.db_manager import db
+from .logger import logger
+
+# Attente par défaut du verrou lors d'une réservation (comme la connexion principale)
+DEFAULT_BUSY_TIMEOUT_MS = 10000
+
+
+class SequenceGenerator:
+    """Séquences monotones préallouées par blocs"""
+
+    def __init__(self, block_size: int = None):
+        self.block_size = block_size or config.REGISTER_CONFIG.get("sequence_block_size", 50)
+        # name -> [prochaine valeur, fin du bloc (exclue)]
+        self._blocks: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Connexion dédiée aux réservations de blocs
+
+        Indépendante de la connexion du thread appelant : une réservation est
+        validée immédiatement et n'est jamais annulée avec la transaction de
+        l'appelant (sinon un bloc déjà servi pourrait être réattribué).
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                db.db_path,
+                check_same_thread=False,
+                timeout=DEFAULT_BUSY_TIMEOUT_MS / 1000.0,
+                isolation_level=None
+            )
+        return self._connection
+
+    def next_value(self, name: str, block_size: int = None,
+                   seed: Optional[Callable[[], int]] = None,
+                   busy_timeout_ms: int = None) -> int:
+        """
+        Obtenir la prochaine valeur d'une séquence
+
+        Args:
+            name: Nom de la séquence (ex: 'sale:1' pour la caisse 1)
+            block_size: Taille des blocs réservés (défaut: configuration)
+            seed: Fonction donnant la première valeur lors de la création
+                  de la séquence (reprise des numéros existants)
+            busy_timeout_ms: Attente max du verrou si un bloc doit être
+                             réservé (défaut: DEFAULT_BUSY_TIMEOUT_MS)
+
+        Returns:
+            Valeur suivante (strictement croissante pour ce processus)
+
+        Raises:
+            sqlite3.OperationalError: Base verrouillée lors d'une réservation
+        """
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                start = self._reserve_block(name, block_size or self.block_size, seed,
+                                            busy_timeout_ms)
+                block = [start, start + (block_size or self.block_size)]
+                self._blocks[name] = block
+
+            value = block[0]
+            block[0] += 1
+            return value
+
+    def _reserve_block(self, name: str, size: int,
+                       seed: Optional[Callable[[], int]],
+                       busy_timeout_ms: int = None) -> int:
+        """Réserver [start, start + size) dans la table sequences"""
+        conn = self._get_connection()
+        if busy_timeout_ms is None:
+            busy_timeout_ms = DEFAULT_BUSY_TIMEOUT_MS
+        conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT next_value FROM sequences WHERE name = ?", (name,)
+            ).fetchone()
+
+            if row is None:
+                start = max(int(seed() if seed else 1), 1)
+                conn.execute(
+                    "INSERT INTO sequences (name, next_value) VALUES (?, ?)",
+                    (name, start + size)
+                )
+            else:
+                start = row[0]
+                conn.execute(
+                    "UPDATE sequences SET next_value = ?, updated_at = CURRENT_TIMESTAMP WHERE name = ?",
+                    (start + size, name)
+                )
+
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.debug(f"Séquence {name}: bloc {start}-{start + size - 1} réservé")
+        return start
+
+    def reset(self):
+        """Oublier les blocs en mémoire (après restauration de la base)"""
+        with self._lock:
+            self._blocks.clear()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# Instance globale
+sequence_generator = SequenceGenerator()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Mesure des temps de démarrage
+
+Chaque étape (imports, base de données, connexion, fenêtre principale...)
+est marquée au fil du démarrage ; le rapport est écrit dans le journal une
+fois la caisse prête à scanner.
+"""
+import time
+from typing import List, Tuple
+from .logger import logger
+
+
+class StartupTimer:
+    """Chronométrage des étapes du démarrage"""
+
+    def __init__(self):
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._steps: List[Tuple[str, float]] = []
+
+    def restart(self):
+        """Repartir de zéro (nouvelle connexion après déconnexion)"""
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._steps = []
+
+    def mark(self, step: str):
+        """Terminer une étape (durée depuis la marque précédente)"""
+        now = time.perf_counter()
+        self._steps.append((step, (now - self._last) * 1000))
+        self._last = now
+
+    def elapsed_ms(self) -> float:
+        """Temps écoulé depuis le début (ms)"""
+        return (time.perf_counter() - self._start) * 1000
+
+    def report(self, title: str = "Démarrage"):
+        """Écrire le détail des étapes dans le journal"""
+        details = ", ".join(f"{step}: {duration:.0f} ms" for step, duration in self._steps)
+        logger.info(f"{title} en {self.elapsed_ms():.0f} ms ({details})")
+
+
+# Instance globale (démarre à l'import, au lancement de l'application)
+startup_timer = StartupTimer()
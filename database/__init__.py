@@ -3,5 +3,6 @@
 Package de gestion de la base de données
 """
 from .db_manager import DatabaseManager
+from .records import Record, ProductRow, CustomerRow
 
-__all__ = ['DatabaseManager']
+__all__ = ['DatabaseManager', 'Record', 'ProductRow', 'CustomerRow']
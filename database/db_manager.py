@@ -6,7 +6,7 @@ Singleton pattern pour une seule instance de connexion
 import sqlite3
 import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 import config
 
 
@@ -56,93 +56,54 @@ class DatabaseManager:
             
         return self._local.connection
     
+    def get_read_connection(self) -> sqlite3.Connection:
+        """
+        Obtenir la connexion de lecture du thread (lecture seule)
+        
+        Séparée de la connexion principale : un parcours en cours n'est
+        touché ni par les transactions ni par les commit/rollback de ce thread.
+        """
+        if getattr(self._local, 'read_connection', None) is None:
+            self._local.read_connection = sqlite3.connect(
+                f"{Path(self.db_path).resolve().as_uri()}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+                timeout=10.0
+            )
+            self._local.read_connection.row_factory = sqlite3.Row
+        return self._local.read_connection
+    
     def initialize_database(self):
-        """Initialiser la base de données avec le schéma"""
+        """
+        Initialiser la base de données (migrations en attente uniquement)
+        
+        Une base à jour (PRAGMA user_version) ne rejoue rien.
+        """
         # Créer le dossier data s'il n'existe pas
         config.DATA_DIR.mkdir(exist_ok=True)
         
-        # Lire le schéma SQL
-        schema_path = Path(__file__).parent / "schema.sql"
-        
-        if not schema_path.exists():
-            raise FileNotFoundError(f"Fichier de schéma introuvable: {schema_path}")
+        self.run_migrations()
+    
+    def run_migrations(self) -> List[int]:
+        """
+        Appliquer les migrations de schéma en attente (une seule transaction)
         
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            schema_sql = f.read()
+        Returns:
+            Versions appliquées
+        """
+        from .migrator import migrator
         
-        # Exécuter le schéma
         conn = self.get_connection()
         try:
-            conn.executescript(schema_sql)
-            conn.commit()
-            print("✓ Base de données initialisée avec succès")
-            
-            # Run migrations for existing databases
-            self._run_migrations(conn)
-        except sqlite3.Error as e:
-            print(f"✗ Erreur lors de l'initialisation de la base de données: {e}")
+            applied = migrator.migrate(conn)
+        except (sqlite3.Error, OSError, RuntimeError) as e:
+            print(f"✗ Erreur lors de la migration de la base de données: {e}")
             raise
-    
-    def _run_migrations(self, conn):
-        """Run migrations for existing databases to add missing columns"""
-        try:
-            cursor = conn.cursor()
-            
-            # Check and add total_purchases to suppliers if missing
-            cursor.execute("PRAGMA table_info(suppliers)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'total_purchases' not in columns:
-                cursor.execute("ALTER TABLE suppliers ADD COLUMN total_purchases REAL DEFAULT 0.0")
-                print("✓ Migration: Ajout colonne total_purchases à suppliers")
-                
-            if 'total_debt' not in columns:
-                cursor.execute("ALTER TABLE suppliers ADD COLUMN total_debt REAL DEFAULT 0.0")
-                print("✓ Migration: Ajout colonne total_debt à suppliers")
-                
-            # Check and add total_purchases to customers if missing
-            cursor.execute("PRAGMA table_info(customers)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'total_purchases' not in columns:
-                cursor.execute("ALTER TABLE customers ADD COLUMN total_purchases REAL DEFAULT 0.0")
-                print("✓ Migration: Ajout colonne total_purchases à customers")
-            
-            # Create user_permissions table if not exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_permissions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    permission_key TEXT NOT NULL,
-                    is_granted INTEGER DEFAULT 1,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                    UNIQUE(user_id, permission_key)
-                )
-            """)
-            print("✓ Migration: Vérification table user_permissions")
-
-            # Check and add supplier_id to products if missing
-            cursor.execute("PRAGMA table_info(products)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'supplier_id' not in columns:
-                cursor.execute("ALTER TABLE products ADD COLUMN supplier_id INTEGER REFERENCES suppliers(id) ON DELETE SET NULL")
-                print("✓ Migration: Ajout colonne supplier_id à products")
-            
-            # Create license table if not exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS license (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    license_key TEXT NOT NULL,
-                    machine_id TEXT,
-                    activation_date TEXT
-                )
-            """)
-            print("✓ Migration: Verification table license")
-            
-            conn.commit()
-        except sqlite3.Error as e:
-            print(f"⚠ Migration warning: {e}")
+        
+        if applied:
+            print(f"✓ Base de données migrée vers la version {applied[-1]} "
+                  f"(migration(s) {', '.join(str(v) for v in applied)})")
+        return applied
     
     def execute_query(self, query: str, params: tuple = ()) -> List[sqlite3.Row]:
         """
@@ -166,6 +127,140 @@ class DatabaseManager:
             print(f"Paramètres: {params}")
             raise
     
+    def iter_records(self, record_type: type, query: str, params: tuple = ()) -> Iterator[Any]:
+        """
+        Parcourir les résultats d'une requête sous forme d'enregistrements à slots
+        
+        Les lignes sont converties une à une au fil du curseur (pas de
+        sqlite3.Row ni de dict intermédiaire).
+        
+        Args:
+            record_type: Classe dérivée de database.records.Record
+            query: Requête SQL (colonnes dans l'ordre de record_type.__slots__)
+            params: Paramètres de la requête
+        
+        Yields:
+            Un enregistrement par ligne
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = record_type.from_row
+        try:
+            cursor.execute(query, params)
+        except sqlite3.Error as e:
+            print(f"Erreur lors de l'exécution de la requête: {e}")
+            print(f"Requête: {query}")
+            print(f"Paramètres: {params}")
+            raise
+        record_type.check_columns(cursor.description)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+    
+    def iter_query(self, query: str, params: tuple = (), chunk_size: int = 500) -> Iterator[sqlite3.Row]:
+        """
+        Parcourir les résultats d'une requête par lots (fetchmany)
+        
+        Seul un lot est en mémoire à la fois. Le parcours tient un verrou de
+        lecture jusqu'à la fin : pour une grosse table pendant la vente,
+        préférer iter_keyset (une requête courte par page).
+        
+        Args:
+            query: Requête SQL
+            params: Paramètres de la requête
+            chunk_size: Nombre de lignes lues par lot
+            
+        Yields:
+            Une ligne par résultat
+        """
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+        except sqlite3.Error as e:
+            cursor.close()
+            print(f"Erreur lors de l'exécution de la requête: {e}")
+            print(f"Requête: {query}")
+            print(f"Paramètres: {params}")
+            raise
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+    
+    def fetch_page(self, table: str, columns: str = "*", after=None,
+                   where: str = "", params: tuple = (), limit: int = 1000,
+                   key: str = "id") -> List[sqlite3.Row]:
+        """
+        Lire une page par clé (WHERE id > ? ORDER BY id LIMIT ?)
+        
+        Contrairement à OFFSET, le coût d'une page ne dépend pas de sa
+        position : SQLite reprend directement l'index à la clé donnée.
+        
+        Args:
+            table: Table (ou nom de table suivi d'un alias)
+            columns: Colonnes sélectionnées (doivent inclure la clé)
+            after: Clé de la dernière ligne de la page précédente (None : début)
+            where: Condition supplémentaire
+            params: Paramètres de la condition
+            limit: Taille de la page
+            key: Colonne de pagination (unique et indexée)
+            
+        Returns:
+            Lignes de la page, par clé croissante
+        """
+        conditions = []
+        values = []
+        if after is not None:
+            conditions.append(f"{key} > ?")
+            values.append(after)
+        if where:
+            conditions.append(f"({where})")
+            values.extend(params)
+        
+        query = f"SELECT {columns} FROM {table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {key} LIMIT ?"
+        values.append(int(limit))
+        
+        conn = self.get_read_connection()
+        try:
+            return conn.execute(query, tuple(values)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Erreur lors de la lecture paginée: {e}")
+            print(f"Requête: {query}")
+            raise
+    
+    def iter_keyset(self, table: str, columns: str = "*", where: str = "",
+                    params: tuple = (), page_size: int = 1000,
+                    key: str = "id") -> Iterator[sqlite3.Row]:
+        """
+        Parcourir toute une table page par page (pagination par clé)
+        
+        Aucun verrou n'est tenu entre deux pages : les ventes continuent
+        pendant un export ou un archivage de millions de lignes.
+        
+        Args:
+            Voir fetch_page
+            
+        Yields:
+            Une ligne par résultat, par clé croissante
+        """
+        column = key.split('.')[-1]
+        after = None
+        while True:
+            rows = self.fetch_page(table, columns, after, where, params, page_size, key)
+            yield from rows
+            if len(rows) < page_size:
+                break
+            after = rows[-1][column]
+    
     def execute_update(self, query: str, params: tuple = ()) -> int:
         """
         Exécuter une requête INSERT, UPDATE ou DELETE
@@ -181,10 +276,10 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
+            self._autocommit(conn)
             return cursor.rowcount
         except sqlite3.Error as e:
-            conn.rollback()
+            self._autorollback(conn)
             print(f"Erreur lors de l'exécution de la mise à jour: {e}")
             print(f"Requête: {query}")
             print(f"Paramètres: {params}")
@@ -205,10 +300,10 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             cursor.execute(query, params)
-            conn.commit()
+            self._autocommit(conn)
             return cursor.lastrowid
         except sqlite3.Error as e:
-            conn.rollback()
+            self._autorollback(conn)
             print(f"Erreur lors de l'insertion: {e}")
             print(f"Requête: {query}")
             print(f"Paramètres: {params}")
@@ -229,28 +324,99 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             cursor.executemany(query, params_list)
-            conn.commit()
+            self._autocommit(conn)
             return cursor.rowcount
         except sqlite3.Error as e:
-            conn.rollback()
+            self._autorollback(conn)
             print(f"Erreur lors de l'exécution multiple: {e}")
             raise
     
     def begin_transaction(self):
-        """Démarrer une transaction explicite"""
+        """
+        Démarrer une transaction explicite
+        
+        Seule la transaction la plus externe émet BEGIN ; un appel imbriqué
+        ouvre un SAVEPOINT, que rollback() annule sans toucher au travail
+        de la transaction externe. execute_update/execute_insert/execute_many
+        ne valident plus automatiquement tant qu'une transaction est ouverte.
+        """
         conn = self.get_connection()
-        conn.execute("BEGIN TRANSACTION")
+        depth = getattr(self._local, 'transaction_depth', 0)
+        if depth == 0:
+            conn.execute("BEGIN TRANSACTION")
+        else:
+            conn.execute(f"SAVEPOINT sp_{depth}")
+        self._local.transaction_depth = depth + 1
     
     def commit(self):
-        """Valider la transaction en cours"""
+        """Valider la transaction en cours (libérer le savepoint si imbriquée)"""
         conn = self.get_connection()
+        depth = getattr(self._local, 'transaction_depth', 0)
+        if depth > 1:
+            # Transaction imbriquée : la transaction externe validera
+            conn.execute(f"RELEASE SAVEPOINT sp_{depth - 1}")
+            self._local.transaction_depth = depth - 1
+            return
+        self._local.transaction_depth = 0
         conn.commit()
     
     def rollback(self):
-        """Annuler la transaction en cours"""
+        """Annuler la transaction en cours (jusqu'au savepoint si imbriquée)"""
         conn = self.get_connection()
+        depth = getattr(self._local, 'transaction_depth', 0)
+        if depth > 1:
+            conn.execute(f"ROLLBACK TO SAVEPOINT sp_{depth - 1}")
+            conn.execute(f"RELEASE SAVEPOINT sp_{depth - 1}")
+            self._local.transaction_depth = depth - 1
+            return
+        self._local.transaction_depth = 0
         conn.rollback()
     
+    def in_transaction(self) -> bool:
+        """Indiquer si une transaction explicite est ouverte sur ce thread"""
+        return getattr(self._local, 'transaction_depth', 0) > 0
+    
+    def _autocommit(self, conn: sqlite3.Connection):
+        """Valider immédiatement, sauf à l'intérieur d'une transaction explicite"""
+        if not self.in_transaction():
+            conn.commit()
+    
+    def _autorollback(self, conn: sqlite3.Connection):
+        """Annuler l'instruction en échec, sauf à l'intérieur d'une transaction explicite"""
+        if not self.in_transaction():
+            conn.rollback()
+    
+    def set_busy_timeout(self, milliseconds: int) -> int:
+        """
+        Modifier l'attente maximale d'un verrou pour la connexion de ce thread
+        
+        Args:
+            milliseconds: Nouvelle attente en millisecondes
+            
+        Returns:
+            Ancienne valeur (pour restauration)
+        """
+        conn = self.get_connection()
+        previous = conn.execute("PRAGMA busy_timeout").fetchone()[0]
+        conn.execute(f"PRAGMA busy_timeout = {int(milliseconds)}")
+        return previous
+    
+    @staticmethod
+    def is_busy_error(error: Exception) -> bool:
+        """
+        Vérifier qu'une erreur SQLite vient d'un verrou (SQLITE_BUSY/LOCKED)
+        
+        Les autres OperationalError (table absente, disque plein...) ne se
+        résolvent pas en réessayant plus tard.
+        """
+        if not isinstance(error, sqlite3.OperationalError):
+            return False
+        code = getattr(error, 'sqlite_errorcode', None)
+        if code is not None:
+            return code & 0xFF in (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED
+        message = str(error).lower()
+        return 'locked' in message or 'busy' in message
+    
     def fetch_one(self, query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
         """
         Exécuter une requête et retourner une seule ligne
@@ -307,6 +473,10 @@ class DatabaseManager:
         if hasattr(self._local, 'connection') and self._local.connection:
             self._local.connection.close()
             self._local.connection = None
+        if getattr(self._local, 'read_connection', None) is not None:
+            self._local.read_connection.close()
+            self._local.read_connection = None
+        self._local.transaction_depth = 0
     
     def vacuum(self):
         """Optimiser la base de données (récupérer l'espace)"""
@@ -325,10 +495,14 @@ class DatabaseManager:
             return self.db_path.stat().st_size
         return 0
     
-    def get_database_info(self) -> Dict[str, Any]:
+    def get_database_info(self, with_counts: bool = True) -> Dict[str, Any]:
         """
         Obtenir des informations sur la base de données
         
+        Args:
+            with_counts: Compter les enregistrements de chaque table
+                         (un parcours par table : à éviter au démarrage)
+        
         Returns:
             Dictionnaire avec les informations
         """
@@ -344,7 +518,7 @@ class DatabaseManager:
         
         # Compter les enregistrements par table
         table_counts = {}
-        for table in tables:
+        for table in tables if with_counts else []:
             count_query = f"SELECT COUNT(*) as count FROM {table}"
             result = self.fetch_one(count_query)
             table_counts[table] = result['count'] if result else 0
@@ -408,6 +582,9 @@ class DatabaseManager:
             # Réinitialiser la connexion
             self._local.connection = None
             
+            # Une sauvegarde ancienne peut avoir des migrations en retard
+            self.run_migrations()
+            
             print(f"✓ Base de données restaurée depuis: {backup_path}")
             return True
             
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 2 : mises à niveau des bases antérieures au suivi de version
+
+Colonnes ajoutées après coup, tables des permissions et de la licence,
+stock d'ouverture du journal des mouvements.
+"""
+import sqlite3
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Appliquer la migration (dans la transaction du moteur)"""
+    columns = _columns(conn, 'suppliers')
+    if 'total_purchases' not in columns:
+        conn.execute("ALTER TABLE suppliers ADD COLUMN total_purchases REAL DEFAULT 0.0")
+    if 'total_debt' not in columns:
+        conn.execute("ALTER TABLE suppliers ADD COLUMN total_debt REAL DEFAULT 0.0")
+
+    if 'total_purchases' not in _columns(conn, 'customers'):
+        conn.execute("ALTER TABLE customers ADD COLUMN total_purchases REAL DEFAULT 0.0")
+
+    if 'supplier_id' not in _columns(conn, 'products'):
+        conn.execute("ALTER TABLE products ADD COLUMN supplier_id INTEGER REFERENCES suppliers(id) ON DELETE SET NULL")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_permissions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            permission_key TEXT NOT NULL,
+            is_granted INTEGER DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            UNIQUE(user_id, permission_key)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS license (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            license_key TEXT NOT NULL,
+            machine_id TEXT,
+            activation_date TEXT
+        )
+    """)
+
+    # Stock d'ouverture du journal des mouvements (bases existantes)
+    if conn.execute("SELECT COUNT(*) FROM stock_movements").fetchone()[0] == 0:
+        conn.execute("""
+            INSERT INTO stock_movements (product_id, movement_type, quantity, notes)
+            SELECT id, 'adjustment', stock_quantity, 'Stock initial'
+            FROM products
+            WHERE stock_quantity != 0
+        """)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 3 : index de recherche des clients
+
+- index sur le téléphone normalisé (chiffres seuls) pour la recherche par
+  préfixe ;
+- index plein texte FTS5 sur le nom (préfixe de chaque mot, sans accents),
+  tenu à jour par triggers. Sans FTS5 (SQLite compilé sans le module), la
+  recherche par nom retombe sur idx_customers_name.
+"""
+import sqlite3
+
+# Expression identique à PHONE_DIGITS_SQL (customer_manager) : SQLite
+# n'utilise un index d'expression que pour la même expression
+PHONE_DIGITS_SQL = (
+    "replace(replace(replace(replace(replace(replace(replace("
+    "phone, ' ', ''), '-', ''), '.', ''), '/', ''), '+', ''), '(', ''), ')', '')"
+)
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Appliquer la migration (dans la transaction du moteur)"""
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_customers_phone_digits ON customers({PHONE_DIGITS_SQL})")
+
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+                full_name,
+                content='customers',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        return
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS customers_fts_insert
+        AFTER INSERT ON customers
+        BEGIN
+            INSERT INTO customers_fts(rowid, full_name) VALUES (new.id, new.full_name);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS customers_fts_delete
+        AFTER DELETE ON customers
+        BEGIN
+            INSERT INTO customers_fts(customers_fts, rowid, full_name)
+            VALUES ('delete', old.id, old.full_name);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS customers_fts_update
+        AFTER UPDATE OF full_name ON customers
+        BEGIN
+            INSERT INTO customers_fts(customers_fts, rowid, full_name)
+            VALUES ('delete', old.id, old.full_name);
+            INSERT INTO customers_fts(rowid, full_name) VALUES (new.id, new.full_name);
+        END
+    """)
+    conn.execute("INSERT INTO customers_fts(customers_fts) VALUES ('rebuild')")
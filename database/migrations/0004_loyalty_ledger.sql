@@ -0,0 +1,24 @@
+-- Migration 4 : journal des points de fidélité
+--
+-- customers.loyalty_points est la somme des points du journal ; chaque
+-- gain (vente), utilisation ou reprise (annulation, retour) y est inscrit.
+
+CREATE TABLE IF NOT EXISTS loyalty_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_id INTEGER NOT NULL,
+    transaction_type TEXT CHECK(transaction_type IN ('earn', 'redeem', 'reversal', 'adjustment')),
+    
+    points INTEGER NOT NULL,  -- Positif : gain, négatif : utilisation/reprise
+    sale_id INTEGER,  -- Vente à l'origine du mouvement
+    
+    processed_by INTEGER,
+    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    
+    FOREIGN KEY (customer_id) REFERENCES customers(id) ON DELETE CASCADE,
+    FOREIGN KEY (sale_id) REFERENCES sales(id) ON DELETE SET NULL,
+    FOREIGN KEY (processed_by) REFERENCES users(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_loyalty_customer ON loyalty_transactions(customer_id, transaction_date);
+CREATE INDEX IF NOT EXISTS idx_loyalty_sale ON loyalty_transactions(sale_id);
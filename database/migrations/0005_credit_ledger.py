@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 5 : soldes courants et ancienneté du crédit client
+
+- balance_after : dette du client après chaque mouvement ;
+- open_amount : part encore impayée d'un mouvement qui a augmenté la dette
+  (les paiements soldent les dettes les plus anciennes en premier).
+  L'ancienneté des dettes se lit alors dans les seuls mouvements ouverts
+  (index partiel), sans relire l'historique.
+
+Sens des montants : credit_sale et payment sont positifs (le type donne le
+sens) ; adjustment est signé (négatif : la dette diminue).
+"""
+import sqlite3
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _change(transaction_type: str, amount: float) -> float:
+    """Variation de la dette d'un mouvement"""
+    if transaction_type == 'payment':
+        return -abs(amount)
+    if transaction_type == 'credit_sale':
+        return abs(amount)
+    return amount
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Appliquer la migration (dans la transaction du moteur)"""
+    columns = _columns(conn, 'customer_credit_transactions')
+    if 'balance_after' not in columns:
+        conn.execute("ALTER TABLE customer_credit_transactions ADD COLUMN balance_after REAL")
+    if 'open_amount' not in columns:
+        conn.execute("ALTER TABLE customer_credit_transactions ADD COLUMN open_amount REAL DEFAULT 0.0")
+
+    # Reprise de l'historique : soldes courants dans l'ordre des mouvements,
+    # puis dette actuelle répartie sur les mouvements les plus récents
+    debts = {row[0]: row[1] or 0.0 for row in conn.execute("SELECT id, current_credit FROM customers")}
+    rows = conn.execute("""
+        SELECT id, customer_id, transaction_type, amount
+        FROM customer_credit_transactions
+        ORDER BY customer_id, transaction_date, id
+    """).fetchall()
+
+    updates = []
+    by_customer = {}
+    for transaction_id, customer_id, transaction_type, amount in rows:
+        by_customer.setdefault(customer_id, []).append((transaction_id, _change(transaction_type, amount or 0.0)))
+
+    for customer_id, movements in by_customer.items():
+        balance = 0.0
+        balances = []
+        for transaction_id, change in movements:
+            balance = round(balance + change, 2)
+            balances.append(balance)
+
+        remaining = max(debts.get(customer_id, 0.0), 0.0)
+        open_amounts = [0.0] * len(movements)
+        for index in range(len(movements) - 1, -1, -1):
+            change = movements[index][1]
+            if remaining <= 0:
+                break
+            if change > 0:
+                open_amounts[index] = round(min(change, remaining), 2)
+                remaining = round(remaining - open_amounts[index], 2)
+
+        for (transaction_id, _), balance_after, open_amount in zip(movements, balances, open_amounts):
+            updates.append((balance_after, open_amount, transaction_id))
+
+    conn.executemany(
+        "UPDATE customer_credit_transactions SET balance_after = ?, open_amount = ? WHERE id = ?",
+        updates
+    )
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_credit_open
+        ON customer_credit_transactions(customer_id, transaction_date)
+        WHERE open_amount > 0
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_credit_history
+        ON customer_credit_transactions(customer_id, transaction_date, id)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customers_with_credit
+        ON customers(current_credit)
+        WHERE current_credit > 0
+    """)
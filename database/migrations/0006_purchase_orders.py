@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 6 : bons de commande fournisseur et réception de marchandises
+
+- purchase_orders / purchase_order_items : commande et ses lignes
+  (quantité commandée, quantité déjà reçue, coût unitaire) ;
+- products.average_cost : coût moyen pondéré du stock, recalculé à chaque
+  réception (repris du prix d'achat pour les produits existants).
+"""
+import sqlite3
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Appliquer la migration (dans la transaction du moteur)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS purchase_orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_number TEXT UNIQUE NOT NULL,
+            supplier_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'ordered' CHECK(status IN ('ordered', 'partial', 'received', 'cancelled')),
+
+            total_amount REAL DEFAULT 0.0,  -- Montant commandé
+            received_amount REAL DEFAULT 0.0,  -- Montant déjà réceptionné
+
+            created_by INTEGER,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            received_date TIMESTAMP,  -- Dernière réception
+            notes TEXT,
+
+            FOREIGN KEY (supplier_id) REFERENCES suppliers(id) ON DELETE CASCADE,
+            FOREIGN KEY (created_by) REFERENCES users(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS purchase_order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+
+            quantity_ordered REAL NOT NULL,
+            quantity_received REAL DEFAULT 0,
+            unit_cost REAL NOT NULL,
+
+            FOREIGN KEY (order_id) REFERENCES purchase_orders(id) ON DELETE CASCADE,
+            FOREIGN KEY (product_id) REFERENCES products(id)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_purchase_orders_supplier
+        ON purchase_orders(supplier_id, order_date)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_purchase_orders_open
+        ON purchase_orders(order_date)
+        WHERE status IN ('ordered', 'partial')
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchase_order_items_order ON purchase_order_items(order_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchase_order_items_product ON purchase_order_items(product_id)")
+
+    if 'average_cost' not in _columns(conn, 'products'):
+        conn.execute("ALTER TABLE products ADD COLUMN average_cost REAL")
+    conn.execute("UPDATE products SET average_cost = purchase_price WHERE average_cost IS NULL")
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 7 : couches de coût du stock (coût moyen pondéré / FIFO)
+
+- cost_layers : une couche par entrée en stock (réception, retour,
+  ajustement), avec la quantité encore en stock ; index partiel sur les
+  seules couches ouvertes ;
+- stock_movements.unit_cost : coût unitaire de chaque mouvement ;
+- reprise : le stock existant forme une couche d'ouverture au coût moyen
+  (à défaut, au prix d'achat).
+"""
+import sqlite3
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Appliquer la migration (dans la transaction du moteur)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cost_layers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            source_type TEXT NOT NULL,  -- opening, restock, return, cancel, adjustment
+            source_id INTEGER,
+
+            unit_cost REAL NOT NULL,
+            quantity REAL NOT NULL,  -- Quantité entrée
+            quantity_remaining REAL NOT NULL,  -- Quantité encore en stock
+
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+            FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cost_layers_open
+        ON cost_layers(product_id, id)
+        WHERE quantity_remaining > 0
+    """)
+
+    if 'unit_cost' not in _columns(conn, 'stock_movements'):
+        conn.execute("ALTER TABLE stock_movements ADD COLUMN unit_cost REAL")
+
+    conn.execute("UPDATE products SET average_cost = purchase_price WHERE average_cost IS NULL")
+    conn.execute("""
+        INSERT INTO cost_layers (product_id, source_type, unit_cost, quantity, quantity_remaining)
+        SELECT id, 'opening', COALESCE(average_cost, purchase_price, 0), stock_quantity, stock_quantity
+        FROM products
+        WHERE stock_quantity > 0
+          AND NOT EXISTS (SELECT 1 FROM cost_layers cl WHERE cl.product_id = products.id)
+    """)
@@ -0,0 +1,42 @@
+-- Migration 8 : triggers d'horodatage et historique des prix
+--
+-- updated_at est positionné par l'application dans la même instruction
+-- UPDATE ; les triggers ne font plus qu'un rattrapage, limité aux colonnes
+-- de fiche : les mises à jour de stock, de coût ou de statistiques (à
+-- chaque vente) ne déclenchent plus de second UPDATE.
+--
+-- L'historique des prix est écrit par l'application (changed_by, raison),
+-- par lots, dans la transaction de la modification : le trigger
+-- track_price_changes, ligne à ligne et sans auteur, est supprimé.
+
+DROP TRIGGER IF EXISTS track_price_changes;
+
+DROP TRIGGER IF EXISTS update_products_timestamp;
+CREATE TRIGGER IF NOT EXISTS update_products_timestamp
+AFTER UPDATE OF barcode, name, name_ar, description, category_id,
+                purchase_price, selling_price, discount_percentage, is_on_promotion,
+                min_stock_level, unit, expiry_date, manufacturing_date,
+                supplier_id, is_active
+ON products
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE products SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+DROP TRIGGER IF EXISTS update_customers_timestamp;
+CREATE TRIGGER IF NOT EXISTS update_customers_timestamp
+AFTER UPDATE OF code, full_name, phone, email, address, credit_limit, is_active, notes
+ON customers
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE customers SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
+
+DROP TRIGGER IF EXISTS update_suppliers_timestamp;
+CREATE TRIGGER IF NOT EXISTS update_suppliers_timestamp
+AFTER UPDATE OF code, company_name, contact_person, phone, email, address, is_active, notes
+ON suppliers
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE suppliers SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+END;
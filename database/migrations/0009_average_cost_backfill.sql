@@ -0,0 +1,8 @@
+-- Migration 9 : coût moyen renseigné pour tous les produits
+--
+-- Les produits créés ou réactivés depuis la migration 7 n'avaient pas de
+-- coût moyen : la valorisation retombait sur le prix d'achat du moment,
+-- même modifié après l'entrée en stock. average_cost est désormais écrit
+-- à la création ; les lignes restantes sont reprises au prix d'achat.
+
+UPDATE products SET average_cost = COALESCE(purchase_price, 0) WHERE average_cost IS NULL;
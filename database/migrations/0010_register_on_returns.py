@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Migration 10 : caisse qui traite les retours et les annulations
+
+- returns.register_number : caisse qui a remboursé le retour (reprise : la
+  caisse de la vente d'origine) ;
+- sales.cancelled_register / cancelled_at : caisse et heure de
+  l'annulation. Le remboursement sort du tiroir de cette caisse, même
+  pour une vente d'une session précédente ou d'une autre caisse.
+"""
+import sqlite3
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Appliquer la migration (dans la transaction du moteur)"""
+    if 'register_number' not in _columns(conn, 'returns'):
+        conn.execute("ALTER TABLE returns ADD COLUMN register_number INTEGER")
+    conn.execute("""
+        UPDATE returns SET register_number = (
+            SELECT s.register_number FROM sales s WHERE s.id = returns.original_sale_id
+        )
+        WHERE register_number IS NULL
+    """)
+
+    sales_columns = _columns(conn, 'sales')
+    if 'cancelled_register' not in sales_columns:
+        conn.execute("ALTER TABLE sales ADD COLUMN cancelled_register INTEGER")
+    if 'cancelled_at' not in sales_columns:
+        conn.execute("ALTER TABLE sales ADD COLUMN cancelled_at TIMESTAMP")
+    # Annulations anciennes : heure inconnue, déjà réglées par les clôtures passées
+    conn.execute("""
+        UPDATE sales SET cancelled_register = register_number
+        WHERE status = 'cancelled' AND cancelled_register IS NULL
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sales_cancelled
+        ON sales(cancelled_register, cancelled_at)
+        WHERE cancelled_at IS NOT NULL
+    """)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Migrations versionnées du schéma
+
+La version de la base est tenue dans PRAGMA user_version :
+- version 1 : schema.sql (schéma de référence) ;
+- versions suivantes : fichiers database/migrations/NNNN_description.sql
+  ou .py (fonction upgrade(conn)), numérotés à la suite.
+
+Au démarrage, seules les migrations en attente sont appliquées, toutes dans
+une seule transaction ; une base à jour ne lit aucun script. Toute
+modification du schéma s'ajoute en nouveau fichier numéroté (schema.sql
+n'est plus rejoué sur les bases existantes).
+"""
+import re
+import sqlite3
+import importlib.util
+from pathlib import Path
+from typing import List, Tuple, Iterator
+
+SCHEMA_PATH = Path(__file__).parent / "schema.sql"
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+_MIGRATION_NAME = re.compile(r"^(\d{4})_\w+\.(sql|py)$")
+
+
+def split_statements(script: str) -> Iterator[str]:
+    """Découper un script SQL en instructions (triggers compris)"""
+    buffer = ""
+    for line in script.splitlines(keepends=True):
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            yield buffer
+            buffer = ""
+    if buffer.strip():
+        yield buffer
+
+
+class Migrator:
+    """Application des migrations en attente"""
+
+    def __init__(self, schema_path: Path = SCHEMA_PATH, migrations_dir: Path = MIGRATIONS_DIR):
+        self.schema_path = schema_path
+        self.migrations_dir = migrations_dir
+
+    def get_migrations(self) -> List[Tuple[int, Path]]:
+        """
+        Migrations connues, par version croissante
+
+        Returns:
+            Liste de (version, chemin)
+        """
+        migrations = [(1, self.schema_path)]
+        if self.migrations_dir.exists():
+            for path in self.migrations_dir.iterdir():
+                match = _MIGRATION_NAME.match(path.name)
+                if match:
+                    migrations.append((int(match.group(1)), path))
+        migrations.sort()
+
+        versions = [version for version, _ in migrations]
+        if versions != list(range(1, len(versions) + 1)):
+            raise RuntimeError(f"Numérotation des migrations incohérente: {versions}")
+        return migrations
+
+    def get_version(self, conn: sqlite3.Connection) -> int:
+        """Version courante de la base"""
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def latest_version(self) -> int:
+        """Version la plus récente disponible"""
+        return len(self.get_migrations())
+
+    def _apply(self, conn: sqlite3.Connection, path: Path):
+        """Appliquer une migration (sans valider)"""
+        if path.suffix == '.sql':
+            script = path.read_text(encoding='utf-8')
+            for statement in split_statements(script):
+                conn.execute(statement)
+        else:
+            spec = importlib.util.spec_from_file_location(f"migration_{path.stem}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            module.upgrade(conn)
+
+    def migrate(self, conn: sqlite3.Connection) -> List[int]:
+        """
+        Appliquer les migrations en attente, dans une seule transaction
+
+        Args:
+            conn: Connexion (hors transaction)
+
+        Returns:
+            Versions appliquées (vide si la base est à jour)
+        """
+        current = self.get_version(conn)
+        pending = [(version, path) for version, path in self.get_migrations() if version > current]
+        if not pending:
+            return []
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for version, path in pending:
+                self._apply(conn, path)
+            # PRAGMA user_version est transactionnel : validé avec le reste
+            conn.execute(f"PRAGMA user_version = {pending[-1][0]}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        return [version for version, _ in pending]
+
+
+# Instance globale
+migrator = Migrator()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Enregistrements typés pour les listes volumineuses
+
+Chaque entité listée déclare ses colonnes dans __slots__ : pas de
+dictionnaire par ligne ni de clés répétées. Les enregistrements restent
+lisibles comme les anciens dict(row) (record['name'], record.get('barcode'),
+dict(record)) pour ne pas toucher à l'interface.
+"""
+from typing import Any, Iterator, Tuple
+
+
+class Record:
+    """Base des enregistrements à slots (colonnes = __slots__)"""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, cursor, row: tuple) -> "Record":
+        """row_factory sqlite3 : construire l'enregistrement depuis un tuple"""
+        return cls(*row)
+
+    @classmethod
+    def check_columns(cls, description: tuple):
+        """Vérifier que la requête renvoie exactement les colonnes déclarées"""
+        columns = tuple(column[0] for column in description)
+        if columns != cls.__slots__:
+            raise ValueError(
+                f"{cls.__name__}: colonnes {columns} au lieu de {cls.__slots__}"
+            )
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.__slots__
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__slots__)
+
+    def __len__(self) -> int:
+        return len(self.__slots__)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(self[name] == other[name] for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={self[name]!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({values})"
+
+
+class ProductRow(Record):
+    """Produit dans les listes (page produits, recherche caisse, panier)"""
+
+    __slots__ = (
+        'id', 'barcode', 'name', 'name_ar', 'category_id', 'category_name',
+        'purchase_price', 'selling_price', 'stock_quantity', 'min_stock_level',
+        'expiry_date', 'discount_percentage', 'is_on_promotion', 'is_active',
+    )
+
+    SELECT = """
+        SELECT p.id, p.barcode, p.name, p.name_ar, p.category_id,
+               c.name AS category_name,
+               p.purchase_price, p.selling_price, p.stock_quantity,
+               p.min_stock_level, p.expiry_date, p.discount_percentage,
+               p.is_on_promotion, p.is_active
+        FROM products p
+        LEFT JOIN categories c ON p.category_id = c.id
+    """
+
+
+class CustomerRow(Record):
+    """Client dans les listes (page clients, sélection en caisse)"""
+
+    __slots__ = (
+        'id', 'code', 'full_name', 'phone', 'credit_limit',
+        'current_credit', 'total_purchases', 'is_active',
+    )
+
+    SELECT = """
+        SELECT id, code, full_name, phone, credit_limit,
+               current_credit, total_purchases, is_active
+        FROM customers
+    """
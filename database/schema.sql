@@ -1,5 +1,7 @@
 -- Schéma de base de données SQLite pour Gestion Mini-Market
 -- Version 1.0.0
+-- Migration 1 (PRAGMA user_version) : les changements ultérieurs du schéma
+-- s'ajoutent dans database/migrations/NNNN_description.sql (voir migrator.py)
 
 -- ============================================================================
 -- TABLE: users (Utilisateurs)
@@ -88,6 +90,24 @@ CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
 CREATE INDEX IF NOT EXISTS idx_products_category ON products(category_id);
 CREATE INDEX IF NOT EXISTS idx_products_supplier ON products(supplier_id);
 CREATE INDEX IF NOT EXISTS idx_products_active ON products(is_active);
+-- Échéances d'expiration (plages de dates sans parcours de la table)
+CREATE INDEX IF NOT EXISTS idx_products_expiry ON products(is_active, expiry_date);
+-- Stock faible : index partiel limité aux produits sous leur stock minimum
+CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(is_active, stock_quantity)
+    WHERE is_active = 1 AND stock_quantity <= min_stock_level;
+
+-- Alertes de stock déjà émises (une seule fois par produit et échéance)
+CREATE TABLE IF NOT EXISTS stock_alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    alert_type TEXT NOT NULL CHECK(alert_type IN ('low_stock', 'expiry')),
+    alert_key TEXT NOT NULL DEFAULT '',  -- Date d'expiration concernée
+    message TEXT,
+    fired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    
+    UNIQUE (product_id, alert_type, alert_key),
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+);
 
 -- ============================================================================
 -- TABLE: price_history (Historique des prix)
@@ -206,9 +226,54 @@ CREATE TABLE IF NOT EXISTS sales (
 CREATE INDEX IF NOT EXISTS idx_sales_number ON sales(sale_number);
 CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id);
 CREATE INDEX IF NOT EXISTS idx_sales_cashier ON sales(cashier_id);
+-- Index couvrant des rapports par caissier (plage de dates sans lecture de la table)
+CREATE INDEX IF NOT EXISTS idx_sales_date_cashier ON sales(sale_date, cashier_id, status, total_amount);
 CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date);
 CREATE INDEX IF NOT EXISTS idx_sales_status ON sales(status);
 
+CREATE INDEX IF NOT EXISTS idx_sales_register ON sales(register_number, id);
+
+-- ============================================================================
+-- TABLE: shifts (Sessions de caisse et clôtures Z)
+-- ============================================================================
+-- Une session couvre les ventes d'ID ]start_sale_id, end_sale_id] de la
+-- caisse (et de même pour les retours) ; dates en heure locale.
+-- snapshot: totaux JSON figés à la clôture (rapport Z)
+CREATE TABLE IF NOT EXISTS shifts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    register_number INTEGER NOT NULL DEFAULT 1,
+    
+    opened_by INTEGER,
+    opened_at TIMESTAMP NOT NULL,
+    opening_cash REAL DEFAULT 0.0,
+    
+    closed_by INTEGER,
+    closed_at TIMESTAMP,
+    status TEXT DEFAULT 'open' CHECK(status IN ('open', 'closed')),
+    
+    start_sale_id INTEGER DEFAULT 0,
+    end_sale_id INTEGER,
+    start_return_id INTEGER DEFAULT 0,
+    end_return_id INTEGER,
+    
+    -- Synthèse (listes de clôtures sans lire l'instantané)
+    sales_count INTEGER DEFAULT 0,
+    total_sales REAL DEFAULT 0.0,
+    total_returns REAL DEFAULT 0.0,
+    cash_expected REAL DEFAULT 0.0,
+    counted_cash REAL,
+    cash_difference REAL,
+    
+    snapshot TEXT,
+    notes TEXT,
+    
+    FOREIGN KEY (opened_by) REFERENCES users(id),
+    FOREIGN KEY (closed_by) REFERENCES users(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_shifts_register_status ON shifts(register_number, status);
+CREATE INDEX IF NOT EXISTS idx_shifts_closed ON shifts(closed_at);
+
 -- ============================================================================
 -- TABLE: sale_items (Détails des ventes - Lignes)
 -- ============================================================================
@@ -276,6 +341,32 @@ CREATE TABLE IF NOT EXISTS return_items (
 );
 
 CREATE INDEX IF NOT EXISTS idx_return_items_return ON return_items(return_id);
+CREATE INDEX IF NOT EXISTS idx_return_items_sale_item ON return_items(sale_item_id);
+
+-- ============================================================================
+-- TABLE: stock_movements (Journal des mouvements de stock - ajout seul)
+-- ============================================================================
+-- products.stock_quantity est la somme matérialisée de ce journal.
+-- source_id référence sales.id (sale, cancel), returns.id (return)
+-- ou le document d'origine pour restock/adjustment.
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    movement_type TEXT NOT NULL CHECK(movement_type IN ('sale', 'return', 'cancel', 'restock', 'adjustment')),
+    quantity REAL NOT NULL,  -- Variation signée (négative pour une sortie)
+    source_id INTEGER,
+    
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    FOREIGN KEY (created_by) REFERENCES users(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_movements_product_date ON stock_movements(product_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_type_date ON stock_movements(movement_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_stock_movements_source ON stock_movements(movement_type, source_id);
 
 -- ============================================================================
 -- TABLE: supplier_transactions (Transactions fournisseurs)
@@ -359,10 +450,49 @@ CREATE TABLE IF NOT EXISTS settings (
 
 CREATE INDEX IF NOT EXISTS idx_settings_key ON settings(setting_key);
 
+-- ============================================================================
+-- TABLE: sequences (Compteurs de numérotation préalloués par blocs)
+-- ============================================================================
+-- name: 'sale:<caisse>', 'return:<caisse>', 'customer', 'supplier'
+-- next_value: première valeur non encore réservée
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    next_value INTEGER NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ============================================================================
+-- TABLE: data_versions (Compteurs de modification des données)
+-- ============================================================================
+-- name: 'sales' (journée en cours), 'history' (ventes des jours passés)
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+-- ============================================================================
+-- TABLE: report_cache (Résultats des rapports sur périodes closes)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS report_cache (
+    cache_key TEXT PRIMARY KEY,  -- rapport + paramètres
+    report TEXT NOT NULL,
+    data_version TEXT NOT NULL,  -- versions des données au moment du calcul
+    result TEXT NOT NULL,  -- JSON
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ============================================================================
 -- TRIGGERS (Déclencheurs automatiques)
 -- ============================================================================
 
+-- Trigger: Une clôture de caisse est immuable
+CREATE TRIGGER IF NOT EXISTS prevent_closed_shift_update
+BEFORE UPDATE ON shifts
+WHEN OLD.status = 'closed'
+BEGIN
+    SELECT RAISE(ABORT, 'Session de caisse clôturée: modification interdite');
+END;
+
 -- Trigger: Mettre à jour updated_at automatiquement
 CREATE TRIGGER IF NOT EXISTS update_users_timestamp 
 AFTER UPDATE ON users
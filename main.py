@@ -9,6 +9,7 @@ from pathlib import Path
 # Ajouter le dossier parent au chemin Python
 sys.path.append(str(Path(__file__).parent))
 
+from core.startup_timer import startup_timer
 import config
 from core.logger import logger
 from database.db_manager import db
@@ -19,6 +20,8 @@ from PyQt5.QtCore import Qt
 from ui.login_dialog import LoginDialog
 from ui.main_window import MainWindow
 
+startup_timer.mark("imports")
+
 def initialize_application():
     """Initialiser l'application"""
     try:
@@ -28,15 +31,12 @@ def initialize_application():
         
         # Vérifier la base de données
         logger.info("Vérification de la base de données...")
-        db_info = db.get_database_info()
+        # Sans compter les lignes de chaque table (parcours complets)
+        db_info = db.get_database_info(with_counts=False)
         logger.info(f"Base de données: {db_info['path']}")
         logger.info(f"Taille: {db_info['size_bytes'] / 1024:.2f} KB")
         logger.info(f"Tables: {len(db_info['tables'])}")
         
-        # Afficher les compteurs de tables
-        for table, count in db_info['table_counts'].items():
-            logger.info(f"  - {table}: {count} enregistrement(s)")
-        
         logger.info("Application initialisée avec succès")
         return True
         
@@ -55,6 +55,7 @@ def main():
     if not initialize_application():
         print("Erreur lors de l'initialisation de l'application")
         sys.exit(1)
+    startup_timer.mark("base de données")
     
     # Créer l'application Qt
     app = QApplication(sys.argv)
@@ -98,6 +99,8 @@ def main():
         logger.info("Licence activée avec succès")
     else:
         logger.info(f"Licence valide: {license_msg}")
+    startup_timer.mark("licence")
+    startup_timer.report("Démarrage jusqu'à la connexion")
     
     # Boucle principale de l'application
     while True:
@@ -110,12 +113,20 @@ def main():
             user_data = auth_manager.get_current_user()
             
             if user_data:
-                # Créer et afficher la fenêtre principale
+                # Créer et afficher la fenêtre principale (mesuré depuis la connexion)
+                from PyQt5.QtCore import QTimer
+                startup_timer.restart()
                 main_window = MainWindow(user_data)
+                startup_timer.mark("fenêtre principale")
                 main_window.showMaximized()
+                startup_timer.mark("affichage")
+                
+                def report_ready():
+                    startup_timer.mark("premier rendu")
+                    startup_timer.report("Caisse prête")
+                QTimer.singleShot(0, report_ready)
                 
                 # Configurer la sauvegarde automatique
-                from PyQt5.QtCore import QTimer
                 from core.backup import backup_manager
                 
                 # Fetch backup configuration from DB
@@ -145,32 +156,26 @@ def main():
                         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                         excel_path = backup_dir / f"auto_backup_{timestamp}.xlsx"
                         
-                        wb = openpyxl.Workbook()
+                        # Classeur en écriture seule : lignes écrites au fil de l'eau
+                        wb = openpyxl.Workbook(write_only=True)
+                        
+                        def write_sheet(ws, rows):
+                            # Lecture par pages : la base n'est jamais chargée entière
+                            header = False
+                            for row in rows:
+                                if not header:
+                                    ws.append(list(row.keys()))
+                                    header = True
+                                ws.append(list(row))
                         
                         # Produits
-                        ws = wb.active
-                        ws.title = "Produits"
-                        products = db.execute_query("SELECT * FROM products WHERE is_active = 1")
-                        if products:
-                            ws.append(list(dict(products[0]).keys()))
-                            for p in products:
-                                ws.append(list(dict(p).values()))
+                        write_sheet(wb.create_sheet("Produits"), db.iter_keyset("products", where="is_active = 1"))
                         
                         # Ventes
-                        ws_sales = wb.create_sheet("Ventes")
-                        sales = db.execute_query("SELECT * FROM sales")
-                        if sales:
-                            ws_sales.append(list(dict(sales[0]).keys()))
-                            for s in sales:
-                                ws_sales.append(list(dict(s).values()))
+                        write_sheet(wb.create_sheet("Ventes"), db.iter_keyset("sales"))
                         
                         # Clients
-                        ws_cust = wb.create_sheet("Clients")
-                        customers = db.execute_query("SELECT * FROM customers WHERE is_active = 1")
-                        if customers:
-                            ws_cust.append(list(dict(customers[0]).keys()))
-                            for c in customers:
-                                ws_cust.append(list(dict(c).values()))
+                        write_sheet(wb.create_sheet("Clients"), db.iter_keyset("customers", where="is_active = 1"))
                         
                         wb.save(excel_path)
                         logger.info(f"Sauvegarde automatique créée: {excel_path.name}")
@@ -191,6 +196,19 @@ def main():
                 # Sauvegarde à la fermeture de l'application
                 app.aboutToQuit.connect(perform_auto_backup)
                 
+                # Synchronisation des ventes mises en file locale par cette caisse
+                if config.REGISTER_CONFIG.get("offline_queue", False):
+                    from modules.sales.pos import pos_manager
+                    from modules.sales.offline_queue import offline_queue
+                    offline_queue.start_syncer(pos_manager.sync_offline_sales)
+                    app.aboutToQuit.connect(offline_queue.stop_syncer)
+                
+                # File d'impression : reprendre les tickets non imprimés
+                from modules.sales.printer import printer_manager
+                from modules.sales.print_spooler import print_spooler
+                print_spooler.start(lambda document, printer: printer_manager.print_receipt(document, printer))
+                app.aboutToQuit.connect(print_spooler.stop)
+                
                 # Lancer la boucle d'événements
                 app.exec_()
                 
@@ -3,5 +3,6 @@
 Package customers - Gestion des clients
 """
 from .customer_manager import CustomerManager
+from .loyalty import LoyaltyManager, loyalty_manager
 
-__all__ = ['CustomerManager']
+__all__ = ['CustomerManager', 'LoyaltyManager', 'loyalty_manager']
@@ -2,15 +2,38 @@
 """
 Gestionnaire de clients
 """
-from typing import List, Optional, Dict, Any
+import re
+from typing import List, Optional, Dict, Any, Iterator
 from datetime import datetime
 from database.db_manager import db
+from database.records import CustomerRow
 from core.logger import logger
+from core.sequence import sequence_generator
+
+
+# Téléphone réduit aux chiffres : même expression que l'index
+# idx_customers_phone_digits (migration 0003), sinon il n'est pas utilisé
+PHONE_DIGITS_SQL = (
+    "replace(replace(replace(replace(replace(replace(replace("
+    "phone, ' ', ''), '-', ''), '.', ''), '/', ''), '+', ''), '(', ''), ')', '')"
+)
+
+
+class CreditLimitExceeded(Exception):
+    """Dette refusée : la limite de crédit du client serait dépassée"""
+
+
+def _prefix_range(prefix: str) -> tuple:
+    """Bornes [prefix, fin) d'une recherche par préfixe sur un index"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 class CustomerManager:
     """Gestionnaire de clients"""
     
+    def __init__(self):
+        self._fts_available = None
+    
     def create_customer(self, full_name: str, phone: str = None,
                        email: str = None, address: str = None,
                        credit_limit: float = 0.0) -> tuple[bool, str, Optional[int]]:
@@ -173,7 +196,7 @@ class CustomerManager:
         result = db.fetch_one(query, (code,))
         return dict(result) if result else None
     
-    def search_customers(self, search_term: str) -> List[Dict]:
+    def search_customers(self, search_term: str) -> List[CustomerRow]:
         """
         Rechercher des clients
         
@@ -181,38 +204,98 @@ class CustomerManager:
             search_term: Terme de recherche (nom, téléphone, code)
             
         Returns:
-            Liste de clients correspondants
+            Liste de clients correspondants (CustomerRow)
         """
-        query = """
-            SELECT * FROM customers
-            WHERE (full_name LIKE ? OR phone LIKE ? OR code LIKE ?)
+        return self.lookup_customers(search_term, limit=50)
+    
+    def lookup_customers(self, term: str, limit: int = 20) -> List[CustomerRow]:
+        """
+        Rechercher des clients par index (pas de parcours de la table)
+        
+        - code : préfixe (« CLT-00 ») ou numéro seul (« 42 » -> CLT-000042) ;
+        - téléphone : préfixe des chiffres, séparateurs ignorés ;
+        - nom : début de chaque mot (« ben moh »), accents ignorés.
+        
+        Args:
+            term: Saisie du caissier
+            limit: Nombre maximal de résultats
+            
+        Returns:
+            Clients actifs correspondants, par nom (CustomerRow)
+        """
+        term = term.strip()
+        if not term:
+            return []
+        
+        subqueries = []
+        params = []
+        
+        code = term.upper()
+        subqueries.append("SELECT id FROM customers WHERE code >= ? AND code < ?")
+        params.extend(_prefix_range(code))
+        
+        digits = re.sub(r'\D', '', term)
+        if digits and not re.search(r'[^\d\s\-./+()]', term):
+            subqueries.append(f"SELECT id FROM customers WHERE {PHONE_DIGITS_SQL} >= ? AND {PHONE_DIGITS_SQL} < ?")
+            params.extend(_prefix_range(digits))
+            if len(digits) <= 6:
+                subqueries.append("SELECT id FROM customers WHERE code = ?")
+                params.append(f"CLT-{int(digits):06d}")
+        
+        words = re.findall(r'\w+', term)
+        if words:
+            if self._has_fts():
+                subqueries.append("SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?")
+                params.append(" ".join(f'"{word}"*' for word in words))
+            else:
+                subqueries.append("SELECT id FROM customers WHERE full_name >= ? AND full_name < ?")
+                params.extend(_prefix_range(term))
+        
+        query = CustomerRow.SELECT + f"""
+            WHERE id IN ({" UNION ".join(subqueries)})
               AND is_active = 1
             ORDER BY full_name
-            LIMIT 50
+            LIMIT ?
         """
-        search_pattern = f"%{search_term}%"
-        results = db.execute_query(query, (search_pattern, search_pattern, search_pattern))
-        return [dict(row) for row in results]
+        params.append(int(limit))
+        return list(db.iter_records(CustomerRow, query, tuple(params)))
     
-    def get_all_customers(self, include_inactive: bool = False) -> List[Dict]:
+    def _has_fts(self) -> bool:
+        """Index plein texte des noms disponible (SQLite compilé avec FTS5)"""
+        if self._fts_available is None:
+            self._fts_available = db.table_exists('customers_fts')
+        return self._fts_available
+    
+    def iter_customers(self, include_inactive: bool = False) -> Iterator[CustomerRow]:
         """
-        Obtenir tous les clients
+        Parcourir les clients sans construire de liste
         
         Args:
             include_inactive: Inclure les clients désactivés
             
-        Returns:
-            Liste de clients
+        Yields:
+            Un CustomerRow par client, par nom
         """
-        query = "SELECT * FROM customers"
+        query = CustomerRow.SELECT
         
         if not include_inactive:
             query += " WHERE is_active = 1"
         
         query += " ORDER BY full_name"
         
-        results = db.execute_query(query)
-        return [dict(row) for row in results]
+        return db.iter_records(CustomerRow, query)
+    
+    def get_all_customers(self, include_inactive: bool = False) -> List[CustomerRow]:
+        """
+        Obtenir tous les clients
+        
+        Args:
+            include_inactive: Inclure les clients désactivés
+            
+        Returns:
+            Liste de clients (CustomerRow)
+        """
+        return list(self.iter_customers(include_inactive))
     
     def add_credit(self, customer_id: int, amount: float, 
                   processed_by: int, notes: str = "") -> tuple[bool, str]:
@@ -229,39 +312,20 @@ class CustomerManager:
             (success, message)
         """
         try:
-            customer = self.get_customer(customer_id)
-            if not customer:
-                return False, "Client introuvable"
-            
-            # Vérifier la limite de crédit
-            new_credit = customer['current_credit'] + amount
-            if new_credit > customer['credit_limit']:
-                return False, f"Limite de crédit dépassée. Limite: {customer['credit_limit']} DA"
-            
             db.begin_transaction()
             
             try:
-                # Mettre à jour le crédit
-                update_query = """
-                    UPDATE customers 
-                    SET current_credit = current_credit + ?
-                    WHERE id = ?
-                """
-                db.execute_update(update_query, (amount, customer_id))
-                
-                # Enregistrer la transaction
-                transaction_query = """
-                    INSERT INTO customer_credit_transactions (
-                        customer_id, transaction_type, amount, processed_by, notes
-                    ) VALUES (?, 'credit_sale', ?, ?, ?)
-                """
-                db.execute_insert(transaction_query, (customer_id, amount, processed_by, notes))
-                
+                # Limite vérifiée dans la transaction (solde à jour)
+                self.post_credit(customer_id, 'credit_sale', amount, processed_by,
+                                 notes=notes, enforce_limit=True)
                 db.commit()
                 
                 logger.info(f"Crédit ajouté: Client {customer_id} - {amount} DA")
                 return True, f"Crédit ajouté: {amount} DA"
                 
+            except CreditLimitExceeded as e:
+                db.rollback()
+                return False, str(e)
             except Exception as e:
                 db.rollback()
                 raise e
@@ -276,6 +340,8 @@ class CustomerManager:
         """
         Enregistrer un paiement de crédit
         
+        Le paiement solde les dettes les plus anciennes en premier.
+        
         Args:
             customer_id: ID du client
             amount: Montant payé
@@ -286,32 +352,19 @@ class CustomerManager:
             (success, message)
         """
         try:
-            customer = self.get_customer(customer_id)
-            if not customer:
-                return False, "Client introuvable"
-            
-            if amount > customer['current_credit']:
-                return False, f"Montant trop élevé. Crédit actuel: {customer['current_credit']} DA"
-            
             db.begin_transaction()
             
             try:
-                # Réduire le crédit
-                update_query = """
-                    UPDATE customers 
-                    SET current_credit = current_credit - ?
-                    WHERE id = ?
-                """
-                db.execute_update(update_query, (amount, customer_id))
+                customer = db.fetch_one("SELECT current_credit FROM customers WHERE id = ?", (customer_id,))
+                if not customer:
+                    db.rollback()
+                    return False, "Client introuvable"
                 
-                # Enregistrer la transaction
-                transaction_query = """
-                    INSERT INTO customer_credit_transactions (
-                        customer_id, transaction_type, amount, processed_by, notes
-                    ) VALUES (?, 'payment', ?, ?, ?)
-                """
-                db.execute_insert(transaction_query, (customer_id, amount, processed_by, notes))
+                if amount > customer['current_credit'] + 0.005:
+                    db.rollback()
+                    return False, f"Montant trop élevé. Crédit actuel: {customer['current_credit']} DA"
                 
+                self.post_credit(customer_id, 'payment', -amount, processed_by, notes=notes)
                 db.commit()
                 
                 logger.info(f"Paiement crédit: Client {customer_id} - {amount} DA")
@@ -326,6 +379,85 @@ class CustomerManager:
             logger.error(error_msg)
             return False, error_msg
     
+    def post_credit(self, customer_id: int, transaction_type: str, change: float,
+                    processed_by: int, sale_id: int = None, notes: str = None,
+                    transaction_date: str = None, enforce_limit: bool = False) -> float:
+        """
+        Inscrire un mouvement de crédit (dans la transaction de l'appelant)
+        
+        Met à jour la dette du client, le solde courant du mouvement et les
+        parts impayées utilisées par l'ancienneté des dettes.
+        
+        Args:
+            customer_id: ID du client
+            transaction_type: 'credit_sale', 'payment' ou 'adjustment'
+            change: Variation de la dette (négative : la dette diminue)
+            processed_by: ID de l'utilisateur
+            sale_id: Vente concernée (soldée en priorité si la dette diminue)
+            notes: Notes
+            transaction_date: Date du mouvement (par défaut : maintenant)
+            enforce_limit: Refuser une dette au-delà de la limite du client
+            
+        Returns:
+            Nouvelle dette du client
+            
+        Raises:
+            ValueError: Client introuvable
+            CreditLimitExceeded: Limite dépassée (si enforce_limit)
+        """
+        customer = db.fetch_one(
+            "SELECT full_name, current_credit, credit_limit FROM customers WHERE id = ?",
+            (customer_id,)
+        )
+        if not customer:
+            raise ValueError(f"Client introuvable: {customer_id}")
+        
+        balance = round((customer['current_credit'] or 0) + change, 2)
+        if enforce_limit and change > 0 and balance > (customer['credit_limit'] or 0) + 0.005:
+            raise CreditLimitExceeded(
+                f"Limite de crédit dépassée pour {customer['full_name']}: "
+                f"dette {customer['current_credit']:g} + {change:g} DA, "
+                f"limite {customer['credit_limit']:g} DA"
+            )
+        
+        # credit_sale/payment : montant positif, le type donne le sens
+        amount = abs(change) if transaction_type in ('credit_sale', 'payment') else change
+        db.execute_insert("""
+            INSERT INTO customer_credit_transactions (
+                customer_id, transaction_type, amount, sale_id, processed_by,
+                transaction_date, notes, balance_after, open_amount
+            ) VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?)
+        """, (customer_id, transaction_type, amount, sale_id, processed_by,
+              transaction_date, notes, balance, max(change, 0)))
+        db.execute_update("UPDATE customers SET current_credit = ? WHERE id = ?", (balance, customer_id))
+        
+        if change < 0:
+            self._settle_open_debts(customer_id, -change, sale_id)
+        return balance
+    
+    def _settle_open_debts(self, customer_id: int, amount: float, sale_id: int = None):
+        """Solder des dettes ouvertes : celle de la vente d'abord, puis les plus anciennes"""
+        rows = db.execute_query("""
+            SELECT id, open_amount
+            FROM customer_credit_transactions
+            WHERE customer_id = ? AND open_amount > 0
+            ORDER BY CASE WHEN sale_id = ? THEN 0 ELSE 1 END, transaction_date, id
+        """, (customer_id, sale_id))
+        
+        updates = []
+        for row in rows:
+            if amount <= 0.005:
+                break
+            take = min(row['open_amount'], amount)
+            updates.append((round(row['open_amount'] - take, 2), row['id']))
+            amount = round(amount - take, 2)
+        
+        if updates:
+            db.execute_many(
+                "UPDATE customer_credit_transactions SET open_amount = ? WHERE id = ?",
+                updates
+            )
+    
     def get_credit_history(self, customer_id: int) -> List[Dict]:
         """
         Obtenir l'historique de crédit d'un client
@@ -341,7 +473,7 @@ class CustomerManager:
             FROM customer_credit_transactions ct
             LEFT JOIN users u ON ct.processed_by = u.id
             WHERE ct.customer_id = ?
-            ORDER BY ct.transaction_date DESC
+            ORDER BY ct.transaction_date DESC, ct.id DESC
         """
         results = db.execute_query(query, (customer_id,))
         return [dict(row) for row in results]
@@ -383,6 +515,46 @@ class CustomerManager:
         results = db.execute_query(query)
         return [dict(row) for row in results]
     
+    def get_credit_aging(self, as_of: str = None) -> List[Dict]:
+        """
+        Ancienneté des dettes par client (0-30, 31-60, 61-90, 90+ jours)
+        
+        Une seule requête groupée sur les parts impayées
+        (idx_customer_credit_open) : l'historique soldé n'est pas relu.
+        
+        Args:
+            as_of: Date de référence 'YYYY-MM-DD' (par défaut : aujourd'hui)
+            
+        Returns:
+            Clients endettés {id, code, full_name, phone, current_credit,
+            credit_limit, days_0_30, days_31_60, days_61_90, days_90_plus,
+            oldest_date}, les dettes les plus anciennes d'abord
+        """
+        as_of = as_of or datetime.now().strftime('%Y-%m-%d')
+        query = """
+            SELECT c.id, c.code, c.full_name, c.phone, c.current_credit, c.credit_limit,
+                   a.days_0_30, a.days_31_60, a.days_61_90, a.days_90_plus, a.oldest_date
+            FROM (
+                SELECT customer_id,
+                       ROUND(SUM(CASE WHEN age <= 30 THEN open_amount ELSE 0 END), 2) as days_0_30,
+                       ROUND(SUM(CASE WHEN age > 30 AND age <= 60 THEN open_amount ELSE 0 END), 2) as days_31_60,
+                       ROUND(SUM(CASE WHEN age > 60 AND age <= 90 THEN open_amount ELSE 0 END), 2) as days_61_90,
+                       ROUND(SUM(CASE WHEN age > 90 THEN open_amount ELSE 0 END), 2) as days_90_plus,
+                       MIN(transaction_date) as oldest_date
+                FROM (
+                    SELECT customer_id, open_amount, transaction_date,
+                           julianday(?) - julianday(date(transaction_date)) as age
+                    FROM customer_credit_transactions
+                    WHERE open_amount > 0
+                )
+                GROUP BY customer_id
+            ) a
+            JOIN customers c ON c.id = a.customer_id
+            WHERE c.is_active = 1
+            ORDER BY a.days_90_plus DESC, a.days_61_90 DESC, c.current_credit DESC
+        """
+        return [dict(row) for row in db.execute_query(query, (as_of,))]
+    
     def get_customer_stats(self, customer_id: int) -> Dict[str, Any]:
         """
         Obtenir les statistiques d'un client
@@ -406,6 +578,8 @@ class CustomerManager:
             'last_purchase_date': customer['last_purchase_date'],
         }
         
+        stats['loyalty_points'] = customer['loyalty_points']
+        
         # Moyenne par achat
         if customer['purchase_count'] > 0:
             stats['average_purchase'] = round(customer['total_purchases'] / customer['purchase_count'], 2)
@@ -414,23 +588,122 @@ class CustomerManager:
         
         return stats
     
-    def _generate_customer_code(self) -> str:
-        """Générer un code client unique"""
-        # Obtenir le dernier code
-        query = "SELECT code FROM customers ORDER BY id DESC LIMIT 1"
-        result = db.fetch_one(query)
+    def record_purchase(self, customer_id: int, amount: float, sale_date: str):
+        """
+        Ajouter une vente aux statistiques du client (transaction de la vente)
         
-        if result and result['code']:
-            # Extraire le numéro et incrémenter
-            try:
-                last_num = int(result['code'].replace('CLT-', ''))
-                new_num = last_num + 1
-            except:
-                new_num = 1
-        else:
-            new_num = 1
+        Args:
+            customer_id: ID du client
+            amount: Montant de la vente
+            sale_date: Date de la vente (les ventes synchronisées en retard
+                       ne reculent pas la date du dernier achat)
+        """
+        db.execute_update("""
+            UPDATE customers
+            SET total_purchases = ROUND(total_purchases + ?, 2),
+                purchase_count = purchase_count + 1,
+                last_purchase_date = MAX(COALESCE(last_purchase_date, ''), ?)
+            WHERE id = ?
+        """, (amount, sale_date, customer_id))
+    
+    def record_refund(self, customer_id: int, amount: float):
+        """Retirer un retour du total des achats (transaction du retour)"""
+        db.execute_update("""
+            UPDATE customers
+            SET total_purchases = MAX(ROUND(total_purchases - ?, 2), 0)
+            WHERE id = ?
+        """, (amount, customer_id))
+    
+    def record_cancellation(self, customer_id: int, amount: float):
+        """
+        Retirer une vente annulée des statistiques (transaction de l'annulation)
         
-        return f"CLT-{new_num:06d}"
+        Args:
+            customer_id: ID du client
+            amount: Montant encore compté pour cette vente (total - retours)
+        """
+        db.execute_update("""
+            UPDATE customers
+            SET total_purchases = MAX(ROUND(total_purchases - ?, 2), 0),
+                purchase_count = MAX(purchase_count - 1, 0),
+                last_purchase_date = (
+                    SELECT MAX(sale_date) FROM sales
+                    WHERE customer_id = ? AND status != 'cancelled'
+                )
+            WHERE id = ?
+        """, (amount, customer_id, customer_id))
+    
+    def recompute_stats(self) -> tuple[bool, str]:
+        """
+        Recalculer les statistiques de tous les clients depuis les ventes
+        
+        Une seule requête groupée sur les ventes (retours déduits, ventes
+        annulées exclues) puis une mise à jour de tous les clients ; les
+        points de fidélité sont ramenés à la somme de leur journal.
+        
+        Returns:
+            (success, message)
+        """
+        try:
+            db.begin_transaction()
+            try:
+                db.execute_update("DROP TABLE IF EXISTS temp.customer_totals")
+                db.execute_update("""
+                    CREATE TEMP TABLE customer_totals (
+                        customer_id INTEGER PRIMARY KEY,
+                        purchase_count INTEGER,
+                        total_purchases REAL,
+                        last_purchase_date TIMESTAMP
+                    )
+                """)
+                db.execute_update("""
+                    INSERT INTO temp.customer_totals
+                    SELECT s.customer_id, COUNT(*),
+                           ROUND(SUM(s.total_amount - COALESCE(r.refunded, 0)), 2),
+                           MAX(s.sale_date)
+                    FROM sales s
+                    LEFT JOIN (
+                        SELECT original_sale_id, SUM(return_amount) as refunded
+                        FROM returns
+                        GROUP BY original_sale_id
+                    ) r ON r.original_sale_id = s.id
+                    WHERE s.customer_id IS NOT NULL AND s.status != 'cancelled'
+                    GROUP BY s.customer_id
+                """)
+                count = db.execute_update("""
+                    UPDATE customers SET
+                        purchase_count = COALESCE((SELECT t.purchase_count FROM temp.customer_totals t WHERE t.customer_id = customers.id), 0),
+                        total_purchases = COALESCE((SELECT t.total_purchases FROM temp.customer_totals t WHERE t.customer_id = customers.id), 0),
+                        last_purchase_date = (SELECT t.last_purchase_date FROM temp.customer_totals t WHERE t.customer_id = customers.id),
+                        loyalty_points = COALESCE((SELECT SUM(l.points) FROM loyalty_transactions l WHERE l.customer_id = customers.id), 0)
+                """)
+                db.execute_update("DROP TABLE temp.customer_totals")
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            
+            logger.info(f"Statistiques clients recalculées ({count} clients)")
+            return True, f"Statistiques recalculées pour {count} clients"
+            
+        except Exception as e:
+            logger.error(f"Erreur recalcul statistiques clients: {e}")
+            return False, f"Erreur: {str(e)}"
+    
+    def _generate_customer_code(self) -> str:
+        """Générer un code client unique (séquence 'customer' préallouée par blocs)"""
+        value = sequence_generator.next_value('customer', block_size=10, seed=self._next_code_seed)
+        return f"CLT-{value:06d}"
+    
+    def _next_code_seed(self) -> int:
+        """Première valeur de la séquence : reprendre après les codes existants"""
+        query = """
+            SELECT MAX(CAST(SUBSTR(code, 5) AS INTEGER)) as last_num
+            FROM customers
+            WHERE code LIKE 'CLT-%'
+        """
+        result = db.fetch_one(query)
+        return (result['last_num'] or 0) + 1 if result else 1
 
 
 # Instance globale
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Points de fidélité
+
+Chaque mouvement de points est inscrit dans loyalty_transactions ;
+customers.loyalty_points en est le solde, mis à jour dans la même
+transaction. Les gains sont liés à la vente : une annulation ou un retour
+reprend les points qui ne sont plus justifiés par le montant conservé.
+"""
+import math
+from typing import List, Dict
+from database.db_manager import db
+from core.logger import logger
+import config
+
+
+class LoyaltyManager:
+    """Gains, utilisations et reprises de points de fidélité"""
+
+    def __init__(self):
+        self.settings = config.LOYALTY_CONFIG
+
+    def points_for_amount(self, amount: float) -> int:
+        """Points gagnés pour un montant d'achat"""
+        if amount <= 0:
+            return 0
+        return int(math.floor(amount / self.settings.get("amount_per_point", 100.0) + 1e-9))
+
+    def value_of(self, points: int) -> float:
+        """Remise (DA) correspondant à des points"""
+        return round(points * self.settings.get("point_value", 1.0), 2)
+
+    def _record(self, customer_id: int, transaction_type: str, points: int,
+                sale_id: int = None, processed_by: int = None, notes: str = None):
+        """Inscrire un mouvement et mettre à jour le solde (transaction de l'appelant)"""
+        db.execute_insert("""
+            INSERT INTO loyalty_transactions (
+                customer_id, transaction_type, points, sale_id, processed_by, notes
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (customer_id, transaction_type, points, sale_id, processed_by, notes))
+        db.execute_update(
+            "UPDATE customers SET loyalty_points = loyalty_points + ? WHERE id = ?",
+            (points, customer_id)
+        )
+
+    def accrue_for_sale(self, customer_id: int, sale_id: int, amount: float,
+                        processed_by: int = None) -> int:
+        """
+        Créditer les points d'une vente (dans la transaction de la vente)
+
+        Returns:
+            Points gagnés
+        """
+        if not self.settings.get("enabled", True):
+            return 0
+        points = self.points_for_amount(amount)
+        if points > 0:
+            self._record(customer_id, 'earn', points, sale_id, processed_by)
+        return points
+
+    def adjust_for_sale(self, customer_id: int, sale_id: int, kept_amount: float,
+                        processed_by: int = None, notes: str = None) -> int:
+        """
+        Reprendre les points d'une vente réduite (retour) ou annulée
+
+        Le solde de la vente est ramené aux points du montant conservé ;
+        les points déjà utilisés par le client ne sont pas rendus.
+
+        Args:
+            customer_id: ID du client
+            sale_id: ID de la vente
+            kept_amount: Montant de la vente qui reste acquis (0 si annulée)
+
+        Returns:
+            Points repris (négatif ou 0)
+        """
+        result = db.fetch_one("""
+            SELECT COALESCE(SUM(points), 0) as points
+            FROM loyalty_transactions
+            WHERE sale_id = ? AND transaction_type IN ('earn', 'reversal')
+        """, (sale_id,))
+        delta = min(self.points_for_amount(kept_amount), result['points']) - result['points']
+        if delta < 0:
+            self._record(customer_id, 'reversal', delta, sale_id, processed_by, notes)
+        return delta
+
+    def redeem_points(self, customer_id: int, points: int, processed_by: int,
+                      sale_id: int = None) -> tuple[bool, str, float]:
+        """
+        Utiliser des points contre une remise
+
+        Args:
+            customer_id: ID du client
+            points: Points à utiliser
+            processed_by: ID de l'utilisateur
+            sale_id: Vente sur laquelle la remise est accordée
+
+        Returns:
+            (success, message, montant de la remise)
+        """
+        if not self.settings.get("enabled", True):
+            return False, "Programme de fidélité désactivé", 0.0
+        if points <= 0:
+            return False, "Nombre de points invalide", 0.0
+        minimum = self.settings.get("min_redeem_points", 0)
+        if points < minimum:
+            return False, f"Minimum {minimum} points par utilisation", 0.0
+
+        try:
+            db.begin_transaction()
+            try:
+                customer = db.fetch_one(
+                    "SELECT loyalty_points FROM customers WHERE id = ? AND is_active = 1",
+                    (customer_id,)
+                )
+                if not customer:
+                    db.rollback()
+                    return False, "Client introuvable", 0.0
+                if customer['loyalty_points'] < points:
+                    db.rollback()
+                    return False, f"Solde insuffisant: {customer['loyalty_points']} points", 0.0
+
+                amount = self.value_of(points)
+                self._record(customer_id, 'redeem', -points, sale_id, processed_by,
+                             f"Remise de {amount:g} DA")
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            logger.info(f"Points utilisés: {points} (client {customer_id}) = {amount:g} DA")
+            return True, f"{points} points utilisés ({amount:g} DA)", amount
+
+        except Exception as e:
+            logger.error(f"Erreur utilisation points: {e}")
+            return False, f"Erreur: {str(e)}", 0.0
+
+    def get_balance(self, customer_id: int) -> int:
+        """Solde de points d'un client"""
+        result = db.fetch_one("SELECT loyalty_points FROM customers WHERE id = ?", (customer_id,))
+        return result['loyalty_points'] if result else 0
+
+    def get_history(self, customer_id: int, limit: int = 50) -> List[Dict]:
+        """
+        Mouvements de points d'un client, du plus récent au plus ancien
+
+        Args:
+            customer_id: ID du client
+            limit: Nombre maximal de mouvements
+
+        Returns:
+            Liste de mouvements
+        """
+        query = """
+            SELECT lt.*, s.sale_number
+            FROM loyalty_transactions lt
+            LEFT JOIN sales s ON lt.sale_id = s.id
+            WHERE lt.customer_id = ?
+            ORDER BY lt.transaction_date DESC, lt.id DESC
+            LIMIT ?
+        """
+        return [dict(row) for row in db.execute_query(query, (customer_id, limit))]
+
+
+# Instance globale
+loyalty_manager = LoyaltyManager()
@@ -4,5 +4,8 @@ Package products - Gestion des produits
 """
 from .product_manager import ProductManager
 from .category_manager import CategoryManager
+from .barcode_labels import LabelSheetGenerator
+from .alert_scheduler import AlertScheduler
+from .pricing import PriceManager
 
-__all__ = ['ProductManager', 'CategoryManager']
+__all__ = ['ProductManager', 'CategoryManager', 'LabelSheetGenerator', 'AlertScheduler', 'PriceManager']
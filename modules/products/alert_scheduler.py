@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Planificateur des alertes de stock faible et d'expiration
+
+Les échéances d'expiration sont gardées dans un tas (date d'alerte la plus
+proche en tête) : une vérification ne regarde que le sommet du tas. Chaque
+alerte émise est enregistrée dans stock_alerts et n'est plus jamais
+réémise, y compris après un redémarrage ; une nouvelle date d'expiration
+ou un nouveau passage sous le stock minimum donne une nouvelle alerte.
+"""
+import heapq
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Callable, Optional
+from database.db_manager import db
+from core.logger import logger
+import config
+
+
+class AlertScheduler:
+    """Planificateur des alertes de stock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._heap: List[tuple] = []  # (date d'alerte, product_id, expiry_date, nom)
+        self._expiry: Dict[int, str] = {}  # Échéance courante par produit (entrées périmées ignorées)
+        self._loaded = False
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """
+        Abonner une fonction aux alertes
+
+        Args:
+            callback: Appelée avec {product_id, alert_type, message}
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Dict], None]):
+        """Désabonner une fonction"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _message(self, key: str, **values) -> str:
+        language = config.LANGUAGE_CONFIG.get("default_language", "fr")
+        messages = config.DEFAULT_MESSAGES.get(language, config.DEFAULT_MESSAGES["fr"])
+        return messages[key].format(**values)
+
+    @staticmethod
+    def _alert_date(expiry_date: str) -> str:
+        """Date à partir de laquelle l'expiration est signalée"""
+        days = config.STOCK_CONFIG.get("alert_expiry_days", 30)
+        expiry = datetime.strptime(str(expiry_date)[:10], "%Y-%m-%d")
+        return (expiry - timedelta(days=days)).strftime("%Y-%m-%d")
+
+    def load(self):
+        """Construire le tas des échéances pas encore signalées (index idx_products_expiry)"""
+        rows = db.execute_query("""
+            SELECT p.id, p.name, p.expiry_date
+            FROM products p
+            WHERE p.is_active = 1 AND p.expiry_date IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM stock_alerts a
+                  WHERE a.product_id = p.id AND a.alert_type = 'expiry'
+                    AND a.alert_key = p.expiry_date
+              )
+        """)
+        heap = []
+        expiry = {}
+        for row in rows:
+            try:
+                heap.append((self._alert_date(row['expiry_date']), row['id'], row['expiry_date'], row['name']))
+            except ValueError:
+                logger.warning(f"Date d'expiration invalide pour le produit {row['id']}: {row['expiry_date']}")
+                continue
+            expiry[row['id']] = row['expiry_date']
+        heapq.heapify(heap)
+
+        with self._lock:
+            self._heap = heap
+            self._expiry = expiry
+            self._loaded = True
+
+    def schedule_expiry(self, product_id: int, name: str, expiry_date: Optional[str]):
+        """
+        Planifier (ou replanifier) l'échéance d'un produit
+
+        L'ancienne entrée reste dans le tas et sera ignorée à sa sortie.
+
+        Args:
+            product_id: ID du produit
+            name: Nom du produit
+            expiry_date: Nouvelle date d'expiration (None = plus d'échéance)
+        """
+        if not self._loaded:
+            return
+        with self._lock:
+            if not expiry_date:
+                self._expiry.pop(product_id, None)
+                return
+            try:
+                alert_date = self._alert_date(expiry_date)
+            except ValueError:
+                return
+            self._expiry[product_id] = expiry_date
+            heapq.heappush(self._heap, (alert_date, product_id, expiry_date, name))
+
+    def _due_expiries(self, today: str) -> List[tuple]:
+        """Retirer du tas les échéances arrivées"""
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= today:
+                entry = heapq.heappop(self._heap)
+                _, product_id, expiry_date, _ = entry
+                if self._expiry.get(product_id) == expiry_date:
+                    del self._expiry[product_id]
+                    due.append(entry)
+        return due
+
+    def _fire(self, product_id: int, alert_type: str, alert_key: str, message: str) -> bool:
+        """Enregistrer l'alerte ; False si elle avait déjà été émise"""
+        inserted = db.execute_update("""
+            INSERT OR IGNORE INTO stock_alerts (product_id, alert_type, alert_key, message)
+            VALUES (?, ?, ?, ?)
+        """, (product_id, alert_type, alert_key, message))
+        return inserted > 0
+
+    def run_due(self) -> List[Dict]:
+        """
+        Émettre les alertes arrivées à échéance
+
+        Expiration : sommet du tas uniquement. Stock faible : produits de
+        l'index partiel pas encore signalés ; les produits réapprovisionnés
+        sont réarmés pour leur prochain passage sous le minimum.
+
+        Returns:
+            Alertes émises {product_id, alert_type, message}
+        """
+        if not self._loaded:
+            self.load()
+
+        alerts = []
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        for _, product_id, expiry_date, name in self._due_expiries(today):
+            # Le produit a pu être désactivé depuis la planification
+            product = db.fetch_one("SELECT is_active, expiry_date FROM products WHERE id = ?", (product_id,))
+            if not product or not product['is_active'] or product['expiry_date'] != expiry_date:
+                continue
+            message = self._message("expiry_alert", product_name=name, expiry_date=expiry_date)
+            if self._fire(product_id, 'expiry', expiry_date, message):
+                logger.log_expiry_alert(name, expiry_date)
+                alerts.append({'product_id': product_id, 'alert_type': 'expiry', 'message': message})
+
+        # Réarmer les produits revenus au-dessus du stock minimum (écriture
+        # seulement s'il y en a : le cas courant ne fait qu'une lecture)
+        recovered = db.execute_query("""
+            SELECT a.id
+            FROM stock_alerts a
+            LEFT JOIN products p ON a.product_id = p.id
+            WHERE a.alert_type = 'low_stock'
+              AND (p.id IS NULL OR p.is_active = 0 OR p.stock_quantity > p.min_stock_level)
+        """)
+        if recovered:
+            db.execute_many("DELETE FROM stock_alerts WHERE id = ?", [(row['id'],) for row in recovered])
+
+        low_stock = db.execute_query("""
+            SELECT p.id, p.name, p.stock_quantity
+            FROM products p
+            WHERE p.is_active = 1 AND p.stock_quantity <= p.min_stock_level
+              AND NOT EXISTS (
+                  SELECT 1 FROM stock_alerts a
+                  WHERE a.product_id = p.id AND a.alert_type = 'low_stock'
+              )
+        """)
+        for product in low_stock:
+            message = self._message("low_stock_alert", product_name=product['name'])
+            if self._fire(product['id'], 'low_stock', '', message):
+                alerts.append({'product_id': product['id'], 'alert_type': 'low_stock', 'message': message})
+
+        for alert in alerts:
+            for callback in list(self._listeners):
+                try:
+                    callback(alert)
+                except Exception as e:
+                    logger.error(f"Erreur notification alerte: {e}")
+
+        return alerts
+
+    def reset(self):
+        """Oublier l'état en mémoire (restauration, réinitialisation)"""
+        with self._lock:
+            self._heap = []
+            self._expiry = {}
+            self._loaded = False
+
+
+# Instance globale
+alert_scheduler = AlertScheduler()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Planches d'étiquettes code-barres
+
+Plusieurs étiquettes par page (planche A4 ou rouleau), générées en une seule
+passe dans un seul PDF. Les dessins Code128 sont mis en cache par code.
+"""
+import math
+from functools import lru_cache
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Optional, Iterable
+from database.db_manager import db
+from core.logger import logger
+import config
+
+# reportlab n'est chargé qu'à la génération (démarrage plus rapide) :
+# mêmes valeurs que reportlab.lib.units.mm et reportlab.lib.pagesizes.A4
+mm = 72 / 25.4
+A4 = (210 * mm, 297 * mm)
+
+
+# Formats d'étiquettes : page, grille et dimensions d'une étiquette (en mm)
+LABEL_LAYOUTS = {
+    'a4_3x8': {
+        'label': "Planche A4 - 24 étiquettes (70 x 37 mm)",
+        'page_size': A4,
+        'columns': 3, 'rows': 8,
+        'label_width': 70, 'label_height': 37,
+        'margin_left': 0, 'margin_top': 0.5,
+    },
+    'a4_4x10': {
+        'label': "Planche A4 - 40 étiquettes (52.5 x 29.7 mm)",
+        'page_size': A4,
+        'columns': 4, 'rows': 10,
+        'label_width': 52.5, 'label_height': 29.7,
+        'margin_left': 0, 'margin_top': 0,
+    },
+    'roll_60x35': {
+        'label': "Rouleau - étiquette 60 x 35 mm",
+        'page_size': (60 * mm, 35 * mm),
+        'columns': 1, 'rows': 1,
+        'label_width': 60, 'label_height': 35,
+        'margin_left': 0, 'margin_top': 0,
+    },
+}
+
+DEFAULT_LAYOUT = 'a4_3x8'
+
+
+@lru_cache(maxsize=4096)
+def get_barcode_drawing(value: str, bar_width: float, bar_height: float):
+    """
+    Dessin Code128 d'un code (encodage et géométrie calculés une seule fois)
+
+    Args:
+        value: Valeur du code-barres
+        bar_width: Largeur d'une barre (points)
+        bar_height: Hauteur des barres (points)
+    """
+    from reportlab.graphics.barcode import code128
+    return code128.Code128(value, barWidth=bar_width, barHeight=bar_height)
+
+
+class LabelSheetGenerator:
+    """Générateur de planches d'étiquettes code-barres"""
+
+    def __init__(self):
+        self.output_dir = config.DATA_DIR / "barcodes"
+
+    def get_product_labels(self, product_ids: Iterable[int], copies: int = 1) -> List[Dict]:
+        """
+        Étiquettes pour une sélection de produits
+
+        Args:
+            product_ids: IDs des produits (ordre conservé)
+            copies: Nombre d'étiquettes par produit
+
+        Returns:
+            Liste de {product_id, name, barcode, price, copies}
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return []
+
+        placeholders = ", ".join("?" for _ in product_ids)
+        rows = db.execute_query(f"""
+            SELECT id, name, barcode, selling_price
+            FROM products
+            WHERE id IN ({placeholders})
+        """, tuple(product_ids))
+        by_id = {row['id']: row for row in rows}
+
+        return [
+            self._label(by_id[product_id], copies)
+            for product_id in product_ids if product_id in by_id
+        ]
+
+    def get_supplier_labels(self, supplier_id: int, since: str = None,
+                            copies: int = None) -> List[Dict]:
+        """
+        Étiquettes pour une livraison fournisseur
+
+        Args:
+            supplier_id: ID du fournisseur
+            since: Date de la livraison (YYYY-MM-DD) : une étiquette par unité
+                   réapprovisionnée depuis cette date
+            copies: Nombre fixe d'étiquettes par produit (ignore les quantités reçues)
+
+        Returns:
+            Liste de {product_id, name, barcode, price, copies}
+        """
+        if since and copies is None:
+            rows = db.execute_query("""
+                SELECT p.id, p.name, p.barcode, p.selling_price,
+                       SUM(m.quantity) as received
+                FROM stock_movements m
+                JOIN products p ON m.product_id = p.id
+                WHERE p.supplier_id = ? AND p.is_active = 1
+                  AND m.movement_type = 'restock' AND m.quantity > 0
+                  AND m.created_at >= ?
+                GROUP BY p.id
+                ORDER BY p.name
+            """, (supplier_id, since))
+            # Quantités fractionnaires (poids) : une étiquette par unité entamée
+            return [self._label(row, math.ceil(round(row['received'], 6)))
+                    for row in rows if row['received'] > 0]
+
+        rows = db.execute_query("""
+            SELECT id, name, barcode, selling_price
+            FROM products
+            WHERE supplier_id = ? AND is_active = 1
+            ORDER BY name
+        """, (supplier_id,))
+        return [self._label(row, copies or 1) for row in rows]
+
+    def _label(self, row, copies: int) -> Dict:
+        """Étiquette à partir d'une ligne produit"""
+        return {
+            'product_id': row['id'],
+            'name': row['name'],
+            'barcode': row['barcode'] or '',
+            'price': row['selling_price'],
+            'copies': max(int(copies), 0),
+        }
+
+    def generate_sheet(self, labels: List[Dict], layout: str = DEFAULT_LAYOUT,
+                       output_path: Optional[Path] = None,
+                       skip: int = 0) -> tuple[bool, str, Optional[Path]]:
+        """
+        Générer le PDF des étiquettes en une seule passe
+
+        Args:
+            labels: Liste de {name, barcode, price, copies}
+            layout: Format (clé de LABEL_LAYOUTS)
+            output_path: Fichier de sortie (défaut: data/barcodes/etiquettes_<date>.pdf)
+            skip: Nombre d'emplacements déjà utilisés sur la première planche
+
+        Returns:
+            (success, message, chemin du PDF)
+        """
+        spec = LABEL_LAYOUTS.get(layout)
+        if not spec:
+            return False, f"Format d'étiquettes inconnu: {layout}", None
+
+        printable = [label for label in labels if label.get('barcode') and label.get('copies', 1) > 0]
+        skipped = len(labels) - len(printable)
+        total = sum(label.get('copies', 1) for label in printable)
+        if not total:
+            return False, "Aucun produit avec code-barres à étiqueter", None
+
+        if output_path is None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            output_path = self.output_dir / f"etiquettes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+        try:
+            from reportlab.pdfgen import canvas
+            
+            page_width, page_height = spec['page_size']
+            columns, rows = spec['columns'], spec['rows']
+            per_page = columns * rows
+            label_width = spec['label_width'] * mm
+            label_height = spec['label_height'] * mm
+            left = spec['margin_left'] * mm
+            top = page_height - spec['margin_top'] * mm
+
+            # Barres : hauteur proportionnelle à l'étiquette
+            bar_height = label_height * 0.35
+            name_size = 8 if label_height >= 32 * mm else 7
+
+            c = canvas.Canvas(str(output_path), pagesize=(page_width, page_height))
+            position = skip % per_page
+
+            for label in printable:
+                value = str(label['barcode'])
+                name = label.get('name') or ''
+                name = name[:25] + "..." if len(name) > 25 else name
+                price = f"{float(label.get('price') or 0):g} DA"
+
+                # Largeur de barre ajustée pour tenir dans l'étiquette
+                drawing = get_barcode_drawing(value, 0.4 * mm, bar_height)
+                if drawing.width > label_width - 4 * mm:
+                    bar_width = 0.4 * mm * (label_width - 4 * mm) / drawing.width
+                    drawing = get_barcode_drawing(value, bar_width, bar_height)
+
+                for _ in range(label.get('copies', 1)):
+                    if position == per_page:
+                        c.showPage()
+                        position = 0
+
+                    x = left + (position % columns) * label_width
+                    y = top - (position // columns + 1) * label_height
+                    center = x + label_width / 2
+
+                    c.setFont("Helvetica-Bold", name_size)
+                    c.drawCentredString(center, y + label_height - 4 * mm - name_size * 0.35, name)
+
+                    drawing.drawOn(c, center - drawing.width / 2, y + 10 * mm)
+
+                    c.setFont("Helvetica", 6)
+                    c.drawCentredString(center, y + 6.5 * mm, value)
+
+                    c.setFont("Helvetica-Bold", 10)
+                    c.drawCentredString(center, y + 2 * mm, price)
+
+                    position += 1
+
+            c.save()
+
+            message = f"{total} étiquette(s) générée(s)"
+            if skipped:
+                message += f" ({skipped} produit(s) sans code-barres ignoré(s))"
+            logger.info(f"Planche d'étiquettes générée: {output_path} ({total} étiquettes)")
+            return True, message, Path(output_path)
+
+        except Exception as e:
+            error_msg = f"Erreur lors de la génération des étiquettes: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, None
+
+
+# Instance globale
+label_sheet_generator = LabelSheetGenerator()
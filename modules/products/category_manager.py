@@ -5,6 +5,7 @@ Gestionnaire de catégories de produits
 from typing import List, Optional, Dict, Any
 from database.db_manager import db
 from core.logger import logger
+from modules.reports.report_cache import report_cache
 
 
 class CategoryManager:
@@ -87,6 +88,7 @@ class CategoryManager:
             rows_affected = db.execute_update(query, tuple(params))
             
             if rows_affected > 0:
+                report_cache.mark_catalog_changed()
                 logger.info(f"Catégorie mise à jour: ID {category_id}")
                 return True, "Catégorie mise à jour avec succès"
             else:
@@ -120,6 +122,7 @@ class CategoryManager:
             rows_affected = db.execute_update(query, (category_id,))
             
             if rows_affected > 0:
+                report_cache.mark_catalog_changed()
                 logger.info(f"Catégorie supprimée: ID {category_id}")
                 return True, "Catégorie supprimée avec succès"
             else:
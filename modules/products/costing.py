@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Valorisation du stock : coût moyen pondéré et couches FIFO
+
+Chaque entrée en stock crée une couche de coût (quantité restante, coût
+unitaire) et recalcule products.average_cost ; chaque sortie consomme les
+couches les plus anciennes. Le coût d'une sortie est, selon
+STOCK_CONFIG['costing_method'], le coût moyen du moment ('average') ou
+celui des couches consommées ('fifo'). Il est calculé dans la transaction
+du mouvement et recopié sur la ligne de vente (sale_items.purchase_price) :
+les rapports de marge restent de simples sommes.
+
+Les couches sont tenues à jour dans les deux méthodes : changer de méthode
+ne demande aucune reprise.
+"""
+from typing import List, Dict, Iterable
+from database.db_manager import db
+import config
+
+# Nombre maximal de paramètres d'une clause IN (limite SQLite historique : 999)
+IN_CHUNK_SIZE = 500
+
+COSTING_METHODS = ('average', 'fifo')
+
+
+def weighted_average_cost(stock_quantity: float, average_cost: float,
+                          quantity: float, unit_cost: float) -> float:
+    """
+    Coût moyen pondéré après une entrée en stock
+
+    Un stock négatif (ventes enregistrées avant la réception) ne pèse pas
+    dans la moyenne : seul le stock réellement présent est valorisé.
+    """
+    on_hand = max(stock_quantity or 0, 0)
+    if on_hand + quantity <= 0:
+        return round(unit_cost, 4)
+    return round((on_hand * (average_cost or 0) + quantity * unit_cost) / (on_hand + quantity), 4)
+
+
+class CostingEngine:
+    """Coût des entrées et sorties de stock"""
+
+    @property
+    def method(self) -> str:
+        method = config.STOCK_CONFIG.get("costing_method", "average")
+        return method if method in COSTING_METHODS else "average"
+
+    def apply(self, movements: List[Dict], stock_applied: bool = False):
+        """
+        Valoriser un lot de mouvements (transaction de l'appelant)
+
+        Les mouvements sont traités dans l'ordre : une entrée crée une couche
+        au coût 'unit_cost' du mouvement (à défaut, le coût moyen actuel) ;
+        une sortie consomme les couches et reçoit son coût dans
+        movement['unit_cost']. Lectures et écritures sont groupées : deux
+        requêtes par paquet de produits, puis executemany.
+
+        Args:
+            movements: Mouvements {product_id, movement_type, quantity,
+                       source_id, unit_cost} (quantity signée)
+            stock_applied: True si products.stock_quantity inclut déjà les
+                           mouvements du lot
+        """
+        if not movements:
+            return
+
+        product_ids = list({movement['product_id'] for movement in movements})
+        products = {row['id']: row for row in self._fetch(product_ids, """
+            SELECT id, stock_quantity, COALESCE(average_cost, 0) as average_cost
+            FROM products
+            WHERE id IN ({placeholders})
+        """)}
+
+        layers: Dict[int, List[Dict]] = {}
+        for row in self._fetch(product_ids, """
+            SELECT id, product_id, unit_cost, quantity_remaining
+            FROM cost_layers
+            WHERE product_id IN ({placeholders}) AND quantity_remaining > 0
+            ORDER BY product_id, id
+        """):
+            layers.setdefault(row['product_id'], []).append({
+                'id': row['id'],
+                'unit_cost': row['unit_cost'],
+                'remaining': row['quantity_remaining'],
+                'initial': row['quantity_remaining'],
+            })
+
+        # Stock et coût moyen de chaque produit avant le lot
+        applied: Dict[int, float] = {}
+        if stock_applied:
+            for movement in movements:
+                applied[movement['product_id']] = applied.get(movement['product_id'], 0) + movement['quantity']
+        state = {}
+        for product_id, product in products.items():
+            stock = (product['stock_quantity'] or 0) - applied.get(product_id, 0)
+            state[product_id] = {'stock': stock, 'average': product['average_cost'],
+                                 'initial_average': product['average_cost']}
+
+        new_layers = []
+        for movement in movements:
+            current = state.get(movement['product_id'])
+            if current is None:
+                continue
+            quantity = movement['quantity']
+
+            if quantity > 0:
+                unit_cost = movement.get('unit_cost')
+                if unit_cost is None:
+                    unit_cost = current['average']
+                current['average'] = weighted_average_cost(current['stock'], current['average'], quantity, unit_cost)
+
+                # Les unités déjà vendues sans stock ont été valorisées au coût moyen
+                remaining = quantity + min(current['stock'], 0)
+                layer = {
+                    'id': None, 'product_id': movement['product_id'],
+                    'source_type': movement.get('movement_type', 'adjustment'),
+                    'source_id': movement.get('source_id'),
+                    'unit_cost': unit_cost, 'quantity': quantity,
+                    'remaining': max(remaining, 0),
+                }
+                new_layers.append(layer)
+                layers.setdefault(movement['product_id'], []).append(layer)
+            else:
+                fifo_cost = self._consume(layers.get(movement['product_id'], []), -quantity, current['average'])
+                unit_cost = fifo_cost if self.method == 'fifo' else current['average']
+
+            current['stock'] += quantity
+            movement['unit_cost'] = round(unit_cost, 4)
+
+        db.execute_many(
+            "UPDATE products SET average_cost = ? WHERE id = ?",
+            [(current['average'], product_id) for product_id, current in state.items()
+             if current['average'] != current['initial_average']]
+        )
+        db.execute_many(
+            "UPDATE cost_layers SET quantity_remaining = ? WHERE id = ?",
+            [(layer['remaining'], layer['id'])
+             for product_layers in layers.values() for layer in product_layers
+             if layer['id'] is not None and layer['remaining'] != layer['initial']]
+        )
+        db.execute_many("""
+            INSERT INTO cost_layers (
+                product_id, source_type, source_id, unit_cost, quantity, quantity_remaining
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (layer['product_id'], layer['source_type'], layer['source_id'],
+             layer['unit_cost'], layer['quantity'], layer['remaining'])
+            for layer in new_layers
+        ])
+
+    def _consume(self, layers: List[Dict], quantity: float, average_cost: float) -> float:
+        """
+        Consommer les couches les plus anciennes
+
+        Returns:
+            Coût unitaire FIFO de la sortie (la part sans couche est
+            valorisée au coût moyen)
+        """
+        if quantity <= 0:
+            return average_cost
+        needed = quantity
+        value = 0.0
+        for layer in layers:
+            if needed <= 0:
+                break
+            take = min(layer['remaining'], needed)
+            if take <= 0:
+                continue
+            layer['remaining'] = round(layer['remaining'] - take, 6)
+            value += take * layer['unit_cost']
+            needed -= take
+        value += max(needed, 0) * average_cost
+        return value / quantity
+
+    def get_layers(self, product_id: int) -> List[Dict]:
+        """Couches ouvertes d'un produit, de la plus ancienne à la plus récente"""
+        query = """
+            SELECT * FROM cost_layers
+            WHERE product_id = ? AND quantity_remaining > 0
+            ORDER BY id
+        """
+        return [dict(row) for row in db.execute_query(query, (product_id,))]
+
+    def _fetch(self, product_ids: List[int], query: str) -> Iterable:
+        """Exécuter une requête IN par paquets de IN_CHUNK_SIZE produits"""
+        for start in range(0, len(product_ids), IN_CHUNK_SIZE):
+            chunk = product_ids[start:start + IN_CHUNK_SIZE]
+            yield from db.execute_query(
+                query.format(placeholders=",".join("?" * len(chunk))), tuple(chunk)
+            )
+
+
+# Instance globale
+costing_engine = CostingEngine()
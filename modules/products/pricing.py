@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Historique des prix et modification des prix par lots
+
+L'historique (price_history) est écrit par l'application, avec l'auteur et
+la raison du changement, dans la transaction qui modifie les prix et avant
+l'UPDATE : une instruction INSERT ... SELECT par produit, exécutée en un
+seul executemany, lit les anciens prix sans requête supplémentaire.
+"""
+import math
+from typing import List, Dict, Optional, Tuple
+from database.db_manager import db
+from core.logger import logger
+from modules.reports.metrics_hub import metrics_hub
+
+PRICE_FIELDS = ('selling_price', 'purchase_price')
+
+# Modes de calcul du nouveau prix
+REPRICING_MODES = {
+    'percentage': "Variation du prix actuel (%)",
+    'margin': "Marge sur le coût moyen (%)",
+}
+
+
+class PriceManager:
+    """Historique des prix et changements de prix en masse"""
+
+    def record_changes(self, changes: List[Tuple[int, Optional[float], Optional[float]]],
+                       changed_by: int = None, reason: str = None) -> int:
+        """
+        Historiser des changements de prix (transaction de l'appelant)
+
+        À appeler avant l'UPDATE des produits : les anciens prix sont lus
+        dans la même instruction. Les lignes sans changement réel sont
+        ignorées.
+
+        Args:
+            changes: Liste de (product_id, nouveau prix d'achat, nouveau prix
+                     de vente) ; None = prix inchangé
+            changed_by: ID de l'utilisateur
+            reason: Raison du changement
+
+        Returns:
+            Nombre de lignes traitées
+        """
+        if not changes:
+            return 0
+        db.execute_many("""
+            INSERT INTO price_history (
+                product_id, old_purchase_price, new_purchase_price,
+                old_selling_price, new_selling_price, changed_by, reason
+            )
+            SELECT id, purchase_price, COALESCE(?1, purchase_price),
+                   selling_price, COALESCE(?2, selling_price), ?3, ?4
+            FROM products
+            WHERE id = ?5
+              AND (purchase_price IS NOT COALESCE(?1, purchase_price)
+                   OR selling_price IS NOT COALESCE(?2, selling_price))
+        """, [
+            (purchase_price, selling_price, changed_by, reason, product_id)
+            for product_id, purchase_price, selling_price in changes
+        ])
+        return len(changes)
+
+    def compute_repricing(self, percentage: float, field: str = 'selling_price',
+                          mode: str = 'percentage', category_id: int = None,
+                          supplier_id: int = None, round_to: float = 0) -> List[Dict]:
+        """
+        Calculer les nouveaux prix (aperçu, rien n'est écrit)
+
+        Args:
+            percentage: Variation (mode 'percentage') ou marge (mode 'margin')
+            field: 'selling_price' ou 'purchase_price'
+            mode: 'percentage' (prix actuel) ou 'margin' (coût moyen,
+                  prix de vente uniquement)
+            category_id: Limiter à une catégorie
+            supplier_id: Limiter à un fournisseur
+            round_to: Arrondir au multiple supérieur (ex: 5 DA) ; 0 = centimes
+
+        Returns:
+            Liste de {id, name, old_price, new_price} pour les prix modifiés
+
+        Raises:
+            ValueError: Paramètres invalides
+        """
+        if field not in PRICE_FIELDS:
+            raise ValueError(f"Champ de prix inconnu: {field}")
+        if mode not in REPRICING_MODES:
+            raise ValueError(f"Mode inconnu: {mode}")
+        if mode == 'margin' and field != 'selling_price':
+            raise ValueError("La marge s'applique au prix de vente")
+        if percentage <= -100:
+            raise ValueError("La variation doit être supérieure à -100 %")
+
+        query = f"""
+            SELECT id, name, {field} as old_price,
+                   COALESCE(average_cost, 0) as cost
+            FROM products
+            WHERE is_active = 1
+        """
+        params = []
+        if category_id:
+            query += " AND category_id = ?"
+            params.append(category_id)
+        if supplier_id:
+            query += " AND supplier_id = ?"
+            params.append(supplier_id)
+        query += " ORDER BY name"
+
+        factor = 1 + percentage / 100.0
+        result = []
+        for row in db.execute_query(query, tuple(params)):
+            base = row['cost'] if mode == 'margin' else row['old_price']
+            new_price = self._round_price((base or 0) * factor, round_to)
+            if new_price <= 0 or new_price == row['old_price']:
+                continue
+            result.append({
+                'id': row['id'],
+                'name': row['name'],
+                'old_price': row['old_price'],
+                'new_price': new_price,
+            })
+        return result
+
+    def apply_repricing(self, percentage: float, field: str = 'selling_price',
+                        mode: str = 'percentage', category_id: int = None,
+                        supplier_id: int = None, round_to: float = 0,
+                        changed_by: int = None, reason: str = None) -> tuple[bool, str, int]:
+        """
+        Modifier les prix d'un ensemble de produits
+
+        Les nouveaux prix sont calculés puis écrits dans une seule
+        transaction : un executemany pour l'historique, un pour les prix.
+
+        Args:
+            Voir compute_repricing ; changed_by et reason sont historisés
+
+        Returns:
+            (success, message, nombre de produits modifiés)
+        """
+        try:
+            db.begin_transaction()
+            try:
+                changes = self.compute_repricing(percentage, field, mode, category_id,
+                                                 supplier_id, round_to)
+                if not changes:
+                    db.rollback()
+                    return False, "Aucun prix à modifier", 0
+
+                if field == 'selling_price':
+                    history = [(c['id'], None, c['new_price']) for c in changes]
+                else:
+                    history = [(c['id'], c['new_price'], None) for c in changes]
+                self.record_changes(history, changed_by, reason or f"Modification en masse ({percentage:+g} %)")
+
+                db.execute_many(
+                    f"UPDATE products SET {field} = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    [(c['new_price'], c['id']) for c in changes]
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            metrics_hub.products_changed(c['id'] for c in changes)
+            logger.info(f"Prix modifiés en masse: {len(changes)} produits ({field} {percentage:+g} %, mode {mode})")
+            return True, f"{len(changes)} prix modifiés", len(changes)
+
+        except ValueError as e:
+            return False, str(e), 0
+        except Exception as e:
+            error_msg = f"Erreur lors de la modification des prix: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, 0
+
+    def _round_price(self, price: float, round_to: float) -> float:
+        """Arrondir au multiple supérieur de round_to (centimes si 0)"""
+        if round_to and round_to > 0:
+            return round(float(math.ceil(round(price / round_to, 6)) * round_to), 2)
+        return round(price, 2)
+
+
+# Instance globale
+price_manager = PriceManager()
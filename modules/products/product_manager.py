@@ -2,13 +2,29 @@
 """
 Gestionnaire de produits et de stock
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
 from datetime import datetime, timedelta
 from database.db_manager import db
+from database.records import ProductRow
 from core.logger import logger
+from modules.reports.metrics_hub import metrics_hub
+from modules.reports.report_cache import report_cache
+from .stock_ledger import stock_ledger
+from .pricing import price_manager
+from .alert_scheduler import alert_scheduler
 import config
 
 
+# Conditions des alertes (mêmes termes que les index idx_products_low_stock
+# et idx_products_expiry, pour que SQLite les utilise)
+LOW_STOCK_CONDITION = "p.is_active = 1 AND p.stock_quantity <= p.min_stock_level"
+EXPIRING_CONDITION = (
+    "p.is_active = 1 AND p.expiry_date > date('now') "
+    "AND p.expiry_date <= date('now', '+' || ? || ' days')"
+)
+EXPIRED_CONDITION = "p.is_active = 1 AND p.expiry_date <= date('now')"
+
+
 class ProductManager:
     """Gestionnaire de produits"""
     
@@ -59,21 +75,40 @@ class ProductManager:
                     return False, "Ce code-barres existe déjà", None
                 else:
                     # Réactiver le produit
+                    previous = db.fetch_one("SELECT stock_quantity FROM products WHERE id = ?", (product_id,))
                     update_query = """
                         UPDATE products 
                         SET name = ?, name_ar = ?, description = ?, category_id = ?,
-                            purchase_price = ?, selling_price = ?, stock_quantity = ?, min_stock_level = ?,
-                            unit = ?, expiry_date = ?, manufacturing_date = ?, supplier_id = ?, is_active = 1,
-                            created_by = ?
+                            purchase_price = ?, average_cost = ?, selling_price = ?, stock_quantity = ?,
+                            min_stock_level = ?, unit = ?, expiry_date = ?, manufacturing_date = ?,
+                            supplier_id = ?, is_active = 1, created_by = ?, updated_at = CURRENT_TIMESTAMP
                         WHERE id = ?
                     """
-                    db.execute_update(update_query, (
-                        name, name_ar, description, category_id,
-                        purchase_price, selling_price, stock_quantity, min_stock_level,
-                        unit, expiry_date, manufacturing_date, supplier_id, created_by,
-                        product_id
-                    ))
+                    db.begin_transaction()
+                    try:
+                        price_manager.record_changes(
+                            [(product_id, purchase_price, selling_price)], created_by, "Réactivation produit"
+                        )
+                        db.execute_update(update_query, (
+                            name, name_ar, description, category_id,
+                            purchase_price, purchase_price, selling_price, stock_quantity,
+                            min_stock_level, unit, expiry_date, manufacturing_date,
+                            supplier_id, created_by, product_id
+                        ))
+                        stock_ledger.record_movement(
+                            product_id, stock_quantity - (previous['stock_quantity'] or 0),
+                            'adjustment', created_by=created_by,
+                            notes="Réactivation produit", update_stock=False
+                        )
+                        # Nom et catégorie repris : rapports en cache à relibeller
+                        report_cache.mark_catalog_changed()
+                        db.commit()
+                    except Exception as e:
+                        db.rollback()
+                        raise e
                     
+                    metrics_hub.products_changed([product_id])
+                    alert_scheduler.schedule_expiry(product_id, name, expiry_date)
                     logger.info(f"Produit réactivé: {name} (ID: {product_id})")
                     return True, "Produit réactivé avec succès", product_id
             
@@ -81,17 +116,31 @@ class ProductManager:
             insert_query = """
                 INSERT INTO products (
                     barcode, name, name_ar, description, category_id,
-                    purchase_price, selling_price, stock_quantity, min_stock_level,
+                    purchase_price, average_cost, selling_price, stock_quantity, min_stock_level,
                     unit, expiry_date, manufacturing_date, supplier_id, created_by
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
             
-            product_id = db.execute_insert(insert_query, (
-                barcode, name, name_ar, description, category_id,
-                purchase_price, selling_price, stock_quantity, min_stock_level,
-                unit, expiry_date, manufacturing_date, supplier_id, created_by
-            ))
+            db.begin_transaction()
+            try:
+                product_id = db.execute_insert(insert_query, (
+                    barcode, name, name_ar, description, category_id,
+                    purchase_price, purchase_price, selling_price, stock_quantity, min_stock_level,
+                    unit, expiry_date, manufacturing_date, supplier_id, created_by
+                ))
+                
+                # Journaliser le stock initial
+                stock_ledger.record_movement(
+                    product_id, stock_quantity, 'adjustment', created_by=created_by,
+                    notes="Stock initial", update_stock=False
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                raise e
             
+            metrics_hub.products_changed([product_id])
+            alert_scheduler.schedule_expiry(product_id, name, expiry_date)
             logger.info(f"Produit créé: {name} (ID: {product_id})")
             
             # Vérifier le stock minimum
@@ -105,12 +154,16 @@ class ProductManager:
             logger.error(error_msg)
             return False, error_msg, None
     
-    def update_product(self, product_id: int, **kwargs) -> tuple[bool, str]:
+    def update_product(self, product_id: int, changed_by: int = None, **kwargs) -> tuple[bool, str]:
         """
         Mettre à jour un produit
         
+        updated_at est positionné dans la même instruction, sauf pour une
+        mise à jour du seul stock ; un changement de prix est historisé.
+        
         Args:
             product_id: ID du produit
+            changed_by: ID de l'utilisateur (historique des prix)
             **kwargs: Champs à mettre à jour
             
         Returns:
@@ -137,13 +190,47 @@ class ProductManager:
             if not updates:
                 return False, "Aucune modification à effectuer"
             
+            if any(field != 'stock_quantity' for field in kwargs if field in allowed_fields):
+                updates.append("updated_at = CURRENT_TIMESTAMP")
             params.append(product_id)
             
-            # Exécuter la mise à jour
-            query = f"UPDATE products SET {', '.join(updates)} WHERE id = ?"
-            rows_affected = db.execute_update(query, tuple(params))
+            db.begin_transaction()
+            try:
+                # Stock avant modification, pour journaliser l'écart d'inventaire
+                previous = None
+                if 'stock_quantity' in kwargs:
+                    previous = db.fetch_one("SELECT stock_quantity FROM products WHERE id = ?", (product_id,))
+                
+                # Historique des prix (anciens prix lus avant l'UPDATE)
+                if 'purchase_price' in kwargs or 'selling_price' in kwargs:
+                    price_manager.record_changes(
+                        [(product_id, kwargs.get('purchase_price'), kwargs.get('selling_price'))],
+                        changed_by, "Modification produit"
+                    )
+                
+                # Exécuter la mise à jour
+                query = f"UPDATE products SET {', '.join(updates)} WHERE id = ?"
+                rows_affected = db.execute_update(query, tuple(params))
+                
+                if previous is not None and rows_affected > 0:
+                    stock_ledger.record_movement(
+                        product_id, kwargs['stock_quantity'] - (previous['stock_quantity'] or 0),
+                        'adjustment', notes="Modification produit", update_stock=False
+                    )
+                
+                # Libellé ou catégorie : rapports en cache à recalculer
+                if rows_affected > 0 and ('name' in kwargs or 'category_id' in kwargs):
+                    report_cache.mark_catalog_changed()
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                raise e
             
             if rows_affected > 0:
+                metrics_hub.products_changed([product_id])
+                if 'expiry_date' in kwargs:
+                    product = self.get_product(product_id)
+                    alert_scheduler.schedule_expiry(product_id, product['name'], product['expiry_date'])
                 logger.info(f"Produit mis à jour: ID {product_id}")
                 
                 # Vérifier le stock si modifié
@@ -172,10 +259,11 @@ class ProductManager:
             (success, message)
         """
         try:
-            query = "UPDATE products SET is_active = 0 WHERE id = ?"
+            query = "UPDATE products SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?"
             rows_affected = db.execute_update(query, (product_id,))
             
             if rows_affected > 0:
+                metrics_hub.products_changed([product_id])
                 logger.info(f"Produit supprimé: ID {product_id}")
                 return True, "Produit supprimé avec succès"
             else:
@@ -227,7 +315,7 @@ class ProductManager:
         return dict(result) if result else None
     
     def search_products(self, search_term: str, category_id: int = None,
-                       include_inactive: bool = False) -> List[Dict]:
+                       include_inactive: bool = False) -> List[ProductRow]:
         """
         Rechercher des produits
         
@@ -237,12 +325,9 @@ class ProductManager:
             include_inactive: Inclure les produits désactivés
             
         Returns:
-            Liste de produits correspondants
+            Liste de produits correspondants (ProductRow)
         """
-        query = """
-            SELECT p.*, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
+        query = ProductRow.SELECT + """
             WHERE (p.name LIKE ? OR p.name_ar LIKE ? OR p.barcode LIKE ?)
         """
         
@@ -257,29 +342,23 @@ class ProductManager:
         
         query += " ORDER BY p.name LIMIT 100"
         
-        results = db.execute_query(query, tuple(params))
-        return [dict(row) for row in results]
+        return list(db.iter_records(ProductRow, query, tuple(params)))
     
-    def get_all_products(self, category_id: int = None, 
-                        include_inactive: bool = False,
-                        limit: int = None) -> List[Dict]:
+    def iter_products(self, category_id: int = None,
+                      include_inactive: bool = False,
+                      limit: int = None) -> Iterator[ProductRow]:
         """
-        Obtenir tous les produits
+        Parcourir les produits sans construire de liste
         
         Args:
             category_id: Filtrer par catégorie
             include_inactive: Inclure les produits désactivés
             limit: Limiter le nombre de résultats
             
-        Returns:
-            Liste de produits
-        """
-        query = """
-            SELECT p.*, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE 1=1
+        Yields:
+            Un ProductRow par produit, par nom
         """
+        query = ProductRow.SELECT + " WHERE 1=1"
         
         params = []
         
@@ -293,27 +372,49 @@ class ProductManager:
         query += " ORDER BY p.name"
         
         if limit:
-            query += f" LIMIT {limit}"
+            query += " LIMIT ?"
+            params.append(int(limit))
         
-        results = db.execute_query(query, tuple(params) if params else ())
-        return [dict(row) for row in results]
+        return db.iter_records(ProductRow, query, tuple(params))
+    
+    def get_all_products(self, category_id: int = None, 
+                        include_inactive: bool = False,
+                        limit: int = None) -> List[ProductRow]:
+        """
+        Obtenir tous les produits
+        
+        Args:
+            category_id: Filtrer par catégorie
+            include_inactive: Inclure les produits désactivés
+            limit: Limiter le nombre de résultats
+            
+        Returns:
+            Liste de produits (ProductRow)
+        """
+        return list(self.iter_products(category_id, include_inactive, limit))
     
     def update_stock(self, product_id: int, quantity_change: int, 
-                    reason: str = "adjustment") -> tuple[bool, str]:
+                    reason: str = "adjustment", source_id: int = None,
+                    created_by: int = None) -> tuple[bool, str]:
         """
         Mettre à jour le stock d'un produit
         
         Args:
             product_id: ID du produit
             quantity_change: Changement de quantité (positif ou négatif)
-            reason: Raison du changement
+            reason: Raison du changement (type de mouvement du journal)
+            source_id: ID du document d'origine (vente, retour...)
+            created_by: ID de l'utilisateur
             
         Returns:
             (success, message)
         """
         try:
             # Obtenir le stock actuel
-            product = self.get_product(product_id)
+            product = db.fetch_one(
+                "SELECT name, stock_quantity, min_stock_level FROM products WHERE id = ?",
+                (product_id,)
+            )
             if not product:
                 return False, "Produit introuvable"
             
@@ -322,11 +423,16 @@ class ProductManager:
             if new_quantity < 0:
                 return False, "Stock insuffisant"
             
-            # Mettre à jour le stock
-            query = "UPDATE products SET stock_quantity = ? WHERE id = ?"
-            db.execute_update(query, (new_quantity, product_id))
+            # Journaliser et mettre à jour le stock (incrément atomique)
+            movement_type = reason if reason in ('sale', 'return', 'cancel', 'restock') else 'adjustment'
+            stock_ledger.record_movement(
+                product_id, quantity_change, movement_type,
+                source_id=source_id, created_by=created_by,
+                notes=None if reason == movement_type else reason
+            )
             
-            logger.info(f"Stock mis à jour: {product['name']} - {quantity_change:+d} ({reason})")
+            metrics_hub.products_changed([product_id])
+            logger.info(f"Stock mis à jour: {product['name']} - {quantity_change:+g} ({reason})")
             
             # Vérifier le stock minimum
             if new_quantity <= product['min_stock_level']:
@@ -372,17 +478,21 @@ class ProductManager:
         Returns:
             Liste de produits
         """
-        query = """
+        query = f"""
             SELECT p.*, c.name as category_name
             FROM products p
             LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.stock_quantity <= p.min_stock_level 
-              AND p.is_active = 1
+            WHERE {LOW_STOCK_CONDITION}
             ORDER BY p.stock_quantity ASC
         """
         results = db.execute_query(query)
         return [dict(row) for row in results]
     
+    def count_low_stock_products(self) -> int:
+        """Nombre de produits en stock faible (index partiel)"""
+        result = db.fetch_one(f"SELECT COUNT(*) as count FROM products p WHERE {LOW_STOCK_CONDITION}")
+        return result['count'] if result else 0
+    
     def get_expiring_products(self, days: int = 30) -> List[Dict]:
         """
         Obtenir les produits qui expirent bientôt
@@ -393,20 +503,22 @@ class ProductManager:
         Returns:
             Liste de produits
         """
-        query = """
+        query = f"""
             SELECT p.*, c.name as category_name,
                    CAST((julianday(p.expiry_date) - julianday('now')) AS INTEGER) as days_until_expiry
             FROM products p
             LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.expiry_date IS NOT NULL 
-              AND p.expiry_date > date('now')
-              AND p.expiry_date <= date('now', '+' || ? || ' days')
-              AND p.is_active = 1
+            WHERE {EXPIRING_CONDITION}
             ORDER BY p.expiry_date ASC
         """
         results = db.execute_query(query, (days,))
         return [dict(row) for row in results]
     
+    def count_expiring_products(self, days: int = 30) -> int:
+        """Nombre de produits qui expirent dans les `days` jours (plage sur l'index)"""
+        result = db.fetch_one(f"SELECT COUNT(*) as count FROM products p WHERE {EXPIRING_CONDITION}", (days,))
+        return result['count'] if result else 0
+    
     def get_expired_products(self) -> List[Dict]:
         """
         Obtenir les produits expirés
@@ -414,18 +526,21 @@ class ProductManager:
         Returns:
             Liste de produits expirés
         """
-        query = """
+        query = f"""
             SELECT p.*, c.name as category_name
             FROM products p
             LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.expiry_date IS NOT NULL 
-              AND p.expiry_date <= date('now')
-              AND p.is_active = 1
+            WHERE {EXPIRED_CONDITION}
             ORDER BY p.expiry_date DESC
         """
         results = db.execute_query(query)
         return [dict(row) for row in results]
     
+    def count_expired_products(self) -> int:
+        """Nombre de produits expirés (plage sur l'index)"""
+        result = db.fetch_one(f"SELECT COUNT(*) as count FROM products p WHERE {EXPIRED_CONDITION}")
+        return result['count'] if result else 0
+    
     def set_promotion(self, product_id: int, discount_percentage: float) -> tuple[bool, str]:
         """
         Mettre un produit en promotion
@@ -445,7 +560,7 @@ class ProductManager:
             
             query = """
                 UPDATE products 
-                SET discount_percentage = ?, is_on_promotion = ?
+                SET discount_percentage = ?, is_on_promotion = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             """
             rows_affected = db.execute_update(query, (discount_percentage, is_on_promotion, product_id))
@@ -494,7 +609,7 @@ class ProductManager:
             FROM price_history ph
             LEFT JOIN users u ON ph.changed_by = u.id
             WHERE ph.product_id = ?
-            ORDER BY ph.changed_at DESC
+            ORDER BY ph.changed_at DESC, ph.id DESC
         """
         results = db.execute_query(query, (product_id,))
         return [dict(row) for row in results]
@@ -519,16 +634,18 @@ class ProductManager:
         stats['total_stock_value'] = round(result['value'], 2) if result and result['value'] else 0.0
         
         # Produits en stock faible
-        stats['low_stock_count'] = len(self.get_low_stock_products())
+        stats['low_stock_count'] = self.count_low_stock_products()
         
         # Produits expirant bientôt
-        stats['expiring_soon_count'] = len(self.get_expiring_products())
+        stats['expiring_soon_count'] = self.count_expiring_products()
         
         # Produits expirés
-        stats['expired_count'] = len(self.get_expired_products())
+        stats['expired_count'] = self.count_expired_products()
         
         # Produits en promotion
-        stats['promoted_count'] = len(self.get_promoted_products())
+        query = "SELECT COUNT(*) as count FROM products WHERE is_on_promotion = 1 AND is_active = 1"
+        result = db.fetch_one(query)
+        stats['promoted_count'] = result['count'] if result else 0
         
         return stats
 
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Journal des mouvements de stock (ajout seul)
+"""
+from typing import List, Dict, Iterable
+from database.db_manager import db
+from core.logger import logger
+from .costing import costing_engine
+
+
+# Types de mouvements autorisés (voir CHECK de la table stock_movements)
+MOVEMENT_TYPES = ('sale', 'return', 'cancel', 'restock', 'adjustment')
+
+# Écart toléré entre stock et journal (sommes de quantités fractionnaires)
+RECONCILE_TOLERANCE = 1e-6
+
+
+class StockLedger:
+    """Journal des mouvements de stock et quantités matérialisées"""
+
+    def record_movements(self, movements: Iterable[Dict], created_by: int = None,
+                         update_stock: bool = True) -> int:
+        """
+        Enregistrer un lot de mouvements de stock
+
+        Les lignes du journal et la mise à jour incrémentale de
+        products.stock_quantity sont écrites avec executemany dans la même
+        transaction. Appelé à l'intérieur d'une transaction ouverte, le lot
+        en fait partie ; sinon il est validé immédiatement.
+
+        Chaque mouvement est valorisé par le moteur de coût : une entrée
+        au coût 'unit_cost' fourni (sinon au coût moyen), une sortie à son
+        coût calculé, renseigné dans movement['unit_cost'].
+
+        Args:
+            movements: Liste de {product_id, movement_type, quantity, source_id,
+                       notes, unit_cost} (quantity signée : négative pour une
+                       sortie de stock)
+            created_by: ID de l'utilisateur
+            update_stock: False si stock_quantity a déjà été positionné
+                          (journalisation seule)
+
+        Returns:
+            Nombre de mouvements enregistrés
+        """
+        valid = []
+        deltas: Dict[int, float] = {}
+
+        for movement in movements:
+            product_id = movement.get('product_id')
+            quantity = movement.get('quantity', 0)
+            # Produits divers (id <= 0) et variations nulles : rien à suivre
+            if not product_id or product_id <= 0 or not quantity:
+                continue
+
+            movement_type = movement.get('movement_type', 'adjustment')
+            if movement_type not in MOVEMENT_TYPES:
+                raise ValueError(f"Type de mouvement inconnu: {movement_type}")
+
+            valid.append(movement)
+            deltas[product_id] = deltas.get(product_id, 0) + quantity
+
+        if not valid:
+            return 0
+
+        db.begin_transaction()
+        try:
+            # Valorisation avant la mise à jour du stock (sauf si déjà positionné)
+            costing_engine.apply(valid, stock_applied=not update_stock)
+
+            db.execute_many("""
+                INSERT INTO stock_movements (
+                    product_id, movement_type, quantity, unit_cost, source_id, created_by, notes
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (movement['product_id'], movement.get('movement_type', 'adjustment'),
+                 movement['quantity'], movement.get('unit_cost'), movement.get('source_id'),
+                 created_by, movement.get('notes'))
+                for movement in valid
+            ])
+
+            if update_stock:
+                db.execute_many(
+                    "UPDATE products SET stock_quantity = stock_quantity + ? WHERE id = ?",
+                    [(delta, product_id) for product_id, delta in deltas.items()]
+                )
+
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return len(valid)
+
+    def record_movement(self, product_id: int, quantity: float, movement_type: str,
+                        source_id: int = None, created_by: int = None,
+                        notes: str = None, update_stock: bool = True) -> int:
+        """
+        Enregistrer un mouvement de stock unique
+
+        Args:
+            product_id: ID du produit
+            quantity: Variation signée
+            movement_type: Type de mouvement
+            source_id: ID du document d'origine
+            created_by: ID de l'utilisateur
+            notes: Notes
+            update_stock: Mettre à jour stock_quantity
+
+        Returns:
+            Nombre de mouvements enregistrés (0 ou 1)
+        """
+        return self.record_movements([{
+            'product_id': product_id,
+            'movement_type': movement_type,
+            'quantity': quantity,
+            'source_id': source_id,
+            'notes': notes,
+        }], created_by=created_by, update_stock=update_stock)
+
+    def get_movements(self, product_id: int = None, start_date: str = None,
+                      end_date: str = None, movement_type: str = None,
+                      limit: int = 500) -> List[Dict]:
+        """
+        Obtenir les mouvements de stock (balayage d'index par plage de dates)
+
+        Args:
+            product_id: Filtrer par produit
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin (YYYY-MM-DD)
+            movement_type: Filtrer par type
+            limit: Nombre maximum de résultats
+
+        Returns:
+            Liste des mouvements
+        """
+        query = """
+            SELECT sm.*, p.name as product_name, u.full_name as created_by_name
+            FROM stock_movements sm
+            JOIN products p ON sm.product_id = p.id
+            LEFT JOIN users u ON sm.created_by = u.id
+            WHERE 1=1
+        """
+        params = []
+
+        if product_id:
+            query += " AND sm.product_id = ?"
+            params.append(product_id)
+
+        if movement_type:
+            query += " AND sm.movement_type = ?"
+            params.append(movement_type)
+
+        # Bornes sur la colonne brute pour rester dans l'index
+        if start_date:
+            query += " AND sm.created_at >= ?"
+            params.append(start_date)
+
+        if end_date:
+            query += " AND sm.created_at < date(?, '+1 day')"
+            params.append(end_date)
+
+        query += " ORDER BY sm.created_at DESC, sm.id DESC LIMIT ?"
+        params.append(limit)
+
+        results = db.execute_query(query, tuple(params))
+        return [dict(row) for row in results]
+
+    def get_stock_at(self, product_id: int, date: str) -> float:
+        """
+        Obtenir la quantité en stock d'un produit à une date donnée
+
+        Args:
+            product_id: ID du produit
+            date: Date (YYYY-MM-DD), fin de journée incluse
+
+        Returns:
+            Quantité en stock
+        """
+        query = """
+            SELECT COALESCE(SUM(quantity), 0) as quantity
+            FROM stock_movements
+            WHERE product_id = ? AND created_at < date(?, '+1 day')
+        """
+        result = db.fetch_one(query, (product_id, date))
+        return result['quantity'] if result else 0
+
+    def get_shrinkage_report(self, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Obtenir les pertes (ajustements négatifs) par produit sur une période
+
+        Args:
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin (YYYY-MM-DD)
+
+        Returns:
+            Liste des produits avec quantité et valeur perdues
+        """
+        query = """
+            SELECT
+                p.id,
+                p.name,
+                -SUM(sm.quantity) as quantity_lost,
+                -SUM(sm.quantity) * p.purchase_price as value_lost,
+                COUNT(*) as adjustment_count
+            FROM stock_movements sm
+            JOIN products p ON sm.product_id = p.id
+            WHERE sm.movement_type = 'adjustment'
+              AND sm.quantity < 0
+              AND sm.created_at >= ?
+              AND sm.created_at < date(?, '+1 day')
+            GROUP BY p.id, p.name, p.purchase_price
+            ORDER BY value_lost DESC
+        """
+        results = db.execute_query(query, (start_date, end_date))
+        return [dict(row) for row in results]
+
+    def reconcile(self, fix: bool = True) -> List[Dict]:
+        """
+        Recalculer les quantités en stock depuis le journal
+
+        Une seule requête groupée compare products.stock_quantity à la somme
+        des mouvements, à RECONCILE_TOLERANCE près (arrondis des quantités
+        fractionnaires) ; les écarts sont corrigés en un executemany.
+
+        Args:
+            fix: Corriger stock_quantity avec la valeur du journal
+
+        Returns:
+            Liste des écarts {product_id, name, stock_quantity, ledger_quantity}
+        """
+        query = """
+            SELECT p.id as product_id, p.name, p.stock_quantity,
+                   COALESCE(m.ledger_quantity, 0) as ledger_quantity
+            FROM products p
+            LEFT JOIN (
+                SELECT product_id, SUM(quantity) as ledger_quantity
+                FROM stock_movements
+                GROUP BY product_id
+            ) m ON m.product_id = p.id
+            WHERE ABS(p.stock_quantity - COALESCE(m.ledger_quantity, 0)) > ?
+        """
+        discrepancies = [dict(row) for row in db.execute_query(query, (RECONCILE_TOLERANCE,))]
+
+        if discrepancies and fix:
+            db.execute_many(
+                "UPDATE products SET stock_quantity = ? WHERE id = ?",
+                [(d['ledger_quantity'], d['product_id']) for d in discrepancies]
+            )
+            logger.warning(f"Réconciliation du stock: {len(discrepancies)} écart(s) corrigé(s)")
+            from modules.reports.metrics_hub import metrics_hub
+            metrics_hub.products_changed(d['product_id'] for d in discrepancies)
+
+        return discrepancies
+
+
+# Instance globale
+stock_ledger = StockLedger()
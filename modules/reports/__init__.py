@@ -4,5 +4,10 @@ Package reports - Génération de rapports
 """
 from .sales_report import SalesReportManager
 from .profit_report import ProfitReportManager
+from .reorder_report import ReorderEngine
+from .analytics import SalesAnalytics
+from .report_cache import ReportCache
+from .metrics_hub import MetricsHub
 
-__all__ = ['SalesReportManager', 'ProfitReportManager']
+__all__ = ['SalesReportManager', 'ProfitReportManager', 'ReorderEngine', 'SalesAnalytics', 'ReportCache',
+           'MetricsHub']
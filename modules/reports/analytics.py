@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Analyses vectorisées des ventes d'une période
+
+Les lignes de vente de la période sont lues en une seule requête et rangées
+en colonnes NumPy ; totaux, bénéfice par produit, par catégorie, tendance
+journalière et produits à perte sont calculés à partir de ce seul parcours
+(regroupements par np.unique + np.bincount).
+"""
+import importlib.util
+from typing import List, Dict, Any, Optional
+from database.db_manager import db
+from core.logger import logger
+
+# numpy et pandas ne sont importés qu'au premier calcul (démarrage plus rapide)
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+PANDAS_AVAILABLE = importlib.util.find_spec("pandas") is not None
+np = None
+
+if not NUMPY_AVAILABLE:
+    logger.warning("Module numpy non disponible. Rapports calculés par requêtes SQL.")
+
+
+def _import_numpy():
+    """Importer numpy au premier usage"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+# Une ligne par article vendu (les valeurs NULL sont ramenées à 0)
+PERIOD_LINES_QUERY = """
+    SELECT
+        s.id as sale_id,
+        date(s.sale_date) as day,
+        COALESCE(s.cashier_id, 0) as cashier_id,
+        COALESCE(si.product_id, 0) as product_id,
+        p.name as product_name,
+        p.name_ar as product_name_ar,
+        COALESCE(p.category_id, 0) as category_id,
+        c.name as category_name,
+        c.name_ar as category_name_ar,
+        si.quantity,
+        si.quantity * si.unit_price * (1 - si.discount_percentage / 100.0) as revenue,
+        si.quantity * COALESCE(si.purchase_price, 0) as cost
+    FROM sale_items si
+    JOIN sales s ON si.sale_id = s.id
+    LEFT JOIN products p ON si.product_id = p.id
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE date(s.sale_date) BETWEEN ? AND ?
+      AND s.status = 'completed'
+"""
+
+
+def _margin(profit, revenue):
+    """Marge en % (0 si pas de chiffre d'affaires)"""
+    return np.round(np.divide(profit * 100, revenue, out=np.zeros_like(profit), where=revenue > 0), 2)
+
+
+class PeriodAnalytics:
+    """Lignes de vente d'une période en colonnes NumPy"""
+
+    def __init__(self, start_date: str, end_date: str, rows: list):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.size = len(rows)
+
+        columns = list(zip(*rows)) if rows else [()] * 12
+        (sale_ids, days, cashier_ids, product_ids, product_names, product_names_ar,
+         category_ids, category_names, category_names_ar, quantities, revenues, costs) = columns
+
+        self.sale_id = np.array(sale_ids, dtype=np.int64)
+        self.day = np.array(days, dtype='U10')
+        self.cashier_id = np.array(cashier_ids, dtype=np.int64)
+        self.product_id = np.array(product_ids, dtype=np.int64)
+        self.category_id = np.array(category_ids, dtype=np.int64)
+        self.quantity = np.array(quantities, dtype=np.float64)
+        self.revenue = np.array(revenues, dtype=np.float64)
+        self.cost = np.array(costs, dtype=np.float64)
+        self.profit = self.revenue - self.cost
+
+        # Libellés (un seul exemplaire par identifiant)
+        self.product_names = dict(zip(product_ids, zip(product_names, product_names_ar)))
+        self.category_names = dict(zip(category_ids, zip(category_names, category_names_ar)))
+
+    def _group(self, keys, mask=None):
+        """Sommes de quantité, CA et coût par clé"""
+        quantity, revenue, cost = self.quantity, self.revenue, self.cost
+        if mask is not None:
+            keys, quantity, revenue, cost = keys[mask], quantity[mask], revenue[mask], cost[mask]
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+        size = len(unique)
+        # bincount renvoie des entiers sur une entrée vide : forcer le type
+        quantity = np.bincount(inverse, weights=quantity, minlength=size).astype(np.float64)
+        revenue = np.round(np.bincount(inverse, weights=revenue, minlength=size).astype(np.float64), 2)
+        cost = np.round(np.bincount(inverse, weights=cost, minlength=size).astype(np.float64), 2)
+        profit = np.round(revenue - cost, 2)
+        return unique, quantity, revenue, cost, profit
+
+    def summary(self) -> Dict[str, Any]:
+        """Totaux de la période (format de get_profit_by_period)"""
+        total_revenue = round(float(self.revenue.sum()), 2)
+        total_cost = round(float(self.cost.sum()), 2)
+        net_profit = round(total_revenue - total_cost, 2)
+
+        return {
+            'period': {
+                'start_date': self.start_date,
+                'end_date': self.end_date,
+            },
+            'total_revenue': total_revenue,
+            'total_cost': total_cost,
+            'net_profit': net_profit,
+            'profit_margin': round((net_profit / total_revenue) * 100, 2) if total_revenue > 0 else 0.0,
+            'sale_count': int(len(np.unique(self.sale_id))),
+            'total_items_sold': float(self.quantity.sum()) if self.size else 0,
+        }
+
+    def _products(self) -> tuple:
+        """Regroupement par produit (lignes sans produit exclues)"""
+        return self._group(self.product_id, self.product_id != 0)
+
+    def _product_rows(self, order, ids, quantity, revenue, cost, profit, margin) -> List[Dict]:
+        rows = []
+        for i in order:
+            product_id = int(ids[i])
+            name, name_ar = self.product_names[product_id]
+            rows.append({
+                'id': product_id,
+                'name': name,
+                'name_ar': name_ar,
+                'quantity_sold': float(quantity[i]),
+                'revenue': float(revenue[i]),
+                'cost': float(cost[i]),
+                'profit': float(profit[i]),
+                'profit_margin': float(margin[i]),
+            })
+        return rows
+
+    def by_product(self, limit: int = 20) -> List[Dict]:
+        """Bénéfice par produit, du plus rentable au moins rentable"""
+        ids, quantity, revenue, cost, profit = self._products()
+        order = np.argsort(-profit, kind='stable')[:limit]
+        return self._product_rows(order, ids, quantity, revenue, cost, profit, _margin(profit, revenue))
+
+    def loss_making(self) -> List[Dict]:
+        """Produits vendus à perte, de la plus grosse perte à la plus petite"""
+        ids, quantity, revenue, cost, profit = self._products()
+        losses = np.flatnonzero(profit < 0)
+        order = losses[np.argsort(profit[losses], kind='stable')]
+        return self._product_rows(order, ids, quantity, revenue, cost, profit, _margin(profit, revenue))
+
+    def by_category(self) -> List[Dict]:
+        """Bénéfice par catégorie"""
+        ids, quantity, revenue, cost, profit = self._group(self.category_id, self.category_id != 0)
+        margin = _margin(profit, revenue)
+
+        categories = []
+        for i in np.argsort(-profit, kind='stable'):
+            category_id = int(ids[i])
+            name, name_ar = self.category_names[category_id]
+            categories.append({
+                'id': category_id,
+                'category_name': name,
+                'category_name_ar': name_ar,
+                'quantity_sold': float(quantity[i]),
+                'revenue': float(revenue[i]),
+                'cost': float(cost[i]),
+                'profit': float(profit[i]),
+                'profit_margin': float(margin[i]),
+            })
+        return categories
+
+    def daily_trend(self) -> List[Dict]:
+        """Bénéfice jour par jour (ordre chronologique)"""
+        days, _, revenue, cost, profit = self._group(self.day)
+        margin = _margin(profit, revenue)
+        return [
+            {
+                'date': str(days[i]),
+                'revenue': float(revenue[i]),
+                'cost': float(cost[i]),
+                'profit': float(profit[i]),
+                'profit_margin': float(margin[i]),
+            }
+            for i in range(len(days))
+        ]
+
+    def to_dataframe(self):
+        """
+        Lignes de la période en DataFrame pandas (analyses ad hoc, exports)
+
+        Raises:
+            ImportError: pandas non installé
+        """
+        if not PANDAS_AVAILABLE:
+            raise ImportError("Le module 'pandas' est requis pour cette analyse.")
+        import pandas as pd
+
+        return pd.DataFrame({
+            'sale_id': self.sale_id,
+            'date': self.day,
+            'cashier_id': self.cashier_id,
+            'product_id': self.product_id,
+            'category_id': self.category_id,
+            'quantity': self.quantity,
+            'revenue': self.revenue,
+            'cost': self.cost,
+            'profit': self.profit,
+        })
+
+
+class SalesAnalytics:
+    """Chargement des périodes analysées"""
+
+    def load_period(self, start_date: str, end_date: str) -> Optional[PeriodAnalytics]:
+        """
+        Lire les lignes de vente de la période (une seule requête)
+
+        Args:
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin (YYYY-MM-DD)
+
+        Returns:
+            Analyse de la période, None si numpy n'est pas installé
+        """
+        if not NUMPY_AVAILABLE:
+            return None
+        _import_numpy()
+
+        rows = db.execute_query(PERIOD_LINES_QUERY, (start_date, end_date))
+        return PeriodAnalytics(start_date, end_date, rows)
+
+
+# Instance globale
+sales_analytics = SalesAnalytics()
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Compteurs du tableau de bord tenus à jour par les écritures
+
+Les compteurs (ventes de la session de caisse ouverte, produits actifs,
+stock faible, expiration proche) sont chargés une fois, puis mis à jour
+par les opérations qui les modifient : vente, annulation, retour, création
+ou modification de produit. Seuls les produits concernés sont relus (par
+clé primaire) ; les abonnés reçoivent les nouvelles valeurs aussitôt.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, Iterable, List, Optional
+from database.db_manager import db
+from core.logger import logger
+import config
+
+
+class MetricsHub:
+    """Compteurs du tableau de bord mis à jour incrémentalement"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._loaded = False
+        self._day = None
+        self._register_number = None
+        self._sales_count = 0
+        self._total_sales = 0.0
+        self._active = set()
+        self._low_stock = set()
+        self._expiring = set()
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """
+        Abonner une fonction aux changements des compteurs
+
+        Args:
+            callback: Appelée avec l'instantané des compteurs, depuis le
+                      thread de l'écriture
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Dict[str, Any]], None]):
+        """Désabonner une fonction"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self):
+        """Prévenir les abonnés"""
+        snapshot = self._snapshot()
+        for callback in list(self._listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Erreur notification tableau de bord: {e}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sales_count': self._sales_count,
+                'total_sales': round(self._total_sales, 2),
+                'product_count': len(self._active),
+                'low_stock_count': len(self._low_stock),
+                'expiring_count': len(self._expiring),
+            }
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        Valeurs courantes des compteurs (rechargées au premier appel et
+        au changement de jour, la fenêtre d'expiration étant datée)
+
+        Returns:
+            {sales_count, total_sales, product_count, low_stock_count, expiring_count}
+        """
+        if not self._loaded or self._day != datetime.now().strftime("%Y-%m-%d"):
+            self.reload(notify=False)
+        return self._snapshot()
+
+    def reload(self, notify: bool = True):
+        """Recharger tous les compteurs depuis la base (restauration, réinitialisation...)"""
+        rows = db.execute_query("""
+            SELECT id, is_active, stock_quantity <= min_stock_level as low, expiry_date
+            FROM products
+            WHERE is_active = 1
+        """)
+        with self._lock:
+            self._day = datetime.now().strftime("%Y-%m-%d")
+            self._active.clear()
+            self._low_stock.clear()
+            self._expiring.clear()
+            self._apply_products(rows)
+            self._loaded = True
+        self._reload_sales()
+        if notify:
+            self._notify()
+
+    def _reload_sales(self):
+        """Relire les ventes de la session de caisse ouverte"""
+        from modules.sales.shift import shift_manager
+        summary = shift_manager.get_live_summary()
+        with self._lock:
+            self._register_number = shift_manager.register_number
+            self._sales_count = summary['sales_count']
+            self._total_sales = float(summary['total_sales'])
+
+    def _is_expiring(self, expiry_date: Optional[str]) -> bool:
+        if not expiry_date:
+            return False
+        days = config.STOCK_CONFIG.get("alert_expiry_days", 30)
+        limit = (datetime.strptime(self._day, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+        return self._day <= str(expiry_date)[:10] <= limit
+
+    def _apply_products(self, rows):
+        """Mettre à jour les ensembles avec des lignes (id, is_active, low, expiry_date)"""
+        for row in rows:
+            product_id = row['id']
+            if not row['is_active']:
+                self._active.discard(product_id)
+                self._low_stock.discard(product_id)
+                self._expiring.discard(product_id)
+                continue
+            self._active.add(product_id)
+            (self._low_stock.add if row['low'] else self._low_stock.discard)(product_id)
+            (self._expiring.add if self._is_expiring(row['expiry_date']) else self._expiring.discard)(product_id)
+
+    def _refresh_products(self, product_ids: Iterable[int]):
+        """Relire l'état des produits concernés"""
+        ids = sorted({product_id for product_id in product_ids if product_id})
+        if not ids:
+            return
+        rows = []
+        # Paquets de 500 (limite des paramètres SQLite)
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            rows.extend(db.execute_query(f"""
+                SELECT id, is_active, stock_quantity <= min_stock_level as low, expiry_date
+                FROM products
+                WHERE id IN ({placeholders})
+            """, tuple(chunk)))
+        with self._lock:
+            found = {row['id'] for row in rows}
+            self._apply_products(rows)
+            # Produits supprimés définitivement
+            for product_id in set(ids) - found:
+                self._active.discard(product_id)
+                self._low_stock.discard(product_id)
+                self._expiring.discard(product_id)
+
+    def products_changed(self, product_ids: Iterable[int]):
+        """
+        Signaler la modification de produits (après validation de la transaction)
+
+        Args:
+            product_ids: IDs des produits créés, modifiés ou supprimés
+        """
+        if not self._loaded:
+            return
+        try:
+            self._refresh_products(product_ids)
+            self._notify()
+        except Exception as e:
+            logger.error(f"Erreur mise à jour tableau de bord: {e}")
+
+    def sale_recorded(self, sale: Dict):
+        """
+        Signaler une vente écrite en base (après validation de la transaction)
+
+        Args:
+            sale: Vente construite par le point de vente (register_number,
+                  total_amount, items)
+        """
+        if not self._loaded:
+            return
+        try:
+            with self._lock:
+                if sale.get('register_number') == self._register_number:
+                    self._sales_count += 1
+                    self._total_sales += sale['total_amount']
+            self._refresh_products(item['product_id'] for item in sale['items'])
+            self._notify()
+        except Exception as e:
+            logger.error(f"Erreur mise à jour tableau de bord: {e}")
+
+    def sales_changed(self, product_ids: Iterable[int] = ()):
+        """
+        Signaler une annulation, un retour ou une clôture de caisse
+
+        Ces opérations sont rares : les ventes de la session sont relues
+        (une agrégation) plutôt que corrigées.
+
+        Args:
+            product_ids: IDs des produits dont le stock a changé
+        """
+        if not self._loaded:
+            return
+        try:
+            self._reload_sales()
+            self._refresh_products(product_ids)
+            self._notify()
+        except Exception as e:
+            logger.error(f"Erreur mise à jour tableau de bord: {e}")
+
+
+# Instance globale
+metrics_hub = MetricsHub()
@@ -6,6 +6,8 @@ from typing import List, Dict, Any
 from datetime import datetime
 from database.db_manager import db
 from core.logger import logger
+from .analytics import sales_analytics
+from .report_cache import report_cache
 
 
 class ProfitReportManager:
@@ -283,6 +285,55 @@ class ProfitReportManager:
         
         return products
     
+    def get_period_report(self, start_date: str, end_date: str,
+                          product_limit: int = 20) -> Dict[str, Any]:
+        """
+        Obtenir toutes les analyses de bénéfice d'une période
+        
+        Les lignes de vente sont lues une seule fois et toutes les
+        ventilations en sont dérivées (numpy). Sans numpy, chaque
+        ventilation est calculée par sa propre requête. Le résultat est
+        mis en cache jusqu'à la prochaine modification des ventes concernées
+        ou du catalogue (noms, catégories).
+        
+        Args:
+            start_date: Date de début
+            end_date: Date de fin
+            product_limit: Nombre de produits dans le classement
+            
+        Returns:
+            {summary, trend, by_product, by_category, loss_making}
+        """
+        return report_cache.get_or_compute(
+            'profit_period',
+            {'start_date': start_date, 'end_date': end_date, 'product_limit': product_limit},
+            end_date,
+            lambda: self._compute_period_report(start_date, end_date, product_limit),
+            uses_catalog=True
+        )
+    
+    def _compute_period_report(self, start_date: str, end_date: str,
+                               product_limit: int) -> Dict[str, Any]:
+        """Calculer toutes les analyses de la période (sans cache)"""
+        period = sales_analytics.load_period(start_date, end_date)
+        
+        if period is None:
+            return {
+                'summary': self.get_profit_by_period(start_date, end_date),
+                'trend': self.get_daily_profit_trend(start_date, end_date),
+                'by_product': self.get_profit_by_product(start_date, end_date, product_limit),
+                'by_category': self.get_profit_by_category(start_date, end_date),
+                'loss_making': self.get_loss_making_products(start_date, end_date),
+            }
+        
+        return {
+            'summary': period.summary(),
+            'trend': period.daily_trend(),
+            'by_product': period.by_product(product_limit),
+            'by_category': period.by_category(),
+            'loss_making': period.loss_making(),
+        }
+    
     def get_overall_stats(self) -> Dict[str, Any]:
         """
         Obtenir les statistiques globales
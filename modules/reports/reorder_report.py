@@ -1,91 +1,239 @@
 # -*- coding: utf-8 -*-
 """
-Module de génération de rapport de commande fournisseur
+Module de réapprovisionnement : suggestions de commande fournisseur
+
+Vitesse de vente calculée par produit en une requête groupée sur une fenêtre
+glissante, couverture de stock projetée (en jours) et quantités suggérées
+regroupées par fournisseur. Sorties : PDF, CSV ou achat pré-rempli.
 """
 import os
+import csv
+import math
 import subprocess
-from datetime import datetime
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Dict, Optional
 
 from database.db_manager import db
 from core.logger import logger
 import config
 
-def generate_reorder_report():
-    """Générer un PDF de liste de commande basé sur le stock faible"""
-    try:
-        # 1. Récupérer les produits en stock faible avec infos fournisseur
+
+UNKNOWN_SUPPLIER = "Fournisseur Inconnu"
+
+
+class ReorderEngine:
+    """Calcul des besoins de réapprovisionnement"""
+
+    def __init__(self):
+        self.stock_config = config.STOCK_CONFIG
+
+    def get_sales_velocity(self, window_days: int) -> Dict[int, float]:
+        """
+        Quantités vendues par produit sur la fenêtre (retours déduits)
+
+        Args:
+            window_days: Nombre de jours glissants
+
+        Returns:
+            {product_id: quantité nette vendue}
+        """
+        since = (datetime.now() - timedelta(days=window_days)).strftime("%Y-%m-%d")
+
+        sold = db.execute_query("""
+            SELECT si.product_id, SUM(si.quantity) as quantity
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            WHERE s.sale_date >= ? AND s.status IN ('completed', 'returned')
+              AND si.product_id IS NOT NULL
+            GROUP BY si.product_id
+        """, (since,))
+        velocity = {row['product_id']: row['quantity'] for row in sold}
+
+        returned = db.execute_query("""
+            SELECT ri.product_id, SUM(ri.quantity_returned) as quantity
+            FROM returns r
+            JOIN return_items ri ON ri.return_id = r.id
+            WHERE r.return_date >= ? AND ri.product_id IS NOT NULL
+            GROUP BY ri.product_id
+        """, (since,))
+        for row in returned:
+            if row['product_id'] in velocity:
+                velocity[row['product_id']] = max(velocity[row['product_id']] - row['quantity'], 0)
+
+        return velocity
+
+    def compute_suggestions(self, window_days: int = None, lead_time_days: int = None,
+                            cover_days: int = None, supplier_id: int = None) -> List[Dict]:
+        """
+        Calculer les quantités à commander
+
+        Un produit est à commander quand son stock ne couvre plus le délai de
+        livraison (ou passe sous le stock minimum). La quantité suggérée
+        ramène le stock à la demande prévue sur délai + couverture visée,
+        et au moins au double du stock minimum.
+
+        Args:
+            window_days: Fenêtre de calcul de la vitesse de vente (jours)
+            lead_time_days: Délai de livraison fournisseur (jours)
+            cover_days: Couverture visée après réception (jours)
+            supplier_id: Limiter à un fournisseur
+
+        Returns:
+            Liste de suggestions triées par fournisseur puis produit
+        """
+        window_days = window_days or self.stock_config.get("reorder_window_days", 30)
+        lead_time_days = lead_time_days if lead_time_days is not None else self.stock_config.get("reorder_lead_time_days", 7)
+        cover_days = cover_days if cover_days is not None else self.stock_config.get("reorder_cover_days", 14)
+
+        velocity = self.get_sales_velocity(window_days)
+
         query = """
-            SELECT p.name, p.stock_quantity, p.min_stock_level, 
-                   s.company_name as supplier_name
+            SELECT p.id, p.name, p.barcode, p.stock_quantity, p.min_stock_level,
+                   p.purchase_price, p.supplier_id, s.company_name as supplier_name
             FROM products p
             LEFT JOIN suppliers s ON p.supplier_id = s.id
-            WHERE p.stock_quantity <= p.min_stock_level 
-              AND p.is_active = 1
-            ORDER BY s.company_name, p.name
+            WHERE p.is_active = 1
         """
-        results = db.execute_query(query)
-        
-        if not results:
-            return False, "Aucun produit en stock faible."
-            
-        # 2. Préparer le PDF
-        config.DATA_DIR.mkdir(exist_ok=True)
+        params = ()
+        if supplier_id:
+            query += " AND p.supplier_id = ?"
+            params = (supplier_id,)
+
+        suggestions = []
+        for row in db.execute_query(query, params):
+            stock = row['stock_quantity'] or 0
+            min_stock = row['min_stock_level'] or 0
+            daily = velocity.get(row['id'], 0) / window_days
+
+            reorder_point = max(min_stock, daily * lead_time_days)
+            if stock > reorder_point:
+                continue
+
+            target = max(daily * (lead_time_days + cover_days), min_stock * 2)
+            quantity = math.ceil(target - stock)
+            if quantity <= 0:
+                continue
+
+            unit_cost = row['purchase_price'] or 0
+            suggestions.append({
+                'product_id': row['id'],
+                'name': row['name'],
+                'barcode': row['barcode'],
+                'supplier_id': row['supplier_id'],
+                'supplier_name': row['supplier_name'] or UNKNOWN_SUPPLIER,
+                'stock_quantity': stock,
+                'min_stock_level': min_stock,
+                'daily_sales': round(daily, 2),
+                'days_of_cover': round(stock / daily, 1) if daily > 0 else None,
+                'suggested_quantity': quantity,
+                'unit_cost': unit_cost,
+                'estimated_cost': round(quantity * unit_cost, 2),
+            })
+
+        suggestions.sort(key=lambda item: (item['supplier_name'], item['name']))
+        return suggestions
+
+    def group_by_supplier(self, suggestions: List[Dict]) -> List[Dict]:
+        """
+        Regrouper les suggestions par fournisseur
+
+        Returns:
+            Liste de {supplier_id, supplier_name, items, total_cost}
+        """
+        groups: Dict[Optional[int], Dict] = {}
+        for item in suggestions:
+            group = groups.setdefault(item['supplier_id'], {
+                'supplier_id': item['supplier_id'],
+                'supplier_name': item['supplier_name'],
+                'items': [],
+                'total_cost': 0.0,
+            })
+            group['items'].append(item)
+            group['total_cost'] += item['estimated_cost']
+        return list(groups.values())
+
+    def _output_path(self, extension: str) -> Path:
+        """Fichier de sortie dans data/reports"""
         report_dir = config.DATA_DIR / "reports"
-        report_dir.mkdir(exist_ok=True)
-        
-        filename = report_dir / f"commande_fournisseur_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        
-        doc = SimpleDocTemplate(str(filename), pagesize=A4)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Titre
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#2c3e50')
-        )
-        elements.append(Paragraph("Liste de Commande Fournisseur", title_style))
-        
-        date_style = ParagraphStyle(
-            'Date',
-            parent=styles['Normal'],
-            fontSize=12,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#7f8c8d')
-        )
-        elements.append(Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style))
-        elements.append(Spacer(1, 30))
-        
-        # 3. Organiser les données par fournisseur
-        data_by_supplier = {}
-        for row in results:
-            supplier = row['supplier_name'] if row['supplier_name'] else "Fournisseur Inconnu"
-            if supplier not in data_by_supplier:
-                data_by_supplier[supplier] = []
-            
-            # Calculer quantité suggérée (par exemple: pour atteindre 2x min_stock)
-            suggested = (row['min_stock_level'] * 2) - row['stock_quantity']
-            if suggested < 0: suggested = 0
+        report_dir.mkdir(parents=True, exist_ok=True)
+        return report_dir / f"commande_fournisseur_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+    def export_csv(self, suggestions: List[Dict], output_path: Path = None) -> tuple[bool, str, Optional[Path]]:
+        """
+        Exporter les suggestions en CSV (séparateur ';' pour Excel)
+
+        Returns:
+            (success, message, chemin du fichier)
+        """
+        if not suggestions:
+            return False, "Aucun produit à commander.", None
+
+        output_path = output_path or self._output_path("csv")
+        try:
+            with open(output_path, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(['Fournisseur', 'Code', 'Produit', 'Stock Actuel', 'Stock Min',
+                                 'Ventes/Jour', 'Jours de Stock', 'Qté Suggérée', 'Prix Achat', 'Coût Estimé'])
+                for item in suggestions:
+                    writer.writerow([
+                        item['supplier_name'], item['barcode'] or '', item['name'],
+                        item['stock_quantity'], item['min_stock_level'], item['daily_sales'],
+                        item['days_of_cover'] if item['days_of_cover'] is not None else '',
+                        item['suggested_quantity'], item['unit_cost'], item['estimated_cost'],
+                    ])
+
+            logger.info(f"Suggestions de commande exportées: {output_path}")
+            return True, f"Rapport généré: {output_path}", output_path
+
+        except Exception as e:
+            logger.error(f"Erreur export CSV commande: {e}")
+            return False, str(e), None
+
+    def export_pdf(self, suggestions: List[Dict], output_path: Path = None) -> tuple[bool, str, Optional[Path]]:
+        """
+        Générer le PDF de commande (une section par fournisseur)
+
+        Returns:
+            (success, message, chemin du fichier)
+        """
+        if not suggestions:
+            return False, "Aucun produit à commander.", None
+
+        output_path = output_path or self._output_path("pdf")
+        try:
+            # reportlab n'est chargé qu'à l'export (démarrage plus rapide)
+            from reportlab.lib import colors
+            from reportlab.lib.pagesizes import A4
+            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            from reportlab.lib.enums import TA_CENTER
             
-            data_by_supplier[supplier].append([
-                row['name'],
-                str(row['stock_quantity']),
-                str(row['min_stock_level']),
-                "" # Espace pour noter la quantité commandée
-            ])
-
-        # 4. Créer les tableaux
-        for supplier, items in data_by_supplier.items():
-            # Titre Fournisseur
+            doc = SimpleDocTemplate(str(output_path), pagesize=A4)
+            elements = []
+            styles = getSampleStyleSheet()
+
+            # Titre
+            title_style = ParagraphStyle(
+                'CustomTitle',
+                parent=styles['Heading1'],
+                fontSize=24,
+                spaceAfter=30,
+                alignment=TA_CENTER,
+                textColor=colors.HexColor('#2c3e50')
+            )
+            elements.append(Paragraph("Liste de Commande Fournisseur", title_style))
+
+            date_style = ParagraphStyle(
+                'Date',
+                parent=styles['Normal'],
+                fontSize=12,
+                alignment=TA_CENTER,
+                textColor=colors.HexColor('#7f8c8d')
+            )
+            elements.append(Paragraph(f"Généré le: {datetime.now().strftime('%d/%m/%Y %H:%M')}", date_style))
+            elements.append(Spacer(1, 30))
+
             supplier_style = ParagraphStyle(
                 'SupplierTitle',
                 parent=styles['Heading2'],
@@ -94,42 +242,90 @@ def generate_reorder_report():
                 spaceAfter=10,
                 textColor=colors.HexColor('#3498db')
             )
-            elements.append(Paragraph(f"🏢 {supplier}", supplier_style))
-            
-            # En-têtes du tableau
-            table_data = [['Produit', 'Stock Actuel', 'Stock Min', 'Qté à Commander']]
-            table_data.extend(items)
-            
-            # Style du tableau
-            t = Table(table_data, colWidths=[250, 80, 80, 100])
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
-                ('ALIGN', (3, 1), (3, -1), 'LEFT'), # Colonne à écrire vide ou avec guides
-            ]))
-            elements.append(t)
-            elements.append(Spacer(1, 15))
-            
-        # Générer
-        doc.build(elements)
-        
-        # Ouvrir le fichier
-        if os.name == 'nt':
-            os.startfile(str(filename))
-        else:
-            subprocess.run(['xdg-open', str(filename)])
-            
-        return True, f"Rapport généré: {filename}"
-        
-    except ImportError:
-        return False, "Le module 'reportlab' est requis."
+
+            for group in self.group_by_supplier(suggestions):
+                elements.append(Paragraph(f"🏢 {group['supplier_name']}", supplier_style))
+
+                table_data = [['Produit', 'Stock', 'Ventes/Jour', 'Jours', 'Qté Suggérée', 'Commandé']]
+                for item in group['items']:
+                    table_data.append([
+                        item['name'][:40],
+                        f"{item['stock_quantity']:g}",
+                        f"{item['daily_sales']:g}",
+                        f"{item['days_of_cover']:g}" if item['days_of_cover'] is not None else "-",
+                        str(item['suggested_quantity']),
+                        ""  # Espace pour noter la quantité commandée
+                    ])
+                table_data.append(['Coût estimé', '', '', '', f"{group['total_cost']:.2f} DA", ''])
+
+                t = Table(table_data, colWidths=[200, 55, 65, 50, 80, 70], repeatRows=1)
+                t.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f8f9fa')),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+                    ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 10),
+                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
+                ]))
+                elements.append(t)
+                elements.append(Spacer(1, 15))
+
+            doc.build(elements)
+            logger.info(f"Rapport de commande généré: {output_path}")
+            return True, f"Rapport généré: {output_path}", output_path
+
+        except Exception as e:
+            logger.error(f"Erreur génération rapport commande: {e}")
+            return False, str(e), None
+
+    def build_purchase(self, group: Dict) -> Dict:
+        """
+        Préparer un achat fournisseur à partir d'un groupe de suggestions
+
+        Returns:
+            {supplier_id, amount, description, lines} ; lines est prêt pour
+            purchase_order_manager.create_order
+        """
+        lines = [f"{item['suggested_quantity']} x {item['name']}" for item in group['items']]
+        return {
+            'supplier_id': group['supplier_id'],
+            'amount': round(group['total_cost'], 2),
+            'description': "Commande: " + ", ".join(lines),
+            'lines': [
+                {
+                    'product_id': item['product_id'],
+                    'name': item['name'],
+                    'quantity': item['suggested_quantity'],
+                    'unit_cost': item['unit_cost'],
+                }
+                for item in group['items']
+            ],
+        }
+
+
+def open_file(path: Path):
+    """Ouvrir un fichier avec l'application par défaut"""
+    if os.name == 'nt':
+        os.startfile(str(path))
+    else:
+        subprocess.Popen(['xdg-open', str(path)])
+
+
+def generate_reorder_report():
+    """Générer et ouvrir le PDF de commande fournisseur"""
+    try:
+        success, msg, path = reorder_engine.export_pdf(reorder_engine.compute_suggestions())
+        if success:
+            open_file(path)
+        return success, msg
     except Exception as e:
         logger.error(f"Erreur génération rapport commande: {e}")
         return False, str(e)
+
+
+# Instance globale
+reorder_engine = ReorderEngine()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Cache des résultats de rapports
+
+Les résultats sont indexés par (rapport, paramètres) et étiquetés avec les
+compteurs de version des données (table data_versions) :
+- 'sales' est incrémenté à chaque écriture touchant la journée en cours ;
+- 'history' est incrémenté quand une vente passée change (annulation,
+  retour, vente hors ligne synchronisée après coup) ;
+- 'catalog' est incrémenté quand le nom ou la catégorie d'un produit, ou
+  une catégorie, change : les rapports qui affichent ces libellés ou
+  regroupent par catégorie en dépendent.
+Une période close (terminée avant aujourd'hui) ne dépend que de 'history'
+(et de 'catalog' le cas échéant) : son résultat est aussi conservé en base
+et survit au redémarrage.
+"""
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+from database.db_manager import db
+from core.logger import logger
+
+
+class ReportCache:
+    """Cache des rapports invalidé par compteurs de version"""
+
+    def __init__(self):
+        self._memory: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def mark_changed(self, sale_date: Optional[str] = None):
+        """
+        Signaler une modification des ventes (dans la transaction de l'appelant)
+
+        Args:
+            sale_date: Date de la vente concernée (YYYY-MM-DD...) ;
+                       None ou aujourd'hui = journée en cours
+        """
+        today = datetime.now().strftime("%Y-%m-%d")
+        self._bump('history' if sale_date and str(sale_date)[:10] < today else 'sales')
+
+    def mark_catalog_changed(self):
+        """Signaler un changement de libellé ou de catégorie (transaction de l'appelant)"""
+        self._bump('catalog')
+
+    def _bump(self, name: str):
+        """Incrémenter un compteur de version"""
+        db.execute_update("""
+            INSERT INTO data_versions (name, version) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """, (name,))
+
+    def get_versions(self) -> Dict[str, int]:
+        """Versions courantes des données"""
+        rows = db.execute_query("SELECT name, version FROM data_versions")
+        versions = {row['name']: row['version'] for row in rows}
+        return {name: versions.get(name, 0) for name in ('sales', 'history', 'catalog')}
+
+    def get_or_compute(self, report: str, params: Dict[str, Any], end_date: str,
+                       compute: Callable[[], Any], uses_catalog: bool = False) -> Any:
+        """
+        Obtenir un rapport depuis le cache ou le calculer
+
+        Args:
+            report: Nom du rapport
+            params: Paramètres (sérialisables en JSON)
+            end_date: Fin de la période couverte (YYYY-MM-DD)
+            compute: Fonction de calcul du résultat (sérialisable en JSON)
+            uses_catalog: Le résultat contient des noms de produits ou de
+                          catégories, ou regroupe par catégorie
+
+        Returns:
+            Résultat du rapport (partagé : ne pas le modifier)
+        """
+        key = f"{report}:{json.dumps(params, sort_keys=True, default=str)}"
+        versions = self.get_versions()
+        closed = str(end_date)[:10] < datetime.now().strftime("%Y-%m-%d")
+        tag = f"h{versions['history']}" if closed else f"h{versions['history']}-s{versions['sales']}"
+        if uses_catalog:
+            tag += f"-c{versions['catalog']}"
+
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry and entry[0] == tag:
+            return entry[1]
+
+        if closed:
+            row = db.fetch_one(
+                "SELECT result FROM report_cache WHERE cache_key = ? AND data_version = ?",
+                (key, tag)
+            )
+            if row:
+                result = json.loads(row['result'])
+                with self._lock:
+                    self._memory[key] = (tag, result)
+                return result
+
+        result = compute()
+
+        with self._lock:
+            self._memory[key] = (tag, result)
+
+        if closed:
+            try:
+                db.execute_update("""
+                    INSERT OR REPLACE INTO report_cache (cache_key, report, data_version, result)
+                    VALUES (?, ?, ?, ?)
+                """, (key, report, tag, json.dumps(result, default=str)))
+            except Exception as e:
+                # Le cache persistant est facultatif (base verrouillée...)
+                logger.warning(f"Rapport {report} non mis en cache: {e}")
+
+        return result
+
+    def clear(self, persistent: bool = True):
+        """
+        Vider le cache
+
+        Args:
+            persistent: Supprimer aussi les résultats conservés en base
+        """
+        with self._lock:
+            self._memory.clear()
+        if persistent:
+            db.execute_update("DELETE FROM report_cache")
+
+
+# Instance globale
+report_cache = ReportCache()
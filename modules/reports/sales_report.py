@@ -159,6 +159,100 @@ class SalesReportManager:
         results = db.execute_query(query, (start_date, end_date))
         return [dict(row) for row in results]
     
+    def get_cashier_performance(self, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Obtenir les performances par caissier (utilisateurs actifs)
+        
+        Une seule requête : les ventes de la période (plage sur sale_date,
+        index couvrant idx_sales_date_cashier) sont jointes aux lignes et aux retours
+        pré-agrégés par vente, puis agrégées par caissier.
+        
+        Le temps de caisse est estimé par journée, de la première à la
+        dernière vente (+1 minute), faute de pointage des caissiers.
+        
+        Args:
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin (YYYY-MM-DD)
+            
+        Returns:
+            Liste de {id, full_name, role, sale_count, total_revenue, total_profit,
+            items_sold, average_basket, items_per_minute, void_count, void_rate,
+            return_count, return_rate}
+        """
+        end_exclusive = (datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+        
+        query = """
+            WITH period_sales AS (
+                SELECT id, cashier_id, status, total_amount, sale_date
+                FROM sales
+                WHERE sale_date >= ? AND sale_date < ?
+            ),
+            sale_lines AS (
+                SELECT si.sale_id,
+                       SUM(si.quantity) as items,
+                       SUM((si.unit_price - COALESCE(si.purchase_price, 0)) * si.quantity) as profit
+                FROM period_sales ps
+                JOIN sale_items si ON si.sale_id = ps.id
+                GROUP BY si.sale_id
+            ),
+            sale_returns AS (
+                SELECT r.original_sale_id as sale_id, COUNT(*) as return_count
+                FROM period_sales ps
+                JOIN returns r ON r.original_sale_id = ps.id
+                GROUP BY r.original_sale_id
+            ),
+            active_time AS (
+                SELECT cashier_id,
+                       (julianday(MAX(sale_date)) - julianday(MIN(sale_date))) * 1440 + 1 as minutes
+                FROM period_sales
+                WHERE status != 'cancelled'
+                GROUP BY cashier_id, date(sale_date)
+            ),
+            cashier_time AS (
+                SELECT cashier_id, SUM(minutes) as minutes
+                FROM active_time
+                GROUP BY cashier_id
+            )
+            SELECT
+                u.id,
+                u.full_name,
+                u.role,
+                COUNT(CASE WHEN ps.status = 'completed' THEN 1 END) as sale_count,
+                COALESCE(SUM(CASE WHEN ps.status = 'completed' THEN ps.total_amount END), 0) as total_revenue,
+                COALESCE(SUM(CASE WHEN ps.status = 'completed' THEN sl.profit END), 0) as total_profit,
+                COALESCE(SUM(CASE WHEN ps.status != 'cancelled' THEN sl.items END), 0) as items_sold,
+                COUNT(ps.id) as total_count,
+                COUNT(CASE WHEN ps.status = 'cancelled' THEN 1 END) as void_count,
+                COUNT(sr.sale_id) as return_count,
+                COALESCE(ct.minutes, 0) as active_minutes
+            FROM users u
+            LEFT JOIN period_sales ps ON ps.cashier_id = u.id
+            LEFT JOIN sale_lines sl ON sl.sale_id = ps.id
+            LEFT JOIN sale_returns sr ON sr.sale_id = ps.id
+            LEFT JOIN cashier_time ct ON ct.cashier_id = u.id
+            WHERE u.is_active = 1
+            GROUP BY u.id, u.full_name, u.role
+            ORDER BY total_revenue DESC
+        """
+        
+        results = db.execute_query(query, (start_date, end_exclusive))
+        
+        cashiers = []
+        for row in results:
+            cashier = dict(row)
+            total_count = cashier.pop('total_count')
+            minutes = cashier.pop('active_minutes')
+            
+            cashier['total_revenue'] = round(cashier['total_revenue'], 2)
+            cashier['total_profit'] = round(cashier['total_profit'], 2)
+            cashier['average_basket'] = round(cashier['total_revenue'] / cashier['sale_count'], 2) if cashier['sale_count'] else 0.0
+            cashier['items_per_minute'] = round(cashier['items_sold'] / minutes, 2) if minutes else 0.0
+            cashier['void_rate'] = round(cashier['void_count'] * 100 / total_count, 2) if total_count else 0.0
+            cashier['return_rate'] = round(cashier['return_count'] * 100 / total_count, 2) if total_count else 0.0
+            cashiers.append(cashier)
+        
+        return cashiers
+    
     def get_sales_by_payment_method(self, start_date: str, end_date: str) -> List[Dict]:
         """
         Obtenir les ventes par méthode de paiement
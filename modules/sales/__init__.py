@@ -4,5 +4,9 @@ Package sales - Gestion des ventes
 """
 from .pos import POSManager
 from .cart import Cart
+from .offline_queue import OfflineSaleQueue
+from .shift import ShiftManager
+from .print_spooler import PrintSpooler
+from .escpos_renderer import EscPosRenderer
 
-__all__ = ['POSManager', 'Cart']
+__all__ = ['POSManager', 'Cart', 'OfflineSaleQueue', 'ShiftManager', 'PrintSpooler', 'EscPosRenderer']
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Rendu ESC/POS natif des tickets
+
+Le ticket complet est construit en un seul buffer d'octets (en-tête magasin
+et logo tramé mis en cache au format imprimante) puis envoyé en une seule
+écriture sur le port série, le périphérique USB ou un fichier.
+"""
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+import config
+from core.logger import logger
+from .receipt import receipt_generator
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    logger.warning("Module Pillow non disponible. Logo des tickets thermiques désactivé.")
+
+try:
+    import serial
+    SERIAL_AVAILABLE = True
+except ImportError:
+    SERIAL_AVAILABLE = False
+
+try:
+    import termios
+except ImportError:  # Windows
+    termios = None
+
+
+# Commandes ESC/POS
+ESC = b'\x1b'
+GS = b'\x1d'
+CMD_INIT = ESC + b'@'
+CMD_ALIGN_LEFT = ESC + b'a\x00'
+CMD_ALIGN_CENTER = ESC + b'a\x01'
+CMD_FEED_CUT = ESC + b'd\x04' + GS + b'V\x00'
+
+# Pages de code (ESC t n) selon l'encodage Python
+CODEPAGES = {
+    'cp437': 0,
+    'cp850': 2,
+    'cp858': 19,
+    'cp1252': 16,
+}
+
+# Largeur imprimable en points selon la largeur du papier
+PAPER_DOTS = {
+    58: 384,
+    80: 576,
+}
+
+# Ports traités comme liaisons série (le reste est un périphérique existant)
+SERIAL_PORT_PATTERN = re.compile(r'^(COM\d+|/dev/tty\w+)$', re.IGNORECASE)
+
+# Préfixe d'une sortie fichier explicite (ex: 'file:/tmp/tickets.bin'),
+# seule cible créée si elle n'existe pas
+FILE_TARGET_PREFIX = 'file:'
+
+
+class EscPosRenderer:
+    """Construction et envoi des tickets au format ESC/POS"""
+
+    def __init__(self):
+        self.printer_config = config.PRINTER_CONFIG
+        self._lock = threading.Lock()
+        self._header = None
+        self._header_key = None
+        self._header_template = None
+        self._logo = None
+        self._logo_key = None
+
+    @property
+    def encoding(self) -> str:
+        """Encodage du texte envoyé à l'imprimante"""
+        encoding = self.printer_config.get('thermal_codepage', 'cp858')
+        return encoding if encoding in CODEPAGES else 'cp437'
+
+    def _encode(self, text: str) -> bytes:
+        """Encoder du texte dans la page de code de l'imprimante"""
+        return text.encode(self.encoding, errors='replace')
+
+    def rasterize_logo(self, image_path: Path, max_dots: int) -> bytes:
+        """
+        Convertir une image en commande raster GS v 0
+
+        Args:
+            image_path: Chemin de l'image
+            max_dots: Largeur maximale en points
+
+        Returns:
+            Commande d'impression du logo (vide si impossible)
+        """
+        if not PIL_AVAILABLE or not image_path.exists():
+            return b''
+
+        try:
+            with Image.open(image_path) as image:
+                image = image.convert('RGBA')
+                # Fond blanc sous les zones transparentes
+                background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+                image = Image.alpha_composite(background, image).convert('L')
+
+                if image.width > max_dots:
+                    height = max(1, image.height * max_dots // image.width)
+                    image = image.resize((max_dots, height))
+
+                # 1 bit par point, bit à 1 = point noir
+                bitmap = image.point(lambda value: 255 if value < 128 else 0).convert('1')
+                width_bytes = (bitmap.width + 7) // 8
+                if bitmap.width % 8:
+                    padded = Image.new('1', (width_bytes * 8, bitmap.height), 0)
+                    padded.paste(bitmap, (0, 0))
+                    bitmap = padded
+
+                height = bitmap.height
+                return (GS + b'v0\x00'
+                        + bytes((width_bytes & 0xFF, width_bytes >> 8, height & 0xFF, height >> 8))
+                        + bitmap.tobytes())
+        except Exception as e:
+            logger.error(f"Erreur lors du tramage du logo: {e}")
+            return b''
+
+    def get_logo(self) -> bytes:
+        """Logo tramé, recalculé seulement si l'image ou le papier change"""
+        if not self.printer_config.get('thermal_print_logo', True):
+            return b''
+
+        logo_path = Path(config.LOGO_PATH)
+        max_dots = PAPER_DOTS.get(self.printer_config.get('paper_width_mm', 80), 576)
+        try:
+            mtime = logo_path.stat().st_mtime
+        except OSError:
+            mtime = None
+
+        key = (str(logo_path), mtime, max_dots)
+        if self._logo_key != key:
+            self._logo = self.rasterize_logo(logo_path, max_dots) if mtime else b''
+            self._logo_key = key
+        return self._logo
+
+    def get_header(self) -> bytes:
+        """
+        Début du ticket : initialisation, page de code, logo et en-tête magasin
+
+        Mis en cache tant que le modèle de ticket, le logo et l'encodage
+        ne changent pas.
+        """
+        template = receipt_generator.get_template()
+        logo = self.get_logo()
+        # Le modèle compilé n'est remplacé que si les paramètres du magasin changent
+        key = (self._logo_key, self.encoding)
+
+        with self._lock:
+            if (self._header is None or self._header_key != key
+                    or self._header_template is not template):
+                parts = [CMD_INIT, ESC + b't' + bytes((CODEPAGES[self.encoding],))]
+                if logo:
+                    parts += [CMD_ALIGN_CENTER, logo, b'\n']
+                parts += [CMD_ALIGN_LEFT, self._encode("\n".join(template['text_header']) + "\n")]
+                self._header = b''.join(parts)
+                self._header_key = key
+                self._header_template = template
+            return self._header
+
+    def invalidate(self):
+        """Oublier l'en-tête et le logo en cache"""
+        with self._lock:
+            self._header = None
+            self._header_key = None
+            self._header_template = None
+            self._logo = None
+            self._logo_key = None
+
+    def render_receipt(self, sale_data: Dict) -> bytes:
+        """
+        Construire le ticket complet
+
+        Args:
+            sale_data: Données de la vente
+
+        Returns:
+            Flux d'octets ESC/POS prêt à être envoyé
+        """
+        body = "\n".join(receipt_generator.text_body_lines(sale_data)) + "\n"
+        return b''.join((self.get_header(), self._encode(body), CMD_FEED_CUT))
+
+    def send(self, data: bytes, port: Optional[str] = None) -> tuple[bool, str]:
+        """
+        Envoyer un flux ESC/POS en une seule écriture
+
+        Args:
+            data: Octets à envoyer
+            port: Port série ('COM1', '/dev/ttyUSB0'), périphérique
+                  ('/dev/usb/lp0') ou fichier ('file:/chemin', créé au
+                  besoin) (défaut: configuration)
+
+        Returns:
+            (success, message) ; un périphérique absent est un échec (le
+            ticket reste dans la file d'impression)
+        """
+        port = port or self.printer_config.get('thermal_printer_port', 'COM1')
+
+        try:
+            if SERIAL_PORT_PATTERN.match(port):
+                if not SERIAL_AVAILABLE:
+                    error_msg = f"Module pyserial non disponible: impossible d'ouvrir {port}"
+                    logger.error(error_msg)
+                    return False, error_msg
+                with serial.Serial(port,
+                                   baudrate=self.printer_config.get('thermal_printer_baudrate', 9600),
+                                   timeout=self.printer_config.get('thermal_printer_timeout', 5),
+                                   write_timeout=self.printer_config.get('thermal_printer_timeout', 5)) as link:
+                    link.write(data)
+                    link.flush()
+            else:
+                flags = os.O_WRONLY | os.O_APPEND | getattr(os, 'O_NOCTTY', 0)
+                if port.startswith(FILE_TARGET_PREFIX):
+                    port = port[len(FILE_TARGET_PREFIX):]
+                    flags |= os.O_CREAT
+                fd = os.open(port, flags, 0o644)
+                try:
+                    if termios and os.isatty(fd):
+                        # Terminal (pty de test) : pas de conversion des fins de ligne
+                        attrs = termios.tcgetattr(fd)
+                        attrs[1] &= ~termios.OPOST
+                        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+                    view = memoryview(data)
+                    while view:
+                        written = os.write(fd, view)
+                        view = view[written:]
+                finally:
+                    os.close(fd)
+
+            return True, "Ticket imprimé avec succès"
+
+        except Exception as e:
+            error_msg = f"Erreur lors de l'envoi à l'imprimante thermique ({port}): {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+
+# Instance globale
+escpos_renderer = EscPosRenderer()
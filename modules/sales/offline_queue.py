@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+File d'attente locale des ventes (une par caisse)
+
+Quand la base du magasin est verrouillée ou lente, la vente est écrite dans
+un fichier SQLite propre à la caisse puis synchronisée en arrière-plan.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Callable
+from core.logger import logger
+import config
+
+
+class OfflineSaleQueue:
+    """File d'attente locale des ventes et synchroniseur en arrière-plan"""
+
+    def __init__(self, register_number: int = None):
+        register_config = config.REGISTER_CONFIG
+        self.register_number = register_number or register_config.get("register_number", 1)
+        queue_dir = Path(register_config.get("queue_dir", config.DATA_DIR / "queue"))
+        self.queue_path = queue_dir / f"register_{self.register_number}.db"
+
+        self._connection = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Connexion unique à la file locale (partagée entre threads, protégée par verrou)"""
+        if self._connection is None:
+            self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.queue_path,
+                check_same_thread=False,
+                timeout=10.0
+            )
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS pending_sales (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sale_number TEXT UNIQUE NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'synced', 'failed')),
+                    attempts INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    remote_sale_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    synced_at TIMESTAMP
+                )
+            """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pending_sales_status ON pending_sales(status, id)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def enqueue_sale(self, sale: Dict) -> int:
+        """
+        Mettre une vente en file d'attente locale
+
+        Args:
+            sale: Vente complète (voir POSManager._build_sale)
+
+        Returns:
+            ID local de la vente en file
+        """
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.execute(
+                "INSERT INTO pending_sales (sale_number, payload) VALUES (?, ?)",
+                (sale['sale_number'], json.dumps(sale))
+            )
+            conn.commit()
+            queue_id = cursor.lastrowid
+
+        logger.warning(f"Vente {sale['sale_number']} mise en file locale (caisse {self.register_number})")
+        self._wake_event.set()
+        return queue_id
+
+    def get_pending(self, limit: int = 50) -> List[Dict]:
+        """
+        Obtenir les ventes en attente, dans l'ordre d'encaissement
+
+        Args:
+            limit: Nombre maximum de ventes
+
+        Returns:
+            Liste de {id, sale_number, sale, attempts}
+        """
+        with self._lock:
+            rows = self._get_connection().execute("""
+                SELECT id, sale_number, payload, attempts
+                FROM pending_sales
+                WHERE status = 'pending'
+                ORDER BY id
+                LIMIT ?
+            """, (limit,)).fetchall()
+
+        return [{
+            'id': row['id'],
+            'sale_number': row['sale_number'],
+            'sale': json.loads(row['payload']),
+            'attempts': row['attempts'],
+        } for row in rows]
+
+    def pending_count(self) -> int:
+        """Nombre de ventes en attente de synchronisation"""
+        if self._connection is None and not self.queue_path.exists():
+            return 0
+        with self._lock:
+            row = self._get_connection().execute(
+                "SELECT COUNT(*) FROM pending_sales WHERE status = 'pending'"
+            ).fetchone()
+        return row[0]
+
+    def mark_synced(self, synced: Dict[int, int]):
+        """
+        Marquer des ventes comme synchronisées
+
+        Args:
+            synced: {ID local: ID de la vente dans la base du magasin}
+        """
+        if not synced:
+            return
+        with self._lock:
+            conn = self._get_connection()
+            conn.executemany("""
+                UPDATE pending_sales
+                SET status = 'synced', remote_sale_id = ?, last_error = NULL,
+                    synced_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, [(sale_id, queue_id) for queue_id, sale_id in synced.items()])
+            conn.commit()
+
+    def mark_failed(self, queue_id: int, error: str):
+        """
+        Enregistrer un échec de synchronisation
+
+        Après sync_max_attempts échecs, la vente passe en statut 'failed'
+        et n'est plus retentée automatiquement.
+
+        Args:
+            queue_id: ID local
+            error: Message d'erreur
+        """
+        max_attempts = config.REGISTER_CONFIG.get("sync_max_attempts", 10)
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute("""
+                UPDATE pending_sales
+                SET attempts = attempts + 1,
+                    last_error = ?,
+                    status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END
+                WHERE id = ?
+            """, (error, max_attempts, queue_id))
+            conn.commit()
+
+    def get_failed(self) -> List[Dict]:
+        """Obtenir les ventes abandonnées après trop d'échecs"""
+        with self._lock:
+            rows = self._get_connection().execute("""
+                SELECT id, sale_number, attempts, last_error, created_at
+                FROM pending_sales
+                WHERE status = 'failed'
+                ORDER BY id
+            """).fetchall()
+        return [dict(row) for row in rows]
+
+    def retry_failed(self) -> int:
+        """Remettre les ventes en erreur dans la file"""
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.execute(
+                "UPDATE pending_sales SET status = 'pending', attempts = 0 WHERE status = 'failed'"
+            )
+            conn.commit()
+        self._wake_event.set()
+        return cursor.rowcount
+
+    def start_syncer(self, sync_callback: Callable[[], tuple], interval_seconds: float = None):
+        """
+        Démarrer le synchroniseur en arrière-plan
+
+        Args:
+            sync_callback: Fonction de synchronisation d'un lot, retourne (synced, failed)
+            interval_seconds: Intervalle entre deux passes
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        interval = interval_seconds or config.REGISTER_CONFIG.get("sync_interval_seconds", 15)
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.is_set():
+                try:
+                    # Vider la file lot par lot tant que des ventes passent
+                    while not self._stop_event.is_set():
+                        synced, failed = sync_callback()
+                        if not synced:
+                            break
+                except Exception as e:
+                    logger.error(f"Erreur synchronisation file locale: {e}")
+
+                self._wake_event.wait(interval)
+                self._wake_event.clear()
+
+        self._thread = threading.Thread(target=run, name="OfflineSaleSyncer", daemon=True)
+        self._thread.start()
+        logger.info(f"Synchroniseur de la caisse {self.register_number} démarré ({interval}s)")
+
+    def stop_syncer(self, timeout: float = 5.0):
+        """Arrêter le synchroniseur en arrière-plan"""
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+# Instance globale
+offline_queue = OfflineSaleQueue()
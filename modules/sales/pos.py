@@ -2,12 +2,20 @@
 """
 Gestionnaire de point de vente (POS - Point Of Sale)
 """
+import sqlite3
 from typing import Dict, Optional, List
 from datetime import datetime
 from database.db_manager import db
 from core.logger import logger
+from core.sequence import sequence_generator
 from modules.products.product_manager import product_manager
+from modules.products.stock_ledger import stock_ledger
+from modules.customers.customer_manager import customer_manager, CreditLimitExceeded
+from modules.customers.loyalty import loyalty_manager
+from modules.reports.report_cache import report_cache
+from modules.reports.metrics_hub import metrics_hub
 from .cart import Cart
+from .offline_queue import offline_queue
 import config
 
 
@@ -16,7 +24,8 @@ class POSManager:
     
     def __init__(self):
         self.current_cart = Cart()
-        self.register_number = 1  # Numéro de caisse
+        self.register_number = config.REGISTER_CONFIG.get("register_number", 1)  # Numéro de caisse
+        self.last_receipt = None  # Données du ticket de la dernière vente
     
     def set_register_number(self, register_number: int):
         """Définir le numéro de caisse"""
@@ -30,6 +39,39 @@ class POSManager:
         """Démarrer une nouvelle vente (réinitialiser le panier)"""
         self.current_cart = Cart()
     
+    def get_last_receipt(self) -> Optional[Dict]:
+        """
+        Obtenir les données du ticket de la dernière vente finalisée
+        
+        Construites depuis l'instantané du panier validé, sans relire la
+        vente en base (disponibles aussi pour une vente mise en file locale).
+        
+        Returns:
+            Copie des données du ticket (format de get_sale) ou None
+        """
+        if not self.last_receipt:
+            return None
+        receipt = dict(self.last_receipt)
+        receipt['items'] = [dict(item) for item in self.last_receipt['items']]
+        return receipt
+    
+    def _build_receipt(self, sale: Dict, sale_id: int) -> Dict:
+        """Données de ticket d'une vente construite par _build_sale"""
+        return {
+            'id': sale_id,
+            'sale_number': sale['sale_number'],
+            'sale_date': sale['sale_date'],
+            'register_number': sale['register_number'],
+            'cashier_id': sale['cashier_id'],
+            'customer_id': sale['customer_id'],
+            'subtotal': sale['subtotal'],
+            'discount_amount': 0.0,
+            'total_amount': sale['total_amount'],
+            'payment_method': sale['payment_method'],
+            'status': 'completed',
+            'items': sale['items'],
+        }
+    
     def add_product_by_barcode(self, barcode: str, quantity: float = 1.0) -> tuple[bool, str]:
         """
         Ajouter un produit au panier par code-barres
@@ -103,6 +145,12 @@ class POSManager:
         """
         Finaliser la vente
         
+        Si la base du magasin est verrouillée (autre caisse, sauvegarde...),
+        la vente est mise dans la file locale de la caisse et synchronisée
+        plus tard ; sale_id vaut alors 0. Une vente à crédit n'est jamais
+        mise en file (limite de crédit non vérifiable) : elle est refusée et
+        le panier est conservé.
+        
         Args:
             cashier_id: ID du vendeur
             payment_method: Méthode de paiement ('cash', 'credit', etc.)
@@ -116,81 +164,253 @@ class POSManager:
             return False, "Panier vide", 0
             
         try:
-            # 1. Générer code de vente
-            sale_code = f"SLE-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-            sale_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            sale = self._build_sale(cashier_id, payment_method, total_amount, customer_id)
+            sale_code = sale['sale_number']
             
-            # 2. Insérer la vente
-            # Use schema column names: sale_number (not code), cashier_id (not user_id)
+            if self._use_offline_queue():
+                # Des ventes attendent déjà : conserver l'ordre d'encaissement
+                if offline_queue.pending_count() > 0:
+                    return self._queue_sale(sale)
+                
+                previous_timeout = db.set_busy_timeout(
+                    config.REGISTER_CONFIG.get("checkout_busy_timeout_ms", 1500)
+                )
+                try:
+                    sale_id = self._write_sale(sale)
+                except sqlite3.OperationalError as e:
+                    if not db.is_busy_error(e):
+                        raise
+                    logger.warning(f"Base du magasin indisponible ({e}), vente {sale_code} mise en file")
+                    return self._queue_sale(sale)
+                finally:
+                    db.set_busy_timeout(previous_timeout)
+            else:
+                sale_id = self._write_sale(sale)
             
-            sale_query = """
-                INSERT INTO sales (sale_number, cashier_id, customer_id, subtotal, total_amount, payment_method, sale_date, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 'completed')
-            """
-            subtotal = total_amount  # For simplicity, subtotal = total (no tax/discount breakdown here)
+            metrics_hub.sale_recorded(sale)
+
+            # Vider le panier
+            self.last_receipt = self._build_receipt(sale, sale_id)
+            self.new_sale()
+            
+            logger.info(f"Vente finalisée: {sale_code} (ID: {sale_id})")
+            return True, f"Vente réussie: {sale_code}", sale_id
+            
+        except CreditLimitExceeded as e:
+            logger.warning(f"Vente à crédit refusée: {e}")
+            return False, str(e), 0
+        except Exception as e:
+            logger.error(f"Erreur lors de la finalisation de la vente: {e}")
+            return False, f"Erreur système: {str(e)}", 0
+
+    def _build_sale(self, cashier_id: int, payment_method: str, total_amount: float,
+                    customer_id: int = None) -> Dict:
+        """Figer le panier en une vente autonome (sérialisable pour la file locale)"""
+        return {
+            'sale_number': self._generate_sale_number(),
+            'register_number': self.register_number,
+            'cashier_id': cashier_id,
+            'customer_id': customer_id,
+            'subtotal': total_amount,  # For simplicity, subtotal = total (no tax/discount breakdown here)
+            'total_amount': total_amount,
+            'payment_method': payment_method,
+            'sale_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'items': [item.to_dict() for item in self.current_cart.items],
+        }
+
+    def _use_offline_queue(self) -> bool:
+        """La file locale est-elle activée pour cette caisse"""
+        return config.REGISTER_CONFIG.get("offline_queue", False)
+
+    def _queue_sale(self, sale: Dict) -> tuple[bool, str, int]:
+        """Mettre la vente dans la file locale et vider le panier (sauf vente à crédit)"""
+        if sale['payment_method'] == 'credit':
+            logger.warning(f"Vente à crédit {sale['sale_number']} refusée: caisse hors ligne")
+            return False, "Caisse hors ligne: vente à crédit impossible tant que la file n'est pas synchronisée", 0
+        offline_queue.enqueue_sale(sale)
+        self.last_receipt = self._build_receipt(sale, 0)
+        self.new_sale()
+        return True, f"Vente enregistrée hors ligne: {sale['sale_number']}", 0
+
+    def _write_sale(self, sale: Dict) -> int:
+        """
+        Écrire une vente dans la base du magasin (une seule transaction)
+        
+        Une vente à crédit au-delà de la limite du client est refusée, y
+        compris à la synchronisation de la file locale.
+        
+        Args:
+            sale: Vente construite par _build_sale
+            
+        Returns:
+            ID de la vente
+            
+        Raises:
+            CreditLimitExceeded: Limite de crédit du client dépassée
+        """
+        sale_query = """
+            INSERT INTO sales (sale_number, cashier_id, customer_id, subtotal, total_amount, payment_method, register_number, sale_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'completed')
+        """
+        cashier_id = sale['cashier_id']
+        customer_id = sale['customer_id']
+        total_amount = sale['total_amount']
+        
+        db.begin_transaction()
+        try:
             sale_id = db.execute_insert(sale_query, (
-                sale_code, cashier_id, customer_id, subtotal, total_amount, payment_method, sale_date
+                sale['sale_number'], cashier_id, customer_id, sale['subtotal'],
+                total_amount, sale['payment_method'],
+                sale.get('register_number', self.register_number), sale['sale_date']
             ))
             
             if not sale_id:
-                return False, "Erreur lors de la création de la vente", 0
+                raise RuntimeError("Erreur lors de la création de la vente")
                 
-            # 3. Insérer les articles de vente et mettre à jour le stock
-            for item in self.current_cart.items:
-                product_id = item.product_id
+            # Sorties de stock (journal + quantités matérialisées) : le
+            # moteur de coût renseigne le coût de chaque ligne
+            movements = [
+                {
+                    'product_id': item['product_id'],
+                    'movement_type': 'sale',
+                    'quantity': -item['quantity'],
+                    'source_id': sale_id,
+                } if item['product_id'] > 0 else None  # Produit divers : pas de stock
+                for item in sale['items']
+            ]
+            stock_ledger.record_movements([m for m in movements if m], created_by=cashier_id)
+            
+            # Insérer les articles de vente au coût calculé
+            item_rows = []
+            for item, movement in zip(sale['items'], movements):
+                product_id = item['product_id']
                 # Utiliser NULL pour les produits personnalisés (évite FOREIGN KEY error)
                 db_product_id = product_id if product_id > 0 else None
-                product_name = item.product_name
-                barcode = item.barcode
-                quantity = item.quantity
-                unit_price = item.unit_price  # Prix de vente unitaire
-                purchase_price = item.purchase_price
-                subtotal = item.get_subtotal()  # Calculé via méthode
-                discount_percentage = item.discount_percentage
-                
-                # Insertion article avec tous les champs requis
-                item_query = """
-                    INSERT INTO sale_items (sale_id, product_id, product_name, barcode, quantity, unit_price, discount_percentage, subtotal, purchase_price)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                db.execute_insert(item_query, (sale_id, db_product_id, product_name, barcode, quantity, unit_price, discount_percentage, subtotal, purchase_price))
-                
-                # Mise à jour stock
-                if product_id > 0: # Si ce n'est pas un produit divers
-                    # check stock
-                    current_stock_query = "SELECT stock_quantity FROM products WHERE id = ?"
-                    res = db.fetch_one(current_stock_query, (product_id,))
-                    if res:
-                        new_stock = res['stock_quantity'] - quantity
-                        update_stock = "UPDATE products SET stock_quantity = ? WHERE id = ?"
-                        db.execute_update(update_stock, (new_stock, product_id))
-            
-            # 4. Gérer le crédit client si nécessaire
-            if payment_method == 'credit' and customer_id:
-                # Mettre à jour la dette du client
-                # On suppose qu'il y a une colonne current_credit ou on ajoute une transaction
-                # Vérifions si on doit mettre à jour le solde directement
-                update_credit_query = "UPDATE customers SET current_credit = current_credit + ? WHERE id = ?"
-                db.execute_update(update_credit_query, (total_amount, customer_id))
-                
-                # Enregistrer la transaction de crédit
-                credit_trans_query = """
-                    INSERT INTO customer_credit_transactions (customer_id, transaction_type, amount, transaction_date, notes, processed_by)
-                    VALUES (?, 'credit_sale', ?, ?, ?, ?)
-                """
-                db.execute_insert(credit_trans_query, (
-                    customer_id, total_amount, sale_date, f"Achat {sale_code}", cashier_id
+                unit_cost = movement.get('unit_cost', item['purchase_price']) if movement else item['purchase_price']
+                item_rows.append((
+                    sale_id, db_product_id, item['product_name'], item['barcode'], item['quantity'],
+                    item['unit_price'], item['discount_percentage'], item['subtotal'], unit_cost
                 ))
-
-            # 5. Vider le panier
-            self.new_sale()
             
-            logger.info(f"Vente finalisée: {sale_code} (ID: {sale_id})")
-            return True, f"Vente réussie: {sale_code}", sale_id
+            item_query = """
+                INSERT INTO sale_items (sale_id, product_id, product_name, barcode, quantity, unit_price, discount_percentage, subtotal, purchase_price)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """
+            db.execute_many(item_query, item_rows)
             
+            # Gérer le crédit client si nécessaire (limite vérifiée sur la
+            # dette à jour, dans la transaction de la vente)
+            if sale['payment_method'] == 'credit' and customer_id:
+                customer_manager.post_credit(
+                    customer_id, 'credit_sale', total_amount, cashier_id,
+                    sale_id=sale_id, notes=f"Achat {sale['sale_number']}",
+                    transaction_date=sale['sale_date'],
+                    enforce_limit=True
+                )
+            
+            # Statistiques et points de fidélité du client
+            if customer_id:
+                customer_manager.record_purchase(customer_id, total_amount, sale['sale_date'])
+                loyalty_manager.accrue_for_sale(customer_id, sale_id, total_amount, cashier_id)
+            
+            # Rapports en cache à recalculer (vente du jour ou synchronisée après coup)
+            report_cache.mark_changed(sale['sale_date'])
+            
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        return sale_id
+
+    def sync_offline_sales(self, batch_size: int = None) -> tuple[int, int]:
+        """
+        Synchroniser un lot de ventes de la file locale vers la base du magasin
+        
+        Le lot est écrit dans une seule transaction. Les numéros de vente
+        rendent l'opération idempotente : une vente déjà présente (coupure
+        entre la validation et l'acquittement local) est simplement acquittée.
+        Si le lot échoue, les ventes sont rejouées une à une pour isoler la
+        vente fautive. Le stock est décrémenté même s'il devient négatif (la
+        marchandise est déjà sortie) et l'écart est signalé dans le journal ;
+        une vente à crédit au-delà de la limite du client est refusée.
+        
+        Args:
+            batch_size: Nombre maximum de ventes par lot
+            
+        Returns:
+            (synced, failed)
+        """
+        batch_size = batch_size or config.REGISTER_CONFIG.get("sync_batch_size", 50)
+        pending = offline_queue.get_pending(batch_size)
+        if not pending:
+            return 0, 0
+        
+        synced = {}
+        failed = 0
+        
+        db.begin_transaction()
+        try:
+            for entry in pending:
+                synced[entry['id']] = self._sync_sale(entry['sale'])
+            db.commit()
         except Exception as e:
-            logger.error(f"Erreur lors de la finalisation de la vente: {e}")
-            return False, f"Erreur système: {str(e)}", 0
+            db.rollback()
+            if db.is_busy_error(e):
+                # Base toujours verrouillée : réessayer à la prochaine passe
+                logger.warning(f"Synchronisation reportée: {e}")
+                return 0, 0
+            logger.warning(f"Échec du lot de synchronisation ({e}), reprise vente par vente")
+            synced = {}
+            for entry in pending:
+                db.begin_transaction()
+                try:
+                    sale_id = self._sync_sale(entry['sale'])
+                    db.commit()
+                    synced[entry['id']] = sale_id
+                except Exception as e:
+                    db.rollback()
+                    if db.is_busy_error(e):
+                        logger.warning(f"Synchronisation reportée: {e}")
+                        break
+                    failed += 1
+                    offline_queue.mark_failed(entry['id'], str(e))
+                    logger.error(f"Vente hors ligne {entry['sale_number']} non synchronisée: {e}")
+        
+        offline_queue.mark_synced(synced)
+        
+        if synced:
+            synced_sales = [entry['sale'] for entry in pending if entry['id'] in synced]
+            self._report_stock_conflicts(synced_sales)
+            metrics_hub.sales_changed(item['product_id'] for sale in synced_sales for item in sale['items'])
+            logger.info(f"Synchronisation: {len(synced)} vente(s) hors ligne intégrée(s)")
+        
+        return len(synced), failed
+
+    def _sync_sale(self, sale: Dict) -> int:
+        """Écrire une vente de la file si elle n'est pas déjà dans la base du magasin"""
+        existing = db.fetch_one("SELECT id FROM sales WHERE sale_number = ?", (sale['sale_number'],))
+        if existing:
+            return existing['id']
+        return self._write_sale(sale)
+
+    def _report_stock_conflicts(self, sales: List[Dict]):
+        """Signaler les produits passés en stock négatif après synchronisation"""
+        product_ids = {item['product_id'] for sale in sales for item in sale['items'] if item['product_id'] > 0}
+        if not product_ids:
+            return
+        
+        placeholders = ",".join("?" * len(product_ids))
+        conflicts = db.execute_query(f"""
+            SELECT id, name, stock_quantity FROM products
+            WHERE id IN ({placeholders}) AND stock_quantity < 0
+        """, tuple(product_ids))
+        
+        for product in conflicts:
+            logger.warning(
+                f"Conflit de stock après synchronisation: {product['name']} "
+                f"(ID: {product['id']}) = {product['stock_quantity']}"
+            )
 
     def get_sale(self, sale_id: int) -> Optional[Dict]:
         """Récupérer détails d'une vente pour reçu"""
@@ -222,53 +442,90 @@ class POSManager:
             return None
 
 
-    def cancel_sale(self, sale_id: int, reason: str = "") -> tuple[bool, str]:
+    def cancel_sale(self, sale_id: int, reason: str = "", cancelled_by: int = None) -> tuple[bool, str]:
         """
         Annuler une vente
         
+        Seules les quantités non encore retournées sont remises en stock, et
+        le crédit client n'est diminué que du montant non encore remboursé.
+        
         Args:
             sale_id: ID de la vente
             reason: Raison de l'annulation
+            cancelled_by: ID de l'utilisateur (par défaut : le vendeur)
             
         Returns:
             (success, message)
         """
         try:
-            # Vérifier que la vente existe
-            sale_query = "SELECT * FROM sales WHERE id = ?"
-            sale = db.fetch_one(sale_query, (sale_id,))
-            
-            if not sale:
-                return False, "Vente introuvable"
-            
-            if sale['status'] != 'completed':
-                return False, "Cette vente est déjà annulée ou retournée"
-            
             db.begin_transaction()
             
             try:
-                # Marquer la vente comme annulée
-                update_query = "UPDATE sales SET status = 'cancelled' WHERE id = ?"
-                db.execute_update(update_query, (sale_id,))
+                # Vérifier que la vente existe
+                sale_query = "SELECT * FROM sales WHERE id = ?"
+                sale = db.fetch_one(sale_query, (sale_id,))
                 
-                # Restaurer le stock
-                items_query = "SELECT product_id, quantity FROM sale_items WHERE sale_id = ?"
-                items = db.execute_query(items_query, (sale_id,))
+                if not sale:
+                    db.rollback()
+                    return False, "Vente introuvable"
                 
-                for item in items:
-                    product_manager.increase_stock(item['product_id'], item['quantity'])
+                if sale['status'] != 'completed':
+                    db.rollback()
+                    return False, "Cette vente est déjà annulée ou retournée"
                 
-                # Si c'était un paiement à crédit, ajuster le crédit client
-                if sale['payment_method'] == 'credit' and sale['customer_id']:
-                    credit_query = """
-                        UPDATE customers 
-                        SET current_credit = current_credit - ?
-                        WHERE id = ?
-                    """
-                    db.execute_update(credit_query, (sale['total_amount'], sale['customer_id']))
+                # Marquer la vente comme annulée (caisse qui rembourse)
+                update_query = """
+                    UPDATE sales
+                    SET status = 'cancelled', cancelled_register = ?, cancelled_at = ?
+                    WHERE id = ?
+                """
+                db.execute_update(update_query, (
+                    self.register_number, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), sale_id
+                ))
+                
+                # Restaurer le stock (reliquat non retourné de chaque ligne)
+                lines = self._load_sale_lines(sale_id)
+                
+                stock_ledger.record_movements([
+                    {
+                        'product_id': line['product_id'],
+                        'movement_type': 'cancel',
+                        'quantity': line['remaining'],
+                        'unit_cost': line['purchase_price'],
+                        'source_id': sale_id,
+                        'notes': reason or None,
+                    }
+                    for line in lines if line['product_id']
+                ])
+                
+                if sale['customer_id']:
+                    refunded = db.fetch_one(
+                        "SELECT COALESCE(SUM(return_amount), 0) as amount FROM returns WHERE original_sale_id = ?",
+                        (sale_id,)
+                    )['amount']
+                    
+                    # Si c'était un paiement à crédit, ajuster le crédit client
+                    if sale['payment_method'] == 'credit':
+                        customer_manager.post_credit(
+                            sale['customer_id'], 'adjustment', -(sale['total_amount'] - refunded),
+                            cancelled_by or sale['cashier_id'], sale_id=sale_id,
+                            notes=f"Annulation {sale['sale_number']}"
+                        )
+                    
+                    # Statistiques et points de fidélité du client
+                    customer_manager.record_cancellation(sale['customer_id'], sale['total_amount'] - refunded)
+                    loyalty_manager.adjust_for_sale(
+                        sale['customer_id'], sale_id, 0,
+                        processed_by=cancelled_by or sale['cashier_id'],
+                        notes=f"Annulation {sale['sale_number']}"
+                    )
+                
+                report_cache.mark_changed(sale['sale_date'])
                 
                 db.commit()
                 
+                metrics_hub.sales_changed(line['product_id'] for line in lines)
+                
                 logger.info(f"Vente annulée: {sale['sale_number']} - Raison: {reason}")
                 return True, "Vente annulée avec succès"
                 
@@ -286,9 +543,14 @@ class POSManager:
         """
         Traiter un retour de produits
         
+        Les lignes de la vente et les quantités déjà retournées sont lues en
+        une requête ; return_items, le journal de stock et le crédit client
+        sont écrits par lots dans une seule transaction.
+        
         Args:
             sale_id: ID de la vente originale
-            items_to_return: Liste des articles à retourner [{product_id, quantity}]
+            items_to_return: Liste des articles à retourner
+                             [{sale_item_id ou product_id, quantity}]
             processed_by: ID de l'utilisateur qui traite le retour
             reason: Raison du retour
             
@@ -296,88 +558,100 @@ class POSManager:
             (success, message, return_id)
         """
         try:
-            # Vérifier la vente
-            sale_query = "SELECT * FROM sales WHERE id = ?"
-            sale = db.fetch_one(sale_query, (sale_id,))
-            
-            if not sale:
-                return False, "Vente introuvable", None
+            # Générer le numéro de retour (hors transaction : la réservation
+            # d'un bloc de séquence utilise sa propre connexion)
+            return_number = self._generate_return_number()
             
             db.begin_transaction()
             
             try:
-                # Calculer le montant du retour
-                return_amount = 0.0
+                # Vérifier la vente
+                sale_query = "SELECT * FROM sales WHERE id = ?"
+                sale = db.fetch_one(sale_query, (sale_id,))
+                
+                if not sale:
+                    db.rollback()
+                    return False, "Vente introuvable", None
+                
+                if sale['status'] != 'completed':
+                    db.rollback()
+                    return False, "Cette vente est annulée ou déjà entièrement retournée", None
                 
-                # Générer le numéro de retour
-                return_number = self._generate_return_number()
+                lines = self._load_sale_lines(sale_id)
+                try:
+                    allocations = self._allocate_return(lines, items_to_return)
+                except ValueError as e:
+                    db.rollback()
+                    return False, str(e), None
+                
+                return_amount = round(sum(a['subtotal'] for a in allocations), 2)
                 
                 # Créer l'enregistrement de retour
                 return_query = """
                     INSERT INTO returns (
                         return_number, original_sale_id, return_amount,
-                        refund_method, processed_by, reason
-                    ) VALUES (?, ?, ?, ?, ?, ?)
+                        refund_method, processed_by, reason, register_number
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
                 """
                 
                 return_id = db.execute_insert(return_query, (
-                    return_number, sale_id, 0.0,  # Montant mis à jour après
-                    sale['payment_method'], processed_by, reason
+                    return_number, sale_id, return_amount,
+                    sale['payment_method'], processed_by, reason, self.register_number
                 ))
                 
-                # Traiter chaque article retourné
-                for item_data in items_to_return:
-                    product_id = item_data['product_id']
-                    quantity = item_data['quantity']
-                    
-                    # Obtenir l'article de vente original
-                    item_query = """
-                        SELECT * FROM sale_items 
-                        WHERE sale_id = ? AND product_id = ?
-                    """
-                    sale_item = db.fetch_one(item_query, (sale_id, product_id))
-                    
-                    if not sale_item:
-                        raise Exception(f"Article introuvable dans la vente: {product_id}")
-                    
-                    if quantity > sale_item['quantity']:
-                        raise Exception(f"Quantité de retour invalide pour le produit {product_id}")
-                    
-                    # Calculer le montant du retour pour cet article
-                    unit_price = sale_item['unit_price'] * (1 - sale_item['discount_percentage'] / 100.0)
-                    item_return_amount = unit_price * quantity
-                    return_amount += item_return_amount
-                    
-                    # Insérer l'article de retour
-                    return_item_query = """
-                        INSERT INTO return_items (
-                            return_id, sale_item_id, product_id,
-                            quantity_returned, unit_price, subtotal
-                        ) VALUES (?, ?, ?, ?, ?, ?)
-                    """
-                    db.execute_insert(return_item_query, (
-                        return_id, sale_item['id'], product_id,
-                        quantity, unit_price, item_return_amount
-                    ))
-                    
-                    # Restaurer le stock
-                    product_manager.increase_stock(product_id, quantity)
+                return_item_query = """
+                    INSERT INTO return_items (
+                        return_id, sale_item_id, product_id,
+                        quantity_returned, unit_price, subtotal
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                """
+                db.execute_many(return_item_query, [
+                    (return_id, a['sale_item_id'], a['product_id'],
+                     a['quantity'], a['unit_price'], a['subtotal'])
+                    for a in allocations
+                ])
+                
+                # Restaurer le stock
+                stock_ledger.record_movements([
+                    {
+                        'product_id': a['product_id'],
+                        'movement_type': 'return',
+                        'quantity': a['quantity'],
+                        'unit_cost': a['unit_cost'],
+                        'source_id': return_id,
+                    }
+                    for a in allocations
+                ], created_by=processed_by)
                 
-                # Mettre à jour le montant du retour
-                update_return_query = "UPDATE returns SET return_amount = ? WHERE id = ?"
-                db.execute_update(update_return_query, (return_amount, return_id))
+                # Vente entièrement retournée
+                if all(line['remaining'] <= 0 for line in lines if line['product_id']):
+                    db.execute_update("UPDATE sales SET status = 'returned' WHERE id = ?", (sale_id,))
                 
                 # Ajuster le crédit client si nécessaire
                 if sale['payment_method'] == 'credit' and sale['customer_id']:
-                    credit_query = """
-                        UPDATE customers 
-                        SET current_credit = current_credit - ?
-                        WHERE id = ?
-                    """
-                    db.execute_update(credit_query, (return_amount, sale['customer_id']))
+                    customer_manager.post_credit(
+                        sale['customer_id'], 'adjustment', -return_amount, processed_by,
+                        sale_id=sale_id, notes=f"Retour {return_number}"
+                    )
+                
+                # Statistiques et points de fidélité du client
+                if sale['customer_id']:
+                    customer_manager.record_refund(sale['customer_id'], return_amount)
+                    refunded = db.fetch_one(
+                        "SELECT COALESCE(SUM(return_amount), 0) as amount FROM returns WHERE original_sale_id = ?",
+                        (sale_id,)
+                    )['amount']
+                    loyalty_manager.adjust_for_sale(
+                        sale['customer_id'], sale_id, sale['total_amount'] - refunded,
+                        processed_by, f"Retour {return_number}"
+                    )
+                
+                report_cache.mark_changed(sale['sale_date'])
                 
                 db.commit()
                 
+                metrics_hub.products_changed(a['product_id'] for a in allocations)
+                
                 logger.info(f"Retour traité: {return_number} - Montant: {return_amount} DA")
                 return True, f"Retour enregistré: {return_number}", return_id
                 
@@ -390,6 +664,97 @@ class POSManager:
             logger.error(error_msg)
             return False, error_msg, None
     
+    def _load_sale_lines(self, sale_id: int) -> List[Dict]:
+        """
+        Charger les lignes d'une vente avec les quantités déjà retournées
+        
+        Args:
+            sale_id: ID de la vente
+            
+        Returns:
+            Lignes {id, product_id, quantity, unit_price, discount_percentage,
+            purchase_price, returned, remaining}
+        """
+        query = """
+            SELECT si.id, si.product_id, si.product_name, si.quantity,
+                   si.unit_price, si.discount_percentage, si.purchase_price,
+                   COALESCE(SUM(ri.quantity_returned), 0) as returned
+            FROM sale_items si
+            LEFT JOIN return_items ri ON ri.sale_item_id = si.id
+            WHERE si.sale_id = ?
+            GROUP BY si.id
+            ORDER BY si.id
+        """
+        lines = []
+        for row in db.execute_query(query, (sale_id,)):
+            line = dict(row)
+            line['remaining'] = line['quantity'] - line['returned']
+            lines.append(line)
+        return lines
+    
+    def _allocate_return(self, lines: List[Dict], items_to_return: List[Dict]) -> List[Dict]:
+        """
+        Répartir les quantités demandées sur les lignes de la vente
+        
+        Une demande par sale_item_id vise une ligne précise ; une demande par
+        product_id est répartie sur les lignes de ce produit. Le reliquat des
+        lignes (champ 'remaining') est décrémenté en place.
+        
+        Raises:
+            ValueError: Article absent de la vente ou quantité supérieure
+                        au reliquat retournable
+        """
+        by_id = {line['id']: line for line in lines}
+        allocated: Dict[int, float] = {}
+        
+        for request in items_to_return:
+            quantity = request.get('quantity', 0)
+            if quantity <= 0:
+                continue
+            
+            if request.get('sale_item_id'):
+                line = by_id.get(request['sale_item_id'])
+                candidates = [line] if line else []
+                label = request['sale_item_id']
+            else:
+                candidates = [line for line in lines if line['product_id'] == request.get('product_id')]
+                label = request.get('product_id')
+            
+            if not candidates:
+                raise ValueError(f"Article introuvable dans la vente: {label}")
+            if any(not line['product_id'] for line in candidates):
+                raise ValueError(f"Les articles divers ne peuvent pas être retournés: {candidates[0]['product_name']}")
+            
+            if quantity > sum(line['remaining'] for line in candidates) + 1e-9:
+                raise ValueError(f"Quantité de retour invalide pour le produit {label}")
+            
+            for line in candidates:
+                take = min(quantity, line['remaining'])
+                if take <= 0:
+                    continue
+                line['remaining'] -= take
+                allocated[line['id']] = allocated.get(line['id'], 0) + take
+                quantity -= take
+                if quantity <= 0:
+                    break
+        
+        if not allocated:
+            raise ValueError("Aucun article à retourner")
+        
+        allocations = []
+        for sale_item_id, quantity in allocated.items():
+            line = by_id[sale_item_id]
+            unit_price = line['unit_price'] * (1 - (line['discount_percentage'] or 0) / 100.0)
+            allocations.append({
+                'sale_item_id': sale_item_id,
+                'product_id': line['product_id'],
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'subtotal': unit_price * quantity,
+                'unit_cost': line['purchase_price'],
+            })
+        return allocations
+    
     def get_sale(self, sale_id: int) -> Optional[Dict]:
         """
         Obtenir les détails d'une vente
@@ -422,44 +787,34 @@ class POSManager:
         return result
     
     def _generate_sale_number(self) -> str:
-        """Générer un numéro de vente unique"""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        return f"VNT-{timestamp}-{self.register_number}"
+        """Générer un numéro de vente unique (SLE-AAAAMMJJ-<caisse>-<séquence>)"""
+        return self._generate_number("SLE", "sale")
     
     def _generate_return_number(self) -> str:
-        """Générer un numéro de retour unique"""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        return f"RET-{timestamp}"
+        """Générer un numéro de retour unique (RET-AAAAMMJJ-<caisse>-<séquence>)"""
+        return self._generate_number("RET", "return")
     
-    def _update_customer_credit(self, customer_id: int, amount: float, sale_id: int):
-        """Mettre à jour le crédit d'un client"""
-        # Augmenter le crédit actuel
-        update_query = """
-            UPDATE customers 
-            SET current_credit = current_credit + ?
-            WHERE id = ?
+    def _generate_number(self, prefix: str, sequence: str) -> str:
         """
-        db.execute_update(update_query, (amount, customer_id))
+        Générer un numéro de document propre à la caisse
         
-        # Enregistrer la transaction de crédit
-        transaction_query = """
-            INSERT INTO customer_credit_transactions (
-                customer_id, transaction_type, amount, sale_id, processed_by
-            ) VALUES (?, 'credit_sale', ?, ?, ?)
+        La séquence est monotone par caisse et préallouée par blocs ; si la
+        base reste verrouillée au-delà du délai d'encaissement au moment de
+        réserver un nouveau bloc, un horodatage à la microseconde garantit
+        encore l'unicité pour la caisse.
         """
-        # Note: processed_by devrait être le cashier_id, mais on ne l'a pas ici
-        db.execute_insert(transaction_query, (customer_id, amount, sale_id, 1))
-    
-    def _update_customer_stats(self, customer_id: int, amount: float):
-        """Mettre à jour les statistiques d'un client"""
-        update_query = """
-            UPDATE customers 
-            SET total_purchases = total_purchases + ?,
-                purchase_count = purchase_count + 1,
-                last_purchase_date = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """
-        db.execute_update(update_query, (amount, customer_id))
+        date = datetime.now().strftime('%Y%m%d')
+        try:
+            value = sequence_generator.next_value(
+                f"{sequence}:{self.register_number}",
+                busy_timeout_ms=config.REGISTER_CONFIG.get("checkout_busy_timeout_ms", 1500)
+            )
+            return f"{prefix}-{date}-{self.register_number:02d}-{value:06d}"
+        except sqlite3.OperationalError as e:
+            if not db.is_busy_error(e):
+                raise
+            logger.warning(f"Séquence {sequence} indisponible ({e}), numéro horodaté")
+            return f"{prefix}-{date}-{self.register_number:02d}-T{datetime.now().strftime('%H%M%S%f')}"
 
 
 # Instance globale
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+File d'impression asynchrone des tickets
+
+Les tickets sont enregistrés dans une file persistante (fichier SQLite local
+à la caisse) puis imprimés dans l'ordre par un thread par imprimante, avec
+nouvelles tentatives espacées. L'encaissement n'attend plus l'imprimante.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Callable, Optional
+from core.logger import logger
+import config
+
+
+# Statuts d'un travail d'impression
+JOB_STATUSES = ('pending', 'printing', 'done', 'failed')
+
+
+class PrintSpooler:
+    """File d'impression persistante avec un thread par imprimante"""
+
+    def __init__(self, register_number: int = None):
+        register_config = config.REGISTER_CONFIG
+        self.register_number = register_number or register_config.get("register_number", 1)
+        queue_dir = Path(register_config.get("queue_dir", config.DATA_DIR / "queue"))
+        self.queue_path = queue_dir / f"print_jobs_{self.register_number}.db"
+
+        self._connection = None
+        self._lock = threading.Lock()
+        self._workers: Dict[str, threading.Thread] = {}
+        self._wake_events: Dict[str, threading.Event] = {}
+        self._stop_event = threading.Event()
+        self._listeners: List[Callable[[int, str, str], None]] = []
+        self._print_callback = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Connexion unique à la file (partagée entre threads, protégée par verrou)"""
+        if self._connection is None:
+            self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(
+                self.queue_path,
+                check_same_thread=False,
+                timeout=10.0
+            )
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS print_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    printer TEXT NOT NULL,
+                    document TEXT NOT NULL,
+                    label TEXT,
+                    status TEXT DEFAULT 'pending' CHECK(status IN ('pending', 'printing', 'done', 'failed')),
+                    attempts INTEGER DEFAULT 0,
+                    next_attempt_at TIMESTAMP,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    printed_at TIMESTAMP
+                )
+            """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_print_jobs_printer_status ON print_jobs(printer, status, id)"
+            )
+            # Travaux interrompus par un arrêt de l'application : à reprendre
+            self._connection.execute("UPDATE print_jobs SET status = 'pending' WHERE status = 'printing'")
+            self._connection.commit()
+        return self._connection
+
+    def add_listener(self, callback: Callable[[int, str, str], None]):
+        """
+        Abonner une fonction aux changements de statut
+
+        Args:
+            callback: Appelée avec (job_id, status, message) depuis le thread
+                      de l'imprimante
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[int, str, str], None]):
+        """Désabonner une fonction"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, job_id: int, status: str, message: str):
+        """Prévenir les abonnés d'un changement de statut"""
+        for callback in list(self._listeners):
+            try:
+                callback(job_id, status, message)
+            except Exception as e:
+                logger.error(f"Erreur notification impression: {e}")
+
+    def submit(self, printer: str, document: Dict, label: str = None) -> int:
+        """
+        Ajouter un ticket à la file d'impression
+
+        Args:
+            printer: Imprimante ('THERMAL', 'PDF', 'DIRECT')
+            document: Données du ticket (sérialisables en JSON)
+            label: Libellé affiché (ex: numéro de vente)
+
+        Returns:
+            ID du travail d'impression
+        """
+        printer = printer.upper()
+        with self._lock:
+            conn = self._get_connection()
+            cursor = conn.execute(
+                "INSERT INTO print_jobs (printer, document, label) VALUES (?, ?, ?)",
+                (printer, json.dumps(document, default=str), label)
+            )
+            conn.commit()
+            job_id = cursor.lastrowid
+
+        self._notify(job_id, 'pending', f"Ticket {label or job_id} en file d'impression")
+        self._ensure_worker(printer)
+        return job_id
+
+    def start(self, print_callback: Callable[[Dict, str], tuple] = None):
+        """
+        Démarrer les threads des imprimantes ayant des travaux en attente
+
+        Args:
+            print_callback: Fonction d'impression (document, printer) -> (success, message)
+        """
+        if print_callback:
+            self._print_callback = print_callback
+        self._stop_event.clear()
+
+        with self._lock:
+            printers = [row['printer'] for row in self._get_connection().execute(
+                "SELECT DISTINCT printer FROM print_jobs WHERE status = 'pending'"
+            ).fetchall()]
+
+        for printer in printers:
+            self._ensure_worker(printer)
+
+    def stop(self, timeout: float = 5.0):
+        """Arrêter les threads d'impression (les travaux restent en file)"""
+        self._stop_event.set()
+        for event in self._wake_events.values():
+            event.set()
+        for worker in list(self._workers.values()):
+            worker.join(timeout)
+        self._workers.clear()
+
+    def _ensure_worker(self, printer: str):
+        """Démarrer le thread de l'imprimante s'il ne tourne pas"""
+        event = self._wake_events.setdefault(printer, threading.Event())
+        worker = self._workers.get(printer)
+        if worker and worker.is_alive():
+            event.set()
+            return
+
+        worker = threading.Thread(
+            target=self._run_worker, args=(printer, event),
+            name=f"PrintSpooler-{printer}", daemon=True
+        )
+        self._workers[printer] = worker
+        worker.start()
+
+    def _next_job(self, printer: str) -> Optional[sqlite3.Row]:
+        """Prochain travail de l'imprimante (ordre de soumission)"""
+        with self._lock:
+            return self._get_connection().execute("""
+                SELECT * FROM print_jobs
+                WHERE printer = ? AND status = 'pending'
+                ORDER BY id
+                LIMIT 1
+            """, (printer,)).fetchone()
+
+    def _update_job(self, job_id: int, **fields):
+        """Mettre à jour un travail"""
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            conn = self._get_connection()
+            conn.execute(f"UPDATE print_jobs SET {assignments} WHERE id = ?",
+                         tuple(fields.values()) + (job_id,))
+            conn.commit()
+
+    def _run_worker(self, printer: str, wake_event: threading.Event):
+        """Boucle d'un thread d'imprimante : imprimer les travaux dans l'ordre"""
+        printer_config = config.PRINTER_CONFIG
+        max_attempts = printer_config.get("spooler_max_attempts", 5)
+        base_delay = printer_config.get("spooler_retry_base_seconds", 2)
+        max_delay = printer_config.get("spooler_retry_max_seconds", 60)
+
+        while not self._stop_event.is_set():
+            job = self._next_job(printer)
+            if job is None:
+                # File vide : attendre un nouveau ticket
+                wake_event.wait()
+                wake_event.clear()
+                continue
+
+            # Respecter le délai avant nouvelle tentative (le ticket suivant attend)
+            if job['next_attempt_at']:
+                delay = (datetime.fromisoformat(job['next_attempt_at']) - datetime.now()).total_seconds()
+                if delay > 0:
+                    wake_event.wait(delay)
+                    wake_event.clear()
+                    continue
+
+            job_id = job['id']
+            label = job['label'] or job_id
+            self._update_job(job_id, status='printing')
+            self._notify(job_id, 'printing', f"Impression du ticket {label}...")
+
+            try:
+                if not self._print_callback:
+                    raise RuntimeError("Aucune fonction d'impression configurée")
+                success, message = self._print_callback(json.loads(job['document']), printer)
+            except Exception as e:
+                success, message = False, str(e)
+
+            if success:
+                self._update_job(job_id, status='done', last_error=None,
+                                 printed_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                self._notify(job_id, 'done', f"Ticket {label} imprimé")
+                continue
+
+            attempts = job['attempts'] + 1
+            if attempts >= max_attempts:
+                self._update_job(job_id, status='failed', attempts=attempts, last_error=message)
+                logger.error(f"Impression abandonnée ({printer}) ticket {label}: {message}")
+                self._notify(job_id, 'failed', f"Échec impression ticket {label}: {message}")
+                continue
+
+            delay = min(base_delay * (2 ** (attempts - 1)), max_delay)
+            next_attempt = datetime.now() + timedelta(seconds=delay)
+            self._update_job(job_id, status='pending', attempts=attempts, last_error=message,
+                             next_attempt_at=next_attempt.isoformat(sep=' '))
+            logger.warning(f"Impression ({printer}) ticket {label} en échec, nouvelle tentative dans {delay}s: {message}")
+            self._notify(job_id, 'pending', f"Imprimante indisponible, nouvel essai dans {delay}s")
+
+    def get_jobs(self, status: str = None, limit: int = 100) -> List[Dict]:
+        """
+        Obtenir les travaux d'impression récents
+
+        Args:
+            status: Filtrer par statut
+            limit: Nombre maximum de travaux
+
+        Returns:
+            Liste des travaux (sans le contenu du ticket)
+        """
+        query = """
+            SELECT id, printer, label, status, attempts, last_error, created_at, printed_at
+            FROM print_jobs
+        """
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._get_connection().execute(query, tuple(params)).fetchall()
+        return [dict(row) for row in rows]
+
+    def retry_job(self, job_id: int) -> bool:
+        """Remettre un travail échoué dans la file"""
+        with self._lock:
+            conn = self._get_connection()
+            row = conn.execute("SELECT printer FROM print_jobs WHERE id = ? AND status = 'failed'",
+                               (job_id,)).fetchone()
+            if not row:
+                return False
+            conn.execute("""
+                UPDATE print_jobs SET status = 'pending', attempts = 0, next_attempt_at = NULL
+                WHERE id = ?
+            """, (job_id,))
+            conn.commit()
+
+        self._ensure_worker(row['printer'])
+        return True
+
+
+# Instance globale
+print_spooler = PrintSpooler()
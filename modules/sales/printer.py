@@ -8,13 +8,7 @@ from datetime import datetime
 import config
 from core.logger import logger
 from .receipt import receipt_generator
-
-try:
-    from escpos.printer import Serial, Usb, Network, File
-    ESCPOS_AVAILABLE = True
-except ImportError:
-    ESCPOS_AVAILABLE = False
-    logger.warning("Module python-escpos non disponible. Impression thermique désactivée.")
+from .escpos_renderer import escpos_renderer
 
 
 class PrinterManager:
@@ -22,33 +16,6 @@ class PrinterManager:
     
     def __init__(self):
         self.printer_config = config.PRINTER_CONFIG
-        self.thermal_printer = None
-    
-    def setup_thermal_printer(self, port: str = None) -> bool:
-        """
-        Configurer l'imprimante thermique
-        
-        Args:
-            port: Port série (ex: 'COM1', '/dev/ttyUSB0')
-            
-        Returns:
-            True si succès
-        """
-        if not ESCPOS_AVAILABLE:
-            logger.error("Module python-escpos non installé")
-            return False
-        
-        try:
-            port = port or self.printer_config.get('thermal_printer_port', 'COM1')
-            
-            # Essayer de se connecter à l'imprimante série
-            self.thermal_printer = Serial(port)
-            logger.info(f"Imprimante thermique configurée sur {port}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de la configuration de l'imprimante thermique: {e}")
-            return False
     
     def print_receipt(self, sale_data: Dict, method: str = None) -> tuple[bool, str]:
         """
@@ -75,39 +42,60 @@ class PrinterManager:
         else:
             return False, f"Méthode d'impression inconnue: {method}"
     
-    def _print_thermal(self, sale_data: Dict) -> tuple[bool, str]:
+    def submit_receipt(self, sale_data: Dict, method: str = None) -> tuple[bool, str, Optional[int]]:
         """
-        Imprimer sur imprimante thermique ESC/POS
+        Envoyer un ticket à la file d'impression (sans attendre l'imprimante)
+        
+        L'impression standard ouvre un dialogue Qt : elle reste synchrone.
         
         Args:
             sale_data: Données de la vente
+            method: Méthode d'impression ('thermal', 'pdf', 'direct')
             
         Returns:
-            (success, message)
+            (success, message, job_id)
         """
-        if not ESCPOS_AVAILABLE:
-            return False, "Module python-escpos non installé"
+        method = (method or self.printer_config.get('default_printer', 'DIRECT')).upper()
+        
+        if method == 'STANDARD':
+            success, message = self._print_standard(sale_data)
+            return success, message, None
         
-        if not self.thermal_printer:
-            # Essayer de configurer l'imprimante
-            if not self.setup_thermal_printer():
-                return False, "Imprimante thermique non configurée"
+        if method not in ('THERMAL', 'PDF', 'DIRECT'):
+            return False, f"Méthode d'impression inconnue: {method}", None
         
         try:
-            # Générer le ticket en texte
-            receipt_text = receipt_generator.generate_text_receipt(sale_data)
-            
-            # Imprimer
-            self.thermal_printer.text(receipt_text)
-            self.thermal_printer.cut()
-            
-            logger.info(f"Ticket imprimé (thermique): {sale_data['sale_number']}")
-            return True, "Ticket imprimé avec succès"
+            from .print_spooler import print_spooler
+            job_id = print_spooler.submit(method, sale_data, label=sale_data.get('sale_number'))
+            return True, "Ticket envoyé à l'impression", job_id
+        except Exception as e:
+            error_msg = f"Erreur lors de l'envoi à l'impression: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, None
+    
+    def _print_thermal(self, sale_data: Dict) -> tuple[bool, str]:
+        """
+        Imprimer sur imprimante thermique ESC/POS
+        
+        Le ticket est rendu en un seul flux d'octets et envoyé en une écriture.
+        
+        Args:
+            sale_data: Données de la vente
             
+        Returns:
+            (success, message)
+        """
+        try:
+            data = escpos_renderer.render_receipt(sale_data)
         except Exception as e:
             error_msg = f"Erreur lors de l'impression thermique: {str(e)}"
             logger.error(error_msg)
             return False, error_msg
+        
+        success, message = escpos_renderer.send(data)
+        if success:
+            logger.info(f"Ticket imprimé (thermique): {sale_data['sale_number']}")
+        return success, message
     
     def _print_pdf(self, sale_data: Dict) -> tuple[bool, str]:
         """
@@ -4,27 +4,168 @@ Génération de tickets de caisse
 """
 from typing import Dict, Optional
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
 from pathlib import Path
 import config
 
 
+# Libellés des modes de paiement
+PAYMENT_LABELS = {
+    'cash': 'Espèces',
+    'card': 'Carte',
+    'credit': 'Crédit',
+    'mixed': 'Mixte'
+}
+
+# Feuille de style de l'aperçu HTML
+RECEIPT_CSS = """
+                body {
+                    font-family: 'Courier New', monospace;
+                    width: 300px;
+                    margin: 20px auto;
+                    padding: 10px;
+                    border: 1px solid #ccc;
+                }
+                .header {
+                    text-align: center;
+                    font-weight: bold;
+                    margin-bottom: 10px;
+                }
+                .separator {
+                    border-top: 1px dashed #000;
+                    margin: 10px 0;
+                }
+                .item {
+                    margin: 5px 0;
+                }
+                .item-name {
+                    font-weight: bold;
+                }
+                .item-details {
+                    display: flex;
+                    justify-content: space-between;
+                    font-size: 0.9em;
+                }
+                .totals {
+                    margin-top: 10px;
+                }
+                .total-line {
+                    display: flex;
+                    justify-content: space-between;
+                    margin: 3px 0;
+                }
+                .grand-total {
+                    font-weight: bold;
+                    font-size: 1.2em;
+                    border-top: 2px solid #000;
+                    padding-top: 5px;
+                }
+                .footer {
+                    text-align: center;
+                    margin-top: 15px;
+                    font-style: italic;
+                }
+"""
+
+
 class ReceiptGenerator:
     """Générateur de tickets de caisse"""
     
     def __init__(self):
         self.store_config = config.STORE_CONFIG
         self.language = config.LANGUAGE_CONFIG['default_language']
+        self._template = None
+        self._template_version = None
     
     def set_language(self, language: str):
         """Définir la langue du ticket"""
         self.language = language
     
+    def _settings_version(self) -> tuple:
+        """Version des paramètres utilisés par les parties fixes du ticket"""
+        return (
+            tuple(sorted((key, str(value)) for key, value in self.store_config.items())),
+            self.language,
+            self._footer_message(),
+        )
+    
+    def _footer_message(self) -> str:
+        """Message de pied de ticket dans la langue courante"""
+        return config.DEFAULT_MESSAGES.get(self.language, {}).get(
+            'receipt_footer', 'Merci pour votre visite !'
+        )
+    
+    def invalidate_template(self):
+        """Forcer la recompilation des parties fixes du ticket"""
+        self._template = None
+        self._template_version = None
+    
+    def get_template(self) -> Dict:
+        """
+        Obtenir les parties fixes du ticket (en-tête magasin, styles, pied)
+        
+        Compilées une seule fois puis réutilisées tant que les paramètres
+        du magasin et la langue ne changent pas.
+        
+        Returns:
+            {text_header, html_head, pdf_header, footer}
+        """
+        version = self._settings_version()
+        if self._template is None or self._template_version != version:
+            self._template = self._compile_template()
+            self._template_version = version
+        return self._template
+    
+    def _compile_template(self) -> Dict:
+        """Construire les parties fixes du ticket pour chaque format"""
+        store = self.store_config
+        width = 42  # Largeur pour imprimante 80mm
+        
+        # Identifiants légaux (dans l'ordre d'impression)
+        legal_ids = [
+            f"{label}: {store[key]}"
+            for key, label in (('tax_id', 'NIF'), ('nis', 'NIS'), ('rc', 'RC'), ('ai', 'AI'))
+            if store.get(key)
+        ]
+        
+        # Texte (imprimante thermique)
+        text_lines = ["=" * width, store['name'].center(width), store['address'].center(width),
+                      store['phone'].center(width)]
+        text_lines += [line.center(width) for line in legal_ids]
+        text_lines += ["=" * width, ""]
+        
+        # PDF : (police, taille, texte, interligne après)
+        pdf_header = [("Helvetica-Bold", 18, store['name'], 7),
+                      ("Helvetica", 8, store['address'], 4),
+                      ("Helvetica", 8, store['phone'], 4)]
+        pdf_header += [("Helvetica", 8, line, 4) for line in legal_ids]
+        
+        # HTML (aperçu)
+        html_head = f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <style>{RECEIPT_CSS}            </style>
+        </head>
+        <body>
+            <div class="header">
+                <div style="font-size: 1.2em;">{store['name']}</div>
+                <div>{store['address']}</div>
+                <div>{store['phone']}</div>
+                {'<div>NIF: ' + store.get('tax_id', '') + '</div>' if store.get('tax_id') else ''}
+            </div>
+            
+            <div class="separator"></div>
+            """
+        
+        return {
+            'width': width,
+            'text_header': text_lines,
+            'pdf_header': pdf_header,
+            'html_head': html_head,
+            'footer': self._footer_message(),
+        }
+    
     def generate_text_receipt(self, sale_data: Dict) -> str:
         """
         Générer un ticket en format texte (pour imprimantes thermiques)
@@ -35,24 +176,27 @@ class ReceiptGenerator:
         Returns:
             Ticket en format texte
         """
-        lines = []
-        width = 42  # Largeur pour imprimante 80mm
+        template = self.get_template()
         
-        # En-tête
-        lines.append("=" * width)
-        lines.append(self.store_config['name'].center(width))
-        lines.append(self.store_config['address'].center(width))
-        lines.append(self.store_config['phone'].center(width))
-        if self.store_config.get('tax_id'):
-            lines.append(f"NIF: {self.store_config['tax_id']}".center(width))
-        if self.store_config.get('nis'):
-            lines.append(f"NIS: {self.store_config['nis']}".center(width))
-        if self.store_config.get('rc'):
-            lines.append(f"RC: {self.store_config['rc']}".center(width))
-        if self.store_config.get('ai'):
-            lines.append(f"AI: {self.store_config['ai']}".center(width))
-        lines.append("=" * width)
-        lines.append("")
+        # En-tête (compilé) puis corps du ticket
+        lines = list(template['text_header'])
+        lines += self.text_body_lines(sale_data)
+        
+        return "\n".join(lines)
+    
+    def text_body_lines(self, sale_data: Dict) -> list:
+        """
+        Lignes du ticket texte après l'en-tête magasin (vente, articles, totaux, pied)
+        
+        Args:
+            sale_data: Données de la vente
+            
+        Returns:
+            Liste de lignes
+        """
+        template = self.get_template()
+        width = template['width']
+        lines = []
         
         # Informations de vente
         lines.append(f"N° Vente: {sale_data['sale_number']}")
@@ -108,14 +252,7 @@ class ReceiptGenerator:
         
         # Paiement
         payment_method = sale_data.get('payment_method', 'cash')
-        payment_labels = {
-            'cash': 'Espèces',
-            'card': 'Carte',
-            'credit': 'Crédit',
-            'mixed': 'Mixte'
-        }
-        
-        lines.append(f"Mode: {payment_labels.get(payment_method, payment_method)}")
+        lines.append(f"Mode: {PAYMENT_LABELS.get(payment_method, payment_method)}")
         
         if payment_method != 'credit':
             paid = sale_data.get('amount_paid', total)
@@ -129,15 +266,12 @@ class ReceiptGenerator:
         lines.append("-" * width)
         
         # Pied de page
-        footer_msg = config.DEFAULT_MESSAGES.get(self.language, {}).get(
-            'receipt_footer', 'Merci pour votre visite !'
-        )
-        lines.append(footer_msg.center(width))
+        lines.append(template['footer'].center(width))
         lines.append("")
         lines.append(datetime.now().strftime('%Y-%m-%d %H:%M:%S').center(width))
         lines.append("=" * width)
         
-        return "\n".join(lines)
+        return lines
     
     def generate_pdf_receipt(self, sale_data: Dict, output_path: Path) -> bool:
         """
@@ -151,6 +285,12 @@ class ReceiptGenerator:
             True si succès
         """
         try:
+            # reportlab n'est chargé qu'au premier ticket PDF (démarrage plus rapide)
+            from reportlab.lib.units import mm
+            from reportlab.pdfgen import canvas
+            
+            template = self.get_template()
+            
             # Créer le PDF
             c = canvas.Canvas(str(output_path), pagesize=(80*mm, 297*mm))
             
@@ -158,29 +298,11 @@ class ReceiptGenerator:
             y = 280 * mm
             x_center = 40 * mm
             
-            # En-tête
-            c.setFont("Helvetica-Bold", 18)
-            c.drawCentredString(x_center, y, self.store_config['name'])
-            y -= 7 * mm
-            
-            c.setFont("Helvetica", 8)
-            c.drawCentredString(x_center, y, self.store_config['address'])
-            y -= 4 * mm
-            c.drawCentredString(x_center, y, self.store_config['phone'])
-            y -= 4 * mm
-            
-            if self.store_config.get('tax_id'):
-                c.drawCentredString(x_center, y, f"NIF: {self.store_config['tax_id']}")
-                y -= 4 * mm
-            if self.store_config.get('nis'):
-                c.drawCentredString(x_center, y, f"NIS: {self.store_config['nis']}")
-                y -= 4 * mm
-            if self.store_config.get('rc'):
-                c.drawCentredString(x_center, y, f"RC: {self.store_config['rc']}")
-                y -= 4 * mm
-            if self.store_config.get('ai'):
-                c.drawCentredString(x_center, y, f"AI: {self.store_config['ai']}")
-                y -= 4 * mm
+            # En-tête (compilé)
+            for font, size, text, spacing in template['pdf_header']:
+                c.setFont(font, size)
+                c.drawCentredString(x_center, y, text)
+                y -= spacing * mm
             
             # Ligne de séparation
             y -= 2 * mm
@@ -260,14 +382,7 @@ class ReceiptGenerator:
             # Paiement
             c.setFont("Helvetica", 8)
             payment_method = sale_data.get('payment_method', 'cash')
-            payment_labels = {
-                'cash': 'Espèces',
-                'card': 'Carte',
-                'credit': 'Crédit',
-                'mixed': 'Mixte'
-            }
-            
-            c.drawString(5*mm, y, f"Mode de paiement: {payment_labels.get(payment_method, payment_method)}")
+            c.drawString(5*mm, y, f"Mode de paiement: {PAYMENT_LABELS.get(payment_method, payment_method)}")
             y -= 4 * mm
             
             if payment_method != 'credit':
@@ -286,10 +401,7 @@ class ReceiptGenerator:
             # Pied de page
             y -= 5 * mm
             c.setFont("Helvetica-Bold", 9)
-            footer_msg = config.DEFAULT_MESSAGES.get(self.language, {}).get(
-                'receipt_footer', 'Merci pour votre visite !'
-            )
-            c.drawCentredString(x_center, y, footer_msg)
+            c.drawCentredString(x_center, y, template['footer'])
             y -= 5 * mm
             
             c.setFont("Helvetica", 7)
@@ -314,70 +426,10 @@ class ReceiptGenerator:
         Returns:
             HTML du ticket
         """
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{
-                    font-family: 'Courier New', monospace;
-                    width: 300px;
-                    margin: 20px auto;
-                    padding: 10px;
-                    border: 1px solid #ccc;
-                }}
-                .header {{
-                    text-align: center;
-                    font-weight: bold;
-                    margin-bottom: 10px;
-                }}
-                .separator {{
-                    border-top: 1px dashed #000;
-                    margin: 10px 0;
-                }}
-                .item {{
-                    margin: 5px 0;
-                }}
-                .item-name {{
-                    font-weight: bold;
-                }}
-                .item-details {{
-                    display: flex;
-                    justify-content: space-between;
-                    font-size: 0.9em;
-                }}
-                .totals {{
-                    margin-top: 10px;
-                }}
-                .total-line {{
-                    display: flex;
-                    justify-content: space-between;
-                    margin: 3px 0;
-                }}
-                .grand-total {{
-                    font-weight: bold;
-                    font-size: 1.2em;
-                    border-top: 2px solid #000;
-                    padding-top: 5px;
-                }}
-                .footer {{
-                    text-align: center;
-                    margin-top: 15px;
-                    font-style: italic;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <div style="font-size: 1.2em;">{self.store_config['name']}</div>
-                <div>{self.store_config['address']}</div>
-                <div>{self.store_config['phone']}</div>
-                {'<div>NIF: ' + self.store_config.get('tax_id', '') + '</div>' if self.store_config.get('tax_id') else ''}
-            </div>
-            
-            <div class="separator"></div>
-            
+        template = self.get_template()
+        
+        # En-tête et styles (compilés)
+        html = template['html_head'] + f"""
             <div>
                 <div>N° Vente: {sale_data['sale_number']}</div>
                 <div>Date: {sale_data.get('sale_date', datetime.now().strftime('%Y-%m-%d %H:%M'))}</div>
@@ -408,13 +460,6 @@ class ReceiptGenerator:
             """
         
         # Totaux
-        payment_labels = {
-            'cash': 'Espèces',
-            'card': 'Carte',
-            'credit': 'Crédit',
-            'mixed': 'Mixte'
-        }
-        
         discount_html = f"""
             <div class="total-line">
                 <span>Réduction:</span>
@@ -458,12 +503,12 @@ class ReceiptGenerator:
             <div class="separator"></div>
             
             <div>
-                <div>Mode: {payment_labels.get(sale_data.get('payment_method', 'cash'), 'Espèces')}</div>
+                <div>Mode: {PAYMENT_LABELS.get(sale_data.get('payment_method', 'cash'), 'Espèces')}</div>
                 {payment_html}
             </div>
             
             <div class="footer">
-                <div>{config.DEFAULT_MESSAGES.get(self.language, {}).get('receipt_footer', 'Merci pour votre visite !')}</div>
+                <div>{template['footer']}</div>
                 <div style="font-size: 0.8em; margin-top: 5px;">{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
             </div>
         </body>
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+Sessions de caisse et clôtures (rapports Z)
+
+La clôture fige un instantané immuable des totaux de la session ; les
+rapports Z historiques sont ensuite relus tels quels, sans recalcul.
+Une session couvre les ventes et retours dont l'ID suit ceux de la
+clôture précédente de la caisse : aucune vente n'est perdue ni comptée
+deux fois (sale_date n'est qu'à la seconde, et les ventes hors ligne
+synchronisées tardivement reçoivent leur ID à l'intégration).
+"""
+import json
+from typing import Dict, List, Optional
+from datetime import datetime
+from database.db_manager import db
+from core.logger import logger
+from .offline_queue import offline_queue
+import config
+
+
+class ShiftManager:
+    """Gestionnaire des sessions et clôtures de caisse"""
+
+    def __init__(self):
+        self.register_number = config.REGISTER_CONFIG.get("register_number", 1)
+
+    def get_open_shift(self, register_number: int = None) -> Dict:
+        """
+        Obtenir la session ouverte de la caisse
+
+        Si aucune session n'a été ouverte explicitement, une session implicite
+        démarre à la dernière clôture de la caisse (id = None).
+
+        Args:
+            register_number: Numéro de caisse (défaut: caisse courante)
+
+        Returns:
+            Session {id, register_number, opened_at, opening_cash,
+            start_sale_id, start_return_id, ...}
+        """
+        register_number = register_number or self.register_number
+
+        shift = db.fetch_one("""
+            SELECT * FROM shifts
+            WHERE register_number = ? AND status = 'open'
+            ORDER BY id DESC LIMIT 1
+        """, (register_number,))
+        if shift:
+            return dict(shift)
+
+        start_sale_id, start_return_id, opened_at = self._last_close_bounds(register_number)
+        return {
+            'id': None,
+            'register_number': register_number,
+            'opened_by': None,
+            'opened_at': opened_at,
+            'opening_cash': 0.0,
+            'start_sale_id': start_sale_id,
+            'start_return_id': start_return_id,
+            'status': 'open',
+        }
+
+    def _last_close_bounds(self, register_number: int) -> tuple:
+        """Bornes de départ d'une session : fin de la dernière clôture de la caisse"""
+        last_close = db.fetch_one("""
+            SELECT end_sale_id, end_return_id, closed_at FROM shifts
+            WHERE register_number = ? AND status = 'closed'
+            ORDER BY id DESC LIMIT 1
+        """, (register_number,))
+        if not last_close:
+            return 0, 0, None
+        return last_close['end_sale_id'], last_close['end_return_id'], last_close['closed_at']
+
+    def open_shift(self, user_id: int, opening_cash: float = 0.0,
+                   register_number: int = None) -> tuple[bool, str, Optional[int]]:
+        """
+        Ouvrir une session de caisse
+
+        Args:
+            user_id: ID de l'utilisateur
+            opening_cash: Fond de caisse
+            register_number: Numéro de caisse
+
+        Returns:
+            (success, message, shift_id)
+        """
+        register_number = register_number or self.register_number
+        try:
+            current = self.get_open_shift(register_number)
+            if current['id']:
+                return False, "Une session est déjà ouverte sur cette caisse", current['id']
+
+            # Les ventes faites depuis la dernière clôture appartiennent à cette session
+            start_sale_id, start_return_id, _ = self._last_close_bounds(register_number)
+            shift_id = db.execute_insert("""
+                INSERT INTO shifts (
+                    register_number, opened_by, opened_at, opening_cash,
+                    start_sale_id, start_return_id
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                register_number, user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                opening_cash, start_sale_id, start_return_id
+            ))
+
+            logger.info(f"Session ouverte: caisse {register_number} (ID: {shift_id})")
+            return True, "Session de caisse ouverte", shift_id
+
+        except Exception as e:
+            error_msg = f"Erreur lors de l'ouverture de la session: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, None
+
+    def compute_totals(self, shift: Dict, end_sale_id: int = None,
+                       end_return_id: int = None, closed_at: str = None) -> Dict:
+        """
+        Calculer les totaux d'une session
+
+        Chaque requête parcourt une plage d'IDs (clé primaire) filtrée par
+        caisse, sans balayer l'historique. Retours et annulations sont
+        comptés sur la caisse qui a remboursé, quelle que soit la caisse ou
+        la session de la vente d'origine ; les annulations, sans ID propre,
+        sont bornées par l'heure des clôtures.
+
+        Args:
+            shift: Session (voir get_open_shift)
+            end_sale_id: Dernière vente incluse (défaut: aucune limite)
+            end_return_id: Dernier retour inclus (défaut: aucune limite)
+            closed_at: Heure de clôture ; annulations antérieures seulement
+                       (défaut: aucune limite)
+
+        Returns:
+            Totaux par mode de paiement, caissier, catégorie, retours,
+            annulations, remises et espèces attendues
+        """
+        register_number = shift['register_number']
+        sales_window = (register_number, shift['start_sale_id'] or 0,
+                        end_sale_id if end_sale_id is not None else -1)
+        returns_window = (register_number, shift['start_return_id'] or 0,
+                          end_return_id if end_return_id is not None else -1)
+        # Borne haute -1 : pas de limite (session ouverte)
+        sales_filter = "s.register_number = ? AND s.id > ? AND (? < 0 OR s.id <= ?)"
+
+        def sales_params(extra=()):
+            register, start, end = sales_window
+            return (register, start, end, end) + extra
+
+        by_payment = [dict(row) for row in db.execute_query(f"""
+            SELECT s.payment_method, COUNT(*) as count, COALESCE(SUM(s.total_amount), 0) as total
+            FROM sales s
+            WHERE {sales_filter} AND s.status != 'cancelled'
+            GROUP BY s.payment_method
+            ORDER BY total DESC
+        """, sales_params())]
+
+        by_cashier = [dict(row) for row in db.execute_query(f"""
+            SELECT s.cashier_id, u.full_name as cashier_name,
+                   COUNT(*) as count, COALESCE(SUM(s.total_amount), 0) as total
+            FROM sales s
+            LEFT JOIN users u ON s.cashier_id = u.id
+            WHERE {sales_filter} AND s.status != 'cancelled'
+            GROUP BY s.cashier_id, u.full_name
+            ORDER BY total DESC
+        """, sales_params())]
+
+        by_category = [dict(row) for row in db.execute_query(f"""
+            SELECT COALESCE(c.name, 'Divers') as category,
+                   SUM(si.quantity) as quantity, SUM(si.subtotal) as total,
+                   SUM(si.quantity * si.unit_price * COALESCE(si.discount_percentage, 0) / 100.0) as discounts
+            FROM sales s
+            JOIN sale_items si ON si.sale_id = s.id
+            LEFT JOIN products p ON si.product_id = p.id
+            LEFT JOIN categories c ON p.category_id = c.id
+            WHERE {sales_filter} AND s.status != 'cancelled'
+            GROUP BY COALESCE(c.name, 'Divers')
+            ORDER BY total DESC
+        """, sales_params())]
+
+        header = db.fetch_one(f"""
+            SELECT
+                COALESCE(SUM(CASE WHEN s.status != 'cancelled' THEN s.discount_amount END), 0) as sale_discounts,
+                COALESCE(SUM(CASE WHEN s.status = 'cancelled' THEN 1 END), 0) as cancelled_count,
+                COALESCE(SUM(CASE WHEN s.status = 'cancelled' THEN s.total_amount END), 0) as cancelled_amount,
+                COALESCE(SUM(CASE WHEN s.status = 'cancelled' AND s.payment_method = 'cash'
+                                  THEN s.total_amount END), 0) as cancelled_cash
+            FROM sales s
+            WHERE {sales_filter}
+        """, sales_params())
+
+        # Retours remboursés par cette caisse pendant la session
+        register, start, end = returns_window
+        returns = [dict(row) for row in db.execute_query("""
+            SELECT r.refund_method, COUNT(*) as count, COALESCE(SUM(r.return_amount), 0) as total
+            FROM returns r
+            WHERE r.register_number = ? AND r.id > ? AND (? < 0 OR r.id <= ?)
+            GROUP BY r.refund_method
+        """, (register, start, end, end))]
+
+        # Annulations remboursées en espèces par cette caisse depuis la
+        # dernière clôture (hors montant déjà remboursé par des retours)
+        _, _, last_closed_at = self._last_close_bounds(register_number)
+        cancel_refunds = db.fetch_one("""
+            SELECT COALESCE(SUM(s.total_amount - COALESCE(
+                       (SELECT SUM(r.return_amount) FROM returns r WHERE r.original_sale_id = s.id), 0
+                   )), 0) as total
+            FROM sales s
+            WHERE s.cancelled_register = ? AND s.cancelled_at IS NOT NULL
+              AND (? IS NULL OR s.cancelled_at > ?) AND (? IS NULL OR s.cancelled_at <= ?)
+              AND s.payment_method = 'cash'
+        """, (register_number, last_closed_at, last_closed_at, closed_at, closed_at))['total']
+
+        sales_count = sum(row['count'] for row in by_payment)
+        total_sales = sum(row['total'] for row in by_payment)
+        total_returns = sum(row['total'] for row in returns)
+        cash_sales = sum(row['total'] for row in by_payment if row['payment_method'] == 'cash')
+        cash_refunds = sum(row['total'] for row in returns if row['refund_method'] == 'cash')
+        opening_cash = shift.get('opening_cash') or 0.0
+
+        return {
+            'register_number': register_number,
+            'opened_at': shift.get('opened_at'),
+            'opening_cash': opening_cash,
+            'sales_count': sales_count,
+            'total_sales': total_sales,
+            'total_returns': total_returns,
+            'net_sales': total_sales - total_returns,
+            'by_payment_method': by_payment,
+            'by_cashier': by_cashier,
+            'by_category': by_category,
+            'returns': returns,
+            'cancelled_count': header['cancelled_count'],
+            'cancelled_amount': header['cancelled_amount'],
+            'total_discounts': header['sale_discounts'] + sum(row['discounts'] or 0 for row in by_category),
+            'cancelled_refunds': cancel_refunds,
+            'cash_expected': (opening_cash + cash_sales + header['cancelled_cash']
+                              - cash_refunds - cancel_refunds),
+        }
+
+    def get_live_totals(self, register_number: int = None) -> Dict:
+        """Totaux détaillés de la session ouverte (rapport X)"""
+        return self.compute_totals(self.get_open_shift(register_number))
+
+    def get_live_summary(self, register_number: int = None) -> Dict:
+        """
+        Chiffre d'affaires de la session ouverte (tableau de bord)
+
+        Une seule agrégation sur les ventes postérieures à la dernière clôture.
+
+        Returns:
+            {sales_count, total_sales, opened_at}
+        """
+        shift = self.get_open_shift(register_number)
+        result = db.fetch_one("""
+            SELECT COUNT(*) as sales_count, COALESCE(SUM(total_amount), 0) as total_sales
+            FROM sales
+            WHERE register_number = ? AND id > ? AND status != 'cancelled'
+        """, (shift['register_number'], shift['start_sale_id'] or 0))
+        return {
+            'sales_count': result['sales_count'],
+            'total_sales': result['total_sales'],
+            'opened_at': shift['opened_at'],
+        }
+
+    def close_shift(self, user_id: int, counted_cash: float = None, notes: str = None,
+                    register_number: int = None) -> tuple[bool, str, Optional[int]]:
+        """
+        Clôturer la session de caisse (rapport Z)
+
+        L'instantané est enregistré une fois pour toutes ; une session
+        clôturée ne peut plus être modifiée (trigger).
+
+        Args:
+            user_id: ID de l'utilisateur
+            counted_cash: Espèces comptées dans le tiroir
+            notes: Notes
+            register_number: Numéro de caisse
+
+        Returns:
+            (success, message, shift_id)
+        """
+        register_number = register_number or self.register_number
+        try:
+            pending = offline_queue.pending_count()
+            if pending:
+                return False, f"{pending} vente(s) hors ligne en attente de synchronisation", None
+
+            closed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            db.begin_transaction()
+            try:
+                shift = self.get_open_shift(register_number)
+                bounds = db.fetch_one("""
+                    SELECT (SELECT COALESCE(MAX(id), 0) FROM sales) as end_sale_id,
+                           (SELECT COALESCE(MAX(id), 0) FROM returns) as end_return_id
+                """)
+                end_sale_id = max(bounds['end_sale_id'], shift['start_sale_id'] or 0)
+                end_return_id = max(bounds['end_return_id'], shift['start_return_id'] or 0)
+
+                totals = self.compute_totals(shift, end_sale_id, end_return_id, closed_at)
+                totals['closed_at'] = closed_at
+                difference = counted_cash - totals['cash_expected'] if counted_cash is not None else None
+
+                shift_id = shift['id']
+                if shift_id is None:
+                    shift_id = db.execute_insert("""
+                        INSERT INTO shifts (
+                            register_number, opened_by, opened_at, opening_cash,
+                            start_sale_id, start_return_id
+                        ) VALUES (?, ?, ?, 0, ?, ?)
+                    """, (
+                        register_number, user_id, shift['opened_at'] or closed_at,
+                        shift['start_sale_id'], shift['start_return_id']
+                    ))
+                    totals['opened_at'] = shift['opened_at'] or closed_at
+
+                db.execute_update("""
+                    UPDATE shifts SET
+                        status = 'closed', closed_by = ?, closed_at = ?,
+                        end_sale_id = ?, end_return_id = ?,
+                        sales_count = ?, total_sales = ?, total_returns = ?,
+                        cash_expected = ?, counted_cash = ?, cash_difference = ?,
+                        snapshot = ?, notes = ?
+                    WHERE id = ?
+                """, (
+                    user_id, closed_at, end_sale_id, end_return_id,
+                    totals['sales_count'], totals['total_sales'], totals['total_returns'],
+                    totals['cash_expected'], counted_cash, difference,
+                    json.dumps(totals), notes, shift_id
+                ))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            # Les compteurs du tableau de bord repartent de zéro
+            from modules.reports.metrics_hub import metrics_hub
+            metrics_hub.sales_changed()
+
+            logger.info(
+                f"Clôture caisse {register_number} (Z #{shift_id}): "
+                f"{totals['sales_count']} vente(s), {totals['total_sales']:.2f} DA"
+            )
+            return True, f"Caisse clôturée (Z #{shift_id})", shift_id
+
+        except Exception as e:
+            error_msg = f"Erreur lors de la clôture: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, None
+
+    def get_z_report(self, shift_id: int) -> Optional[Dict]:
+        """
+        Obtenir le rapport Z d'une session clôturée (instantané enregistré)
+
+        Args:
+            shift_id: ID de la session
+
+        Returns:
+            Totaux figés à la clôture, avec les informations de la session
+        """
+        shift = db.fetch_one("""
+            SELECT sh.*, uo.full_name as opened_by_name, uc.full_name as closed_by_name
+            FROM shifts sh
+            LEFT JOIN users uo ON sh.opened_by = uo.id
+            LEFT JOIN users uc ON sh.closed_by = uc.id
+            WHERE sh.id = ? AND sh.status = 'closed'
+        """, (shift_id,))
+        if not shift:
+            return None
+
+        report = json.loads(shift['snapshot'])
+        report.update({
+            'shift_id': shift['id'],
+            'opened_by_name': shift['opened_by_name'],
+            'closed_by_name': shift['closed_by_name'],
+            'counted_cash': shift['counted_cash'],
+            'cash_difference': shift['cash_difference'],
+            'notes': shift['notes'],
+        })
+        return report
+
+    def get_closed_shifts(self, start_date: str = None, end_date: str = None,
+                          register_number: int = None) -> List[Dict]:
+        """
+        Lister les clôtures (colonnes de synthèse, sans l'instantané)
+
+        Args:
+            start_date: Date de début (YYYY-MM-DD)
+            end_date: Date de fin (YYYY-MM-DD)
+            register_number: Filtrer par caisse
+
+        Returns:
+            Liste des sessions clôturées
+        """
+        query = """
+            SELECT id, register_number, opened_at, closed_at, sales_count,
+                   total_sales, total_returns, cash_expected, counted_cash, cash_difference
+            FROM shifts
+            WHERE status = 'closed'
+        """
+        params = []
+
+        if register_number:
+            query += " AND register_number = ?"
+            params.append(register_number)
+
+        if start_date:
+            query += " AND closed_at >= ?"
+            params.append(start_date)
+
+        if end_date:
+            query += " AND closed_at < date(?, '+1 day')"
+            params.append(end_date)
+
+        query += " ORDER BY closed_at DESC"
+
+        results = db.execute_query(query, tuple(params))
+        return [dict(row) for row in results]
+
+
+# Instance globale
+shift_manager = ShiftManager()
@@ -3,5 +3,6 @@
 Package suppliers - Gestion des fournisseurs
 """
 from .supplier_manager import SupplierManager
+from .purchase_orders import PurchaseOrderManager, purchase_order_manager
 
-__all__ = ['SupplierManager']
+__all__ = ['SupplierManager', 'PurchaseOrderManager', 'purchase_order_manager']
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""
+Bons de commande fournisseur et réception de marchandises
+
+Une réception s'applique en une seule transaction, quel que soit le nombre
+de lignes : mouvements de stock et coûts (voir modules.products.costing),
+prix d'achat, quantités reçues de la commande, totaux et journal du
+fournisseur sont écrits par lots (executemany).
+"""
+from typing import List, Dict, Optional, Iterable
+from database.db_manager import db
+from core.logger import logger
+from core.sequence import sequence_generator
+from modules.products.stock_ledger import stock_ledger
+from modules.products.pricing import price_manager
+from modules.reports.metrics_hub import metrics_hub
+
+
+class PurchaseOrderManager:
+    """Gestionnaire des commandes fournisseur et des réceptions"""
+
+    def create_order(self, supplier_id: int, lines: List[Dict], created_by: int,
+                     notes: str = None) -> tuple[bool, str, Optional[int]]:
+        """
+        Créer un bon de commande
+
+        Args:
+            supplier_id: ID du fournisseur
+            lines: Liste de {product_id, quantity, unit_cost}
+            created_by: ID de l'utilisateur
+            notes: Notes
+
+        Returns:
+            (success, message, order_id)
+        """
+        try:
+            lines = self._clean_lines(lines)
+            if not lines:
+                return False, "La commande ne contient aucune ligne valide", None
+
+            supplier = db.fetch_one("SELECT id FROM suppliers WHERE id = ? AND is_active = 1", (supplier_id,))
+            if not supplier:
+                return False, "Fournisseur introuvable", None
+
+            # Réservation du numéro hors transaction (connexion propre à la séquence)
+            order_number = self._generate_order_number()
+
+            db.begin_transaction()
+            try:
+                order_id = self._insert_order(order_number, supplier_id, lines, created_by, notes)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            logger.info(f"Commande créée: {order_number} ({len(lines)} lignes)")
+            return True, f"Commande {order_number} créée", order_id
+
+        except Exception as e:
+            error_msg = f"Erreur lors de la création de la commande: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, None
+
+    def receive_order(self, order_id: int, received_by: int, lines: List[Dict] = None,
+                      debt_amount: float = 0.0, notes: str = None) -> tuple[bool, str]:
+        """
+        Réceptionner une commande (totalement ou en partie)
+
+        Args:
+            order_id: ID de la commande
+            received_by: ID de l'utilisateur
+            lines: Liste de {item_id, quantity, unit_cost (optionnel)} ;
+                   None pour recevoir tout le reste à livrer
+            debt_amount: Part du montant reçu laissée en dette fournisseur
+            notes: Notes
+
+        Returns:
+            (success, message)
+        """
+        try:
+            db.begin_transaction()
+            try:
+                success, message = self._apply_receipt(order_id, received_by, lines, debt_amount, notes)
+                if not success:
+                    db.rollback()
+                    return False, message
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            self._notify_products(order_id)
+            logger.info(f"Réception enregistrée: commande {order_id} - {message}")
+            return True, message
+
+        except Exception as e:
+            error_msg = f"Erreur lors de la réception: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def receive_direct(self, supplier_id: int, lines: List[Dict], received_by: int,
+                       debt_amount: float = 0.0, notes: str = None) -> tuple[bool, str, Optional[int]]:
+        """
+        Réceptionner une livraison sans commande préalable
+
+        La commande est créée et soldée dans la même transaction.
+
+        Args:
+            supplier_id: ID du fournisseur
+            lines: Liste de {product_id, quantity, unit_cost}
+            received_by: ID de l'utilisateur
+            debt_amount: Part du montant laissée en dette fournisseur
+            notes: Notes
+
+        Returns:
+            (success, message, order_id)
+        """
+        try:
+            lines = self._clean_lines(lines)
+            if not lines:
+                return False, "La livraison ne contient aucune ligne valide", None
+
+            supplier = db.fetch_one("SELECT id FROM suppliers WHERE id = ? AND is_active = 1", (supplier_id,))
+            if not supplier:
+                return False, "Fournisseur introuvable", None
+
+            order_number = self._generate_order_number()
+
+            db.begin_transaction()
+            try:
+                order_id = self._insert_order(order_number, supplier_id, lines, received_by, notes)
+                success, message = self._apply_receipt(order_id, received_by, None, debt_amount, notes)
+                if not success:
+                    db.rollback()
+                    return False, message, None
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+
+            self._notify_products(order_id)
+            logger.info(f"Livraison réceptionnée: {order_number} - {message}")
+            return True, message, order_id
+
+        except Exception as e:
+            error_msg = f"Erreur lors de la réception: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg, None
+
+    def cancel_order(self, order_id: int) -> tuple[bool, str]:
+        """
+        Annuler une commande dont rien n'a encore été reçu
+
+        Returns:
+            (success, message)
+        """
+        try:
+            order = db.fetch_one("SELECT status, order_number FROM purchase_orders WHERE id = ?", (order_id,))
+            if not order:
+                return False, "Commande introuvable"
+            if order['status'] != 'ordered':
+                return False, "Seule une commande sans réception peut être annulée"
+
+            db.execute_update("UPDATE purchase_orders SET status = 'cancelled' WHERE id = ?", (order_id,))
+            logger.info(f"Commande annulée: {order['order_number']}")
+            return True, f"Commande {order['order_number']} annulée"
+
+        except Exception as e:
+            error_msg = f"Erreur lors de l'annulation: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+    def get_orders(self, supplier_id: int = None, open_only: bool = False,
+                   limit: int = 200) -> List[Dict]:
+        """
+        Liste des commandes, de la plus récente à la plus ancienne
+
+        Args:
+            supplier_id: Filtrer par fournisseur
+            open_only: Seulement les commandes en attente de livraison
+            limit: Nombre maximal de commandes
+
+        Returns:
+            Liste de commandes
+        """
+        query = """
+            SELECT po.*, s.company_name as supplier_name,
+                   (SELECT COUNT(*) FROM purchase_order_items WHERE order_id = po.id) as item_count
+            FROM purchase_orders po
+            LEFT JOIN suppliers s ON po.supplier_id = s.id
+            WHERE 1=1
+        """
+        params = []
+        if supplier_id:
+            query += " AND po.supplier_id = ?"
+            params.append(supplier_id)
+        if open_only:
+            query += " AND po.status IN ('ordered', 'partial')"
+        query += " ORDER BY po.order_date DESC, po.id DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in db.execute_query(query, tuple(params))]
+
+    def get_order(self, order_id: int) -> Optional[Dict]:
+        """
+        Commande et ses lignes
+
+        Returns:
+            Commande avec la clé 'items', ou None
+        """
+        order = db.fetch_one("""
+            SELECT po.*, s.company_name as supplier_name
+            FROM purchase_orders po
+            LEFT JOIN suppliers s ON po.supplier_id = s.id
+            WHERE po.id = ?
+        """, (order_id,))
+        if not order:
+            return None
+        result = dict(order)
+        result['items'] = self.get_order_items(order_id)
+        return result
+
+    def get_order_items(self, order_id: int) -> List[Dict]:
+        """Lignes d'une commande avec le produit"""
+        query = """
+            SELECT poi.*, p.name as product_name, p.barcode,
+                   ROUND(poi.quantity_ordered - poi.quantity_received, 3) as quantity_remaining
+            FROM purchase_order_items poi
+            LEFT JOIN products p ON poi.product_id = p.id
+            WHERE poi.order_id = ?
+            ORDER BY poi.id
+        """
+        return [dict(row) for row in db.execute_query(query, (order_id,))]
+
+    def _clean_lines(self, lines: Iterable[Dict]) -> List[Dict]:
+        """Lignes de commande valides (produit réel, quantité positive)"""
+        cleaned = []
+        for line in lines or []:
+            product_id = line.get('product_id')
+            quantity = round(float(line.get('quantity') or 0), 3)
+            if not product_id or product_id <= 0 or quantity <= 0:
+                continue
+            cleaned.append({
+                'product_id': product_id,
+                'quantity': quantity,
+                'unit_cost': max(float(line.get('unit_cost') or 0), 0.0),
+            })
+        return cleaned
+
+    def _insert_order(self, order_number: str, supplier_id: int, lines: List[Dict],
+                      created_by: int, notes: str = None) -> int:
+        """Écrire la commande et ses lignes (transaction de l'appelant)"""
+        total = round(sum(line['quantity'] * line['unit_cost'] for line in lines), 2)
+        order_id = db.execute_insert("""
+            INSERT INTO purchase_orders (
+                order_number, supplier_id, status, total_amount, created_by, notes
+            ) VALUES (?, ?, 'ordered', ?, ?, ?)
+        """, (order_number, supplier_id, total, created_by, notes))
+        db.execute_many("""
+            INSERT INTO purchase_order_items (
+                order_id, product_id, quantity_ordered, unit_cost
+            ) VALUES (?, ?, ?, ?)
+        """, [(order_id, line['product_id'], line['quantity'], line['unit_cost']) for line in lines])
+        return order_id
+
+    def _apply_receipt(self, order_id: int, received_by: int, lines: Optional[List[Dict]],
+                       debt_amount: float, notes: str = None) -> tuple[bool, str]:
+        """
+        Appliquer une réception (transaction de l'appelant)
+
+        Returns:
+            (success, message) ; en cas d'échec rien n'a été écrit
+        """
+        order = db.fetch_one(
+            "SELECT id, order_number, supplier_id, status FROM purchase_orders WHERE id = ?",
+            (order_id,)
+        )
+        if not order:
+            return False, "Commande introuvable"
+        if order['status'] not in ('ordered', 'partial'):
+            return False, "Cette commande n'est plus en attente de livraison"
+
+        items = {
+            row['id']: row for row in db.execute_query("""
+                SELECT id, product_id, quantity_ordered, quantity_received, unit_cost
+                FROM purchase_order_items
+                WHERE order_id = ?
+            """, (order_id,))
+        }
+
+        if lines is None:
+            lines = [
+                {'item_id': item_id, 'quantity': item['quantity_ordered'] - item['quantity_received']}
+                for item_id, item in items.items()
+            ]
+
+        received = []
+        for line in lines:
+            item = items.get(line.get('item_id'))
+            quantity = round(float(line.get('quantity') or 0), 3)
+            if item is None or quantity <= 0:
+                continue
+            if quantity > round(item['quantity_ordered'] - item['quantity_received'], 3):
+                return False, f"Quantité reçue supérieure au reste à livrer (ligne {item['id']})"
+            unit_cost = line.get('unit_cost')
+            unit_cost = item['unit_cost'] if unit_cost is None else max(float(unit_cost), 0.0)
+            received.append((item, quantity, unit_cost))
+
+        if not received:
+            return False, "Aucune quantité à réceptionner"
+
+        amount = round(sum(quantity * unit_cost for _, quantity, unit_cost in received), 2)
+        debt_amount = min(max(debt_amount or 0.0, 0.0), amount)
+
+        # Entrées cumulées par produit (un produit peut figurer sur plusieurs lignes)
+        intake: Dict[int, List[float]] = {}
+        for item, quantity, unit_cost in received:
+            totals = intake.setdefault(item['product_id'], [0, 0.0])
+            totals[0] += quantity
+            totals[1] += quantity * unit_cost
+
+        # Entrées en stock : le moteur de coût crée les couches et
+        # recalcule le coût moyen pondéré au coût de la réception
+        stock_ledger.record_movements([
+            {
+                'product_id': product_id,
+                'movement_type': 'restock',
+                'quantity': quantity,
+                'unit_cost': round(value / quantity, 4),
+                'source_id': order_id,
+                'notes': f"Réception {order['order_number']}",
+            }
+            for product_id, (quantity, value) in intake.items()
+        ], created_by=received_by)
+
+        # Prix d'achat = dernier coût (historisé par lot avant la mise à jour)
+        prices = [(product_id, round(value / quantity, 4)) for product_id, (quantity, value) in intake.items()]
+        price_manager.record_changes(
+            [(product_id, price, None) for product_id, price in prices],
+            received_by, f"Réception {order['order_number']}"
+        )
+        db.execute_many(
+            "UPDATE products SET purchase_price = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND purchase_price IS NOT ?",
+            [(price, product_id, price) for product_id, price in prices]
+        )
+
+        db.execute_many("""
+            UPDATE purchase_order_items
+            SET quantity_received = ROUND(quantity_received + ?, 3), unit_cost = ?
+            WHERE id = ?
+        """, [(quantity, unit_cost, item['id']) for item, quantity, unit_cost in received])
+
+        db.execute_update("""
+            UPDATE purchase_orders
+            SET received_amount = received_amount + ?,
+                received_date = CURRENT_TIMESTAMP,
+                status = CASE WHEN EXISTS (
+                    SELECT 1 FROM purchase_order_items
+                    WHERE order_id = ? AND quantity_received < quantity_ordered
+                ) THEN 'partial' ELSE 'received' END
+            WHERE id = ?
+        """, (amount, order_id, order_id))
+
+        db.execute_update("""
+            UPDATE suppliers
+            SET total_purchases = total_purchases + ?,
+                total_debt = total_debt + ?
+            WHERE id = ?
+        """, (amount, debt_amount, order['supplier_id']))
+
+        description = f"Réception {order['order_number']} ({len(received)} lignes)"
+        if notes:
+            description += f" - {notes}"
+        db.execute_insert("""
+            INSERT INTO supplier_transactions (
+                supplier_id, transaction_type, amount, description, processed_by
+            ) VALUES (?, 'purchase', ?, ?, ?)
+        """, (order['supplier_id'], amount, description, received_by))
+
+        return True, f"{len(received)} lignes réceptionnées: {amount:g} DA (dette ajoutée: {debt_amount:g} DA)"
+
+    def _notify_products(self, order_id: int):
+        """Rafraîchir les indicateurs des produits de la commande"""
+        rows = db.execute_query(
+            "SELECT DISTINCT product_id FROM purchase_order_items WHERE order_id = ?",
+            (order_id,)
+        )
+        metrics_hub.products_changed([row['product_id'] for row in rows])
+
+    def _generate_order_number(self) -> str:
+        """Numéro de commande unique (séquence 'purchase_order' préallouée par blocs)"""
+        value = sequence_generator.next_value('purchase_order', block_size=10, seed=self._next_number_seed)
+        return f"BC-{value:06d}"
+
+    def _next_number_seed(self) -> int:
+        """Première valeur de la séquence : reprendre après les numéros existants"""
+        result = db.fetch_one("""
+            SELECT MAX(CAST(SUBSTR(order_number, 4) AS INTEGER)) as last_num
+            FROM purchase_orders
+            WHERE order_number LIKE 'BC-%'
+        """)
+        return (result['last_num'] or 0) + 1 if result else 1
+
+
+# Instance globale
+purchase_order_manager = PurchaseOrderManager()
@@ -5,6 +5,7 @@ Gestionnaire de fournisseurs
 from typing import List, Optional, Dict, Any
 from database.db_manager import db
 from core.logger import logger
+from core.sequence import sequence_generator
 
 
 class SupplierManager:
@@ -386,22 +387,19 @@ class SupplierManager:
         return [dict(row) for row in results]
     
     def _generate_supplier_code(self) -> str:
-        """Générer un code fournisseur unique"""
-        # Obtenir le dernier code
-        query = "SELECT code FROM suppliers ORDER BY id DESC LIMIT 1"
+        """Générer un code fournisseur unique (séquence 'supplier' préallouée par blocs)"""
+        value = sequence_generator.next_value('supplier', block_size=10, seed=self._next_code_seed)
+        return f"FRN-{value:06d}"
+    
+    def _next_code_seed(self) -> int:
+        """Première valeur de la séquence : reprendre après les codes existants"""
+        query = """
+            SELECT MAX(CAST(SUBSTR(code, 5) AS INTEGER)) as last_num
+            FROM suppliers
+            WHERE code LIKE 'FRN-%'
+        """
         result = db.fetch_one(query)
-        
-        if result and result['code']:
-            # Extraire le numéro et incrémenter
-            try:
-                last_num = int(result['code'].replace('FRN-', ''))
-                new_num = last_num + 1
-            except:
-                new_num = 1
-        else:
-            new_num = 1
-        
-        return f"FRN-{new_num:06d}"
+        return (result['last_num'] or 0) + 1 if result else 1
 
 
 # Instance globale
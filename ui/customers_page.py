@@ -160,6 +160,57 @@ class PaymentDialog(QDialog):
         else:
             QMessageBox.critical(self, "Erreur", msg)
 
+class CreditAgingDialog(QDialog):
+    """Ancienneté des dettes clients"""
+    
+    BUCKETS = [('days_0_30', "0-30 j"), ('days_31_60', "31-60 j"),
+               ('days_61_90', "61-90 j"), ('days_90_plus', "+90 j")]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Ancienneté des dettes")
+        self.setMinimumSize(900, 500)
+        self.setup_ui()
+        
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        
+        rows = customer_manager.get_credit_aging()
+        
+        totals = {key: sum(r[key] or 0 for r in rows) for key, _ in self.BUCKETS}
+        summary = QLabel("   ".join(f"{label}: {totals[key]:g} DA" for key, label in self.BUCKETS))
+        summary.setStyleSheet("font-size: 14px; font-weight: bold; color: #2c3e50;")
+        layout.addWidget(summary)
+        
+        table = QTableWidget()
+        headers = ["Code", "Nom", "Téléphone", "Dette"] + [label for _, label in self.BUCKETS] + ["Plus ancienne"]
+        table.setColumnCount(len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.setAlternatingRowColors(True)
+        table.setRowCount(len(rows))
+        
+        for row, r in enumerate(rows):
+            table.setItem(row, 0, QTableWidgetItem(r['code'] or ''))
+            table.setItem(row, 1, QTableWidgetItem(r['full_name']))
+            table.setItem(row, 2, QTableWidgetItem(r['phone'] or ''))
+            table.setItem(row, 3, QTableWidgetItem(f"{r['current_credit']:g} DA"))
+            for column, (key, _) in enumerate(self.BUCKETS, start=4):
+                item = QTableWidgetItem(f"{r[key]:g}" if r[key] else "-")
+                if key == 'days_90_plus' and r[key]:
+                    item.setForeground(QColor("red"))
+                table.setItem(row, column, item)
+            table.setItem(row, 8, QTableWidgetItem((r['oldest_date'] or '')[:10]))
+        
+        layout.addWidget(table)
+        
+        close_btn = QPushButton("Fermer")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn)
+        
+        self.setLayout(layout)
+
 class CustomersPage(QWidget):
     """Page de gestion des clients"""
     
@@ -264,6 +315,26 @@ class CustomersPage(QWidget):
         new_btn.clicked.connect(self.open_new_dialog)
         toolbar.addWidget(new_btn)
         
+        aging_btn = QPushButton("📊 Ancienneté des dettes")
+        aging_btn.setMinimumHeight(50)
+        aging_btn.setCursor(Qt.PointingHandCursor)
+        aging_btn.setStyleSheet("""
+            QPushButton {
+                background-color: white;
+                color: #059669;
+                border: 2px solid #10b981;
+                border-radius: 12px;
+                padding: 10px 20px;
+                font-size: 14px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #ecfdf5;
+            }
+        """)
+        aging_btn.clicked.connect(lambda: CreditAgingDialog(parent=self).exec_())
+        toolbar.addWidget(aging_btn)
+        
         layout.addLayout(toolbar)
         
         # Table - Style amélioré
@@ -378,6 +449,8 @@ class CustomersPage(QWidget):
             self.load_customers()
             
     def open_edit_dialog(self, customer):
+        # La liste ne porte que les colonnes affichées : relire la fiche complète
+        customer = customer_manager.get_customer(customer['id']) or customer
         if CustomerFormDialog(customer, parent=self).exec_():
             self.load_customers()
             
@@ -5,9 +5,11 @@ Page d'accueil - Design Moderne avec Stats et Animations
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                              QPushButton, QGridLayout, QLineEdit, QFrame, 
                              QGraphicsDropShadowEffect, QScrollArea)
-from PyQt5.QtCore import Qt, pyqtSignal, QPropertyAnimation, QEasingCurve
+from PyQt5.QtCore import Qt, QObject, pyqtSignal, QPropertyAnimation, QEasingCurve
 from PyQt5.QtGui import QFont, QColor
 from datetime import datetime
+from modules.reports.metrics_hub import metrics_hub
+from core.logger import logger
 
 
 class StatCard(QFrame):
@@ -171,6 +173,16 @@ class QuickAccessButton(QPushButton):
         self.setLayout(layout)
 
 
+class MetricsBridge(QObject):
+    """Relais des compteurs du tableau de bord (thread de l'écriture -> thread de l'interface)"""
+    
+    metrics_changed = pyqtSignal(dict)
+    
+    def notify(self, metrics):
+        # Peut être appelé depuis un thread de synchronisation : le signal est mis en file
+        self.metrics_changed.emit(metrics)
+
+
 class HomePage(QWidget):
     """Page d'accueil avec design moderne"""
     
@@ -181,6 +193,11 @@ class HomePage(QWidget):
         super().__init__(parent)
         self.init_ui()
         self.load_stats()
+        
+        # Compteurs poussés par les écritures (ventes, retours, produits)
+        self.metrics_bridge = MetricsBridge(self)
+        self.metrics_bridge.metrics_changed.connect(self.apply_metrics)
+        metrics_hub.add_listener(self.metrics_bridge.notify)
     
     def init_ui(self):
         """Initialiser l'interface"""
@@ -422,50 +439,32 @@ class HomePage(QWidget):
             self.scan_input.clear()
     
     def load_stats(self):
-        """Charger les statistiques"""
+        """Charger les statistiques (compteurs tenus à jour en mémoire)"""
         try:
-            from database.db_manager import db
-            
-            # Produits en stock
-            products = db.fetch_one("SELECT COUNT(*) as count FROM products WHERE is_active = 1")
-            if products:
-                self.stat_products.update_value(str(products['count']))
-            
-            # Produits expirant bientôt (30 jours)
-            from datetime import timedelta
-            future_date = (datetime.now() + timedelta(days=30)).strftime("%Y-%m-%d")
-            expiring = db.fetch_one(f"""
-                SELECT COUNT(*) as count FROM products 
-                WHERE is_active = 1 AND expiry_date IS NOT NULL 
-                AND expiry_date <= '{future_date}' AND expiry_date >= date('now')
-            """)
-            if expiring:
-                self.stat_expiring.update_value(str(expiring['count']))
-            
-            # Ventes du jour
-            today = datetime.now().strftime("%Y-%m-%d")
-            sales = db.fetch_one(f"""
-                SELECT COALESCE(SUM(total_amount), 0) as total 
-                FROM sales 
-                WHERE DATE(sale_date) = '{today}'
-            """)
-            if sales:
-                self.stat_sales.update_value(f"{float(sales['total']):,.0f} DA")
-            
-            # Alertes stock faible (seuil = 10 par défaut)
-            alerts = db.fetch_one("""
-                SELECT COUNT(*) as count FROM products 
-                WHERE is_active = 1 AND stock_quantity <= 10
-            """)
-            if alerts:
-                self.stat_alerts.update_value(str(alerts['count']))
-                
+            self.apply_metrics(metrics_hub.get_snapshot())
         except Exception as e:
-            print(f"Erreur chargement stats: {e}")
+            logger.error(f"Erreur chargement stats: {e}")
+    
+    def apply_metrics(self, metrics):
+        """Afficher les compteurs du tableau de bord"""
+        # Ventes de la session de caisse ouverte (remise à zéro à la clôture)
+        self.stat_sales.update_value(f"{float(metrics['total_sales']):,.0f} DA")
+        self.stat_products.update_value(str(metrics['product_count']))
+        self.stat_expiring.update_value(str(metrics['expiring_count']))
+        # Stock faible = sous le stock minimum du produit
+        self.stat_alerts.update_value(str(metrics['low_stock_count']))
     
     def refresh_stats(self):
         """Rafraîchir les statistiques"""
         self.load_stats()
+    
+    def refresh(self):
+        """Rafraîchir à l'affichage de la page"""
+        self.load_stats()
+    
+    def detach(self):
+        """Se désabonner des compteurs (fermeture de la fenêtre)"""
+        metrics_hub.remove_listener(self.metrics_bridge.notify)
 
     def go_to_low_stock(self):
         """Naviguer vers la page produits filtrée par stock faible"""
@@ -5,21 +5,30 @@ Fenêtre principale de l'application
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QPushButton, QStackedWidget, QMessageBox,
                              QStatusBar, QToolBar, QComboBox, QFrame, QApplication, QShortcut)
-from PyQt5.QtCore import Qt, QTimer, QDateTime
+from PyQt5.QtCore import Qt, QTimer, QDateTime, QObject, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon, QPalette, QColor, QKeySequence, QPixmap
 from core.auth import auth_manager
 from core.logger import logger
+from modules.sales.print_spooler import print_spooler
+from modules.products.alert_scheduler import alert_scheduler
 import os
 from ui.home_page import HomePage
 from ui.pos_page import POSPage
-from ui.products_page import ProductsPage
-from ui.customers_page import CustomersPage
-from ui.suppliers_page import SuppliersPage
-from ui.reports_page import ReportsPage
-from ui.settings_page import SettingsPage
+from core.startup_timer import startup_timer
+import time
 import config
 
 
+class PrintStatusBridge(QObject):
+    """Relais des statuts d'impression (threads d'imprimante -> thread de l'interface)"""
+    
+    job_status = pyqtSignal(int, str, str)  # job_id, status, message
+    
+    def notify(self, job_id, status, message):
+        # Appelé depuis un thread d'imprimante : le signal est mis en file
+        self.job_status.emit(job_id, status, message)
+
+
 class MainWindow(QMainWindow):
     """Fenêtre principale de l'application"""
     
@@ -46,6 +55,9 @@ class MainWindow(QMainWindow):
         # Démarrer le timer pour l'horloge
         self.start_clock()
         
+        # Vérifier les alertes de stock et d'expiration
+        self.start_alert_timer()
+        
         # Appliquer le style initial
         self.apply_theme()
         
@@ -236,8 +248,14 @@ class MainWindow(QMainWindow):
             shortcut.activated.connect(lambda p=page: self.switch_page(p))
             
     def add_pages(self):
-        """Ajouter les pages au contenu"""
+        """
+        Ajouter les pages au contenu
+        
+        Seules l'accueil et la caisse sont construites à la connexion ; les
+        autres pages (et leurs modules) le sont à la première navigation.
+        """
         self.page_map = {}
+        self.page_factories = {}
         
         # Page d'accueil
         self.home_page = HomePage()
@@ -245,40 +263,70 @@ class MainWindow(QMainWindow):
         self.home_page.quick_scan.connect(self.handle_quick_scan)
         self.content_area.addWidget(self.home_page)
         self.page_map['home'] = self.home_page
+        startup_timer.mark("accueil")
         
         # Caisse (toujours disponible)
         self.pos_page = POSPage()
         self.content_area.addWidget(self.pos_page)
         self.page_map['pos'] = self.pos_page
+        startup_timer.mark("caisse")
         
         # Produits
         if auth_manager.has_permission('manage_products'):
-            products_page = ProductsPage()
-            self.content_area.addWidget(products_page)
-            self.page_map['products'] = products_page
+            self.page_factories['products'] = self._create_products_page
         
         # Clients
         if auth_manager.has_permission('view_customers'):
-            customers_page = CustomersPage()
-            self.content_area.addWidget(customers_page)
-            self.page_map['customers'] = customers_page
+            self.page_factories['customers'] = self._create_customers_page
         
         # Fournisseurs
         if auth_manager.has_permission('manage_suppliers'):
-            suppliers_page = SuppliersPage()
-            self.content_area.addWidget(suppliers_page)
-            self.page_map['suppliers'] = suppliers_page
+            self.page_factories['suppliers'] = self._create_suppliers_page
         
         # Rapports
         if auth_manager.has_permission('view_reports'):
-            reports_page = ReportsPage()
-            self.content_area.addWidget(reports_page)
-            self.page_map['reports'] = reports_page
+            self.page_factories['reports'] = self._create_reports_page
         
         # Paramètres (Accessible à tous, onglets filtrés)
-        self.settings_page = SettingsPage()
-        self.content_area.addWidget(self.settings_page)
-        self.page_map['settings'] = self.settings_page
+        self.page_factories['settings'] = self._create_settings_page
+    
+    def _create_products_page(self):
+        from ui.products_page import ProductsPage
+        return ProductsPage()
+    
+    def _create_customers_page(self):
+        from ui.customers_page import CustomersPage
+        return CustomersPage()
+    
+    def _create_suppliers_page(self):
+        from ui.suppliers_page import SuppliersPage
+        return SuppliersPage()
+    
+    def _create_reports_page(self):
+        from ui.reports_page import ReportsPage
+        return ReportsPage()
+    
+    def _create_settings_page(self):
+        from ui.settings_page import SettingsPage
+        return SettingsPage()
+    
+    def get_page(self, page_name):
+        """
+        Obtenir une page, construite à la première demande
+        
+        Returns:
+            La page, None si elle n'est pas disponible pour l'utilisateur
+        """
+        if page_name not in self.page_map:
+            factory = self.page_factories.pop(page_name, None)
+            if factory is None:
+                return None
+            started = time.perf_counter()
+            page = factory()
+            self.content_area.addWidget(page)
+            self.page_map[page_name] = page
+            logger.info(f"Page {page_name} construite en {(time.perf_counter() - started) * 1000:.0f} ms")
+        return self.page_map[page_name]
     
     def handle_quick_scan(self, barcode):
         """Gérer le scan rapide depuis l'accueil"""
@@ -297,8 +345,8 @@ class MainWindow(QMainWindow):
             actual_page = "products"
             filter_low_stock = True
             
-        if actual_page in self.page_map:
-            target_widget = self.page_map[actual_page]
+        target_widget = self.get_page(actual_page)
+        if target_widget is not None:
             self.content_area.setCurrentWidget(target_widget)
             
             # Rafraîchir les données si la page le supporte
@@ -331,6 +379,25 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.statusBar)
         self.clock_label = QLabel()
         self.statusBar.addPermanentWidget(self.clock_label)
+        
+        # Suivi des tickets en file d'impression
+        self.print_status = PrintStatusBridge(self)
+        self.print_status.job_status.connect(self.on_print_job_status)
+        print_spooler.add_listener(self.print_status.notify)
+    
+    def on_print_job_status(self, job_id, status, message):
+        """Afficher l'avancement d'un ticket dans la barre de statut"""
+        if status == 'failed':
+            self.statusBar.showMessage(f"❌ {message}")
+        elif status == 'done':
+            self.statusBar.showMessage(f"🖨️ {message}", 5000)
+        else:
+            self.statusBar.showMessage(f"🖨️ {message}")
+    
+    def closeEvent(self, event):
+        print_spooler.remove_listener(self.print_status.notify)
+        self.home_page.detach()
+        super().closeEvent(event)
     
     def start_clock(self):
         """Démarrer l'horloge"""
@@ -339,6 +406,25 @@ class MainWindow(QMainWindow):
         self.clock_timer.timeout.connect(self.update_clock)
         self.clock_timer.start(1000)
     
+    def start_alert_timer(self):
+        """Vérifier les alertes peu après l'ouverture (caisse d'abord) puis chaque minute"""
+        QTimer.singleShot(3000, self.check_alerts)
+        self.alert_timer = QTimer()
+        self.alert_timer.timeout.connect(self.check_alerts)
+        self.alert_timer.start(60 * 1000)
+    
+    def check_alerts(self):
+        """Émettre les alertes arrivées à échéance (sommet du tas, index partiel)"""
+        try:
+            alerts = alert_scheduler.run_due()
+        except Exception as e:
+            logger.error(f"Erreur vérification des alertes: {e}")
+            return
+        if len(alerts) == 1:
+            self.statusBar.showMessage(f"⚠️ {alerts[0]['message']}", 10000)
+        elif alerts:
+            self.statusBar.showMessage(f"⚠️ {len(alerts)} nouvelle(s) alerte(s) de stock", 10000)
+    
     def update_clock(self):
         current_time = QDateTime.currentDateTime()
         self.clock_label.setText(current_time.toString("dddd dd MMMM yyyy - HH:mm:ss"))
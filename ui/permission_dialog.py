@@ -55,7 +55,7 @@ class PermissionDialog(QDialog):
         
         # Group by category (simplified mapping)
         categories = {
-            "Ventes & Caisse": ["make_sales", "process_returns"],
+            "Ventes & Caisse": ["make_sales", "process_returns", "close_register"],
             "Produits & Stock": ["manage_products", "view_products", "manage_categories"],
             "Partenaires": ["manage_customers", "view_customers", "manage_suppliers", "view_suppliers"],
             "Administration": ["manage_users", "manage_settings", "view_reports", "manage_backups", "view_audit_log"]
@@ -127,6 +127,7 @@ class PermissionDialog(QDialog):
         mapping = {
             "make_sales": "Effectuer des ventes",
             "process_returns": "Effectuer des retours",
+            "close_register": "Clôturer la caisse (rapport Z)",
             "manage_products": "Gérer les produits (Ajout/Modif)",
             "view_products": "Voir les produits",
             "manage_categories": "Gérer les catégories",
@@ -47,9 +47,9 @@ class ReceiptPreviewDialog(QDialog):
         self.setLayout(layout)
         
     def print_ticket(self):
-        success, msg = printer_manager.print_receipt(self.sale_data)
+        # Le ticket part en file d'impression : suivi dans la barre d'état
+        success, msg, _ = printer_manager.submit_receipt(self.sale_data)
         if success:
-            QMessageBox.information(self, "Succès", msg)
             self.accept()
         else:
             QMessageBox.warning(self, "Erreur", msg)
@@ -58,6 +58,7 @@ from datetime import datetime
 from modules.products.product_manager import product_manager
 from modules.sales.cart import Cart
 from modules.sales.pos import pos_manager
+from modules.sales.shift import shift_manager
 from modules.customers.customer_manager import customer_manager
 from modules.sales.printer import printer_manager
 from core.auth import auth_manager
@@ -183,7 +184,9 @@ class ReturnDialog(QDialog):
             
         confirm = QMessageBox.question(self, "Confirmer", "Annuler TOTALEMENT cette vente ? Stock sera restauré.", QMessageBox.Yes | QMessageBox.No)
         if confirm == QMessageBox.Yes:
-            success, msg = pos_manager.cancel_sale(self.sale_data['id'], "Annulation utilisateur")
+            user = auth_manager.get_current_user()
+            success, msg = pos_manager.cancel_sale(self.sale_data['id'], "Annulation utilisateur",
+                                                   user['id'] if user else None)
             if success:
                 QMessageBox.information(self, "Succès", msg)
                 self.accept()
@@ -202,11 +205,8 @@ class ReturnDialog(QDialog):
             if self.items_table.item(i, 4).checkState() == Qt.Checked:
                 qty = self.items_table.cellWidget(i, 3).value()
                 if qty > 0:
-                    # Trouver l'ID produit correspondant (supposons l'ordre conservé ou on stocke l'ID)
-                    # Mieux: stocker l'ID dans UserRole
-                    # Pour simplifier ici, on utilise l'index
-                    product_id = original_items[i]['product_id']
-                    items_to_return.append({'product_id': product_id, 'quantity': qty})
+                    # La ligne de vente d'origine (l'ordre du tableau est celui des articles)
+                    items_to_return.append({'sale_item_id': original_items[i]['id'], 'quantity': qty})
         
         if not items_to_return:
             QMessageBox.warning(self, "Info", "Aucun article sélectionné ou quantité nulle")
@@ -571,7 +571,15 @@ class POSPage(QWidget):
         self.customer_combo.setEditable(True)  # Permet la recherche au clavier
         self.customer_combo.lineEdit().setPlaceholderText("🔍 Rechercher un client (optionnel)...")
         self.customer_combo.setInsertPolicy(QComboBox.NoInsert)
-        self.load_customers()
+        # Clients chargés à la saisie (recherche indexée), pas à l'ouverture
+        customer_completer = QCompleter(self.customer_combo.model(), self.customer_combo)
+        customer_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.customer_combo.setCompleter(customer_completer)
+        self.customer_search_timer = QTimer()
+        self.customer_search_timer.setSingleShot(True)
+        self.customer_search_timer.setInterval(250)
+        self.customer_search_timer.timeout.connect(self.load_customers)
+        self.customer_combo.lineEdit().textEdited.connect(self.on_customer_text_edited)
         self.customer_combo.setCurrentIndex(-1)  # Aucune sélection = champ vide
         self.customer_combo.setStyleSheet("""
             QComboBox {
@@ -784,6 +792,25 @@ class POSPage(QWidget):
         return_btn.clicked.connect(self.open_returns)
         secondary_layout.addWidget(return_btn)
         
+        # Bouton Clôture de caisse (rapport Z)
+        close_register_btn = QPushButton("🔒 Clôture")
+        close_register_btn.setMinimumHeight(55)
+        close_register_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #34495e;
+                color: white;
+                border: none;
+                border-radius: 10px;
+                font-size: 16px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #2c3e50;
+            }
+        """)
+        close_register_btn.clicked.connect(self.close_register)
+        secondary_layout.addWidget(close_register_btn)
+        
         buttons_layout.addLayout(secondary_layout)
         layout.addLayout(buttons_layout)
         
@@ -963,15 +990,33 @@ class POSPage(QWidget):
                     }
                 """)
 
+    def on_customer_text_edited(self, text):
+        """Saisie dans le champ client : relancer la recherche après une pause"""
+        self.customer_search_timer.start()
+    
     def load_customers(self):
-        """Charger la liste des clients"""
+        """Proposer les clients correspondant à la saisie"""
         try:
-            customers = customer_manager.get_all_customers()
+            line_edit = self.customer_combo.lineEdit()
+            text = line_edit.text()
+            cursor = line_edit.cursorPosition()
+            customers = customer_manager.lookup_customers(text, limit=20) if text.strip() else []
+            
+            # Remplacer les propositions sans perdre la saisie en cours
+            self.customer_combo.blockSignals(True)
+            self.customer_combo.clear()
             for customer in customers:
                 self.customer_combo.addItem(
                     f"{customer['full_name']} ({customer['code']})",
                     customer['id']
                 )
+            self.customer_combo.setCurrentIndex(-1)
+            self.customer_combo.setEditText(text)
+            line_edit.setCursorPosition(cursor)
+            self.customer_combo.blockSignals(False)
+            
+            if customers:
+                self.customer_combo.completer().complete()
         except Exception as e:
             logger.error(f"Erreur chargement clients: {e}")
     
@@ -1149,6 +1194,49 @@ class POSPage(QWidget):
         dialog = ReturnDialog(self)
         dialog.exec_()
     
+    def close_register(self):
+        """Clôturer la caisse et afficher le rapport Z"""
+        if not auth_manager.has_permission('close_register'):
+            QMessageBox.warning(self, "Accès refusé", "Vous n'avez pas la permission de clôturer la caisse")
+            return
+        
+        live = shift_manager.get_live_totals()
+        
+        counted_cash, ok = QInputDialog.getDouble(
+            self, "Clôture de caisse",
+            f"Ventes: {live['sales_count']} - {live['total_sales']:,.2f} DA\n"
+            f"Espèces attendues: {live['cash_expected']:,.2f} DA\n\n"
+            "Espèces comptées dans le tiroir:",
+            live['cash_expected'], 0, 100000000, 2
+        )
+        if not ok:
+            return
+        
+        current_user = auth_manager.get_current_user()
+        user_id = current_user['id'] if current_user else 1
+        
+        success, message, shift_id = shift_manager.close_shift(user_id, counted_cash)
+        if not success:
+            QMessageBox.warning(self, "Erreur", message)
+            return
+        
+        report = shift_manager.get_z_report(shift_id)
+        lines = [
+            f"<b>{message}</b>",
+            f"Période: {report['opened_at']} → {report['closed_at']}",
+            f"Ventes: {report['sales_count']} - {report['total_sales']:,.2f} DA",
+            f"Retours: {report['total_returns']:,.2f} DA",
+            f"Annulations: {report['cancelled_count']} - {report['cancelled_amount']:,.2f} DA",
+            f"Remises: {report['total_discounts']:,.2f} DA",
+        ]
+        lines += [f"&nbsp;&nbsp;{row['payment_method']}: {row['total']:,.2f} DA" for row in report['by_payment_method']]
+        lines += [
+            f"Espèces attendues: {report['cash_expected']:,.2f} DA",
+            f"Espèces comptées: {report['counted_cash']:,.2f} DA",
+            f"<b>Écart: {report['cash_difference']:+,.2f} DA</b>",
+        ]
+        QMessageBox.information(self, "Rapport Z", "<br>".join(lines))
+    
     def add_custom_product(self):
         """Ajouter un produit personnalisé (non référencé dans la base)"""
         dialog = QDialog(self)
@@ -1261,6 +1349,13 @@ class POSPage(QWidget):
             )
             
             if success:
+                # Ticket construit depuis le panier validé (sans relire la vente)
+                sale_data = pos_manager.get_last_receipt()
+                if sale_data:
+                    sale_data['cashier_name'] = current_user.get('full_name', 'N/A') if current_user else 'N/A'
+                    if customer_id:
+                        sale_data['customer_name'] = self.customer_combo.currentText()
+                
                 # Rafraîchir la référence du panier (car recréé dans POSManager)
                 self.cart = pos_manager.get_cart()
                 self.update_cart_display()
@@ -1269,13 +1364,17 @@ class POSPage(QWidget):
                 self.customer_combo.setCurrentIndex(-1)  # Vider le champ client
                 self.payment_method.setCurrentIndex(0)
                 
+                if not sale_id:
+                    # Vente mise en file locale : synchronisée plus tard
+                    QMessageBox.information(self, "✅ Vente enregistrée (hors ligne)",
+                        f"{message}\nElle sera transmise automatiquement à la base du magasin.")
+                
                 # Afficher l'aperçu du ticket SEULEMENT si checkbox cochée
                 if self.print_receipt_cb.isChecked():
-                    sale_data = pos_manager.get_sale(sale_id)
                     if sale_data:
                         preview = ReceiptPreviewDialog(sale_data, self)
                         preview.exec_()
-                else:
+                elif sale_id:
                     # Juste un message de succès sans impression
                     QMessageBox.information(self, "✅ Vente enregistrée", 
                         f"Vente #{message.split(':')[-1].strip()} enregistrée avec succès!")
@@ -1289,8 +1388,8 @@ class POSPage(QWidget):
 
     def refresh(self):
         """Rafraîchir les données de la page"""
+        self.customer_search_timer.stop()
         self.customer_combo.clear()
-        self.load_customers()
         self.customer_combo.setCurrentIndex(-1)  # Toujours vide par défaut
         self.barcode_input.setFocus()
 
@@ -6,12 +6,16 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QLineEdit, QTableWidget, QTableWidgetItem,
                              QComboBox, QFrame, QMessageBox, QHeaderView, QDialog,
                              QFormLayout, QSpinBox, QDoubleSpinBox, QDateEdit,
-                             QCheckBox, QTabWidget, QGroupBox, QMenu, QAbstractItemView)
-from PyQt5.QtCore import Qt, QDate
+                             QCheckBox, QTabWidget, QGroupBox, QMenu, QAbstractItemView,
+                             QRadioButton)
+from PyQt5.QtCore import Qt, QDate, QThread, pyqtSignal
 from PyQt5.QtGui import QColor, QBrush
 from modules.products.product_manager import product_manager
 from modules.suppliers.supplier_manager import supplier_manager
-from modules.reports.reorder_report import generate_reorder_report
+from modules.products.barcode_labels import label_sheet_generator, LABEL_LAYOUTS, DEFAULT_LAYOUT
+from modules.products.category_manager import category_manager
+from modules.products.pricing import price_manager, REPRICING_MODES
+from core.auth import auth_manager
 from core.logger import logger
 
 class ProductFormDialog(QDialog):
@@ -153,7 +157,10 @@ class ProductFormDialog(QDialog):
         }
         
         if self.product:
-            success, msg = product_manager.update_product(self.product['id'], **data)
+            user = auth_manager.get_current_user()
+            success, msg = product_manager.update_product(
+                self.product['id'], changed_by=user['id'] if user else None, **data
+            )
         else:
             success, msg, pid = product_manager.create_product(**data)
             
@@ -162,6 +169,257 @@ class ProductFormDialog(QDialog):
         else:
             QMessageBox.critical(self, "Erreur", msg)
 
+class LabelSheetWorker(QThread):
+    """Worker pour la génération des étiquettes en arrière-plan"""
+    finished = pyqtSignal(bool, str, str)  # success, message, chemin du PDF
+    
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+        
+    def run(self):
+        try:
+            request = self.request
+            if request.get('supplier_id'):
+                labels = label_sheet_generator.get_supplier_labels(
+                    request['supplier_id'], since=request.get('since'), copies=request.get('copies'))
+            else:
+                labels = label_sheet_generator.get_product_labels(
+                    request['product_ids'], copies=request.get('copies') or 1)
+            
+            success, msg, path = label_sheet_generator.generate_sheet(
+                labels, request.get('layout', DEFAULT_LAYOUT), skip=request.get('skip', 0))
+            self.finished.emit(success, msg, str(path) if path else "")
+        except Exception as e:
+            logger.error(f"Erreur génération étiquettes: {e}")
+            self.finished.emit(False, str(e), "")
+
+class LabelSheetDialog(QDialog):
+    """Dialogue de préparation d'une planche d'étiquettes"""
+    
+    def __init__(self, product_ids, parent=None):
+        super().__init__(parent)
+        self.product_ids = product_ids
+        self.setWindowTitle("🏷️ Étiquettes Code-barres")
+        self.setMinimumWidth(450)
+        self.setup_ui()
+        
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        
+        # Source des étiquettes
+        source_group = QGroupBox("Produits")
+        source_layout = QVBoxLayout(source_group)
+        
+        self.selection_radio = QRadioButton(f"Produits sélectionnés ({len(self.product_ids)})")
+        self.supplier_radio = QRadioButton("Livraison fournisseur")
+        source_layout.addWidget(self.selection_radio)
+        source_layout.addWidget(self.supplier_radio)
+        
+        supplier_form = QFormLayout()
+        self.supplier_combo = QComboBox()
+        for supplier in supplier_manager.get_all_suppliers():
+            self.supplier_combo.addItem(supplier['company_name'], supplier['id'])
+        supplier_form.addRow("Fournisseur:", self.supplier_combo)
+        
+        self.received_check = QCheckBox("Une étiquette par unité reçue depuis le")
+        self.received_check.setChecked(True)
+        self.since_edit = QDateEdit(QDate.currentDate())
+        self.since_edit.setCalendarPopup(True)
+        supplier_form.addRow(self.received_check, self.since_edit)
+        source_layout.addLayout(supplier_form)
+        layout.addWidget(source_group)
+        
+        if self.product_ids:
+            self.selection_radio.setChecked(True)
+        else:
+            self.selection_radio.setEnabled(False)
+            self.supplier_radio.setChecked(True)
+        if self.supplier_combo.count() == 0:
+            self.supplier_radio.setEnabled(False)
+        
+        # Mise en page
+        form = QFormLayout()
+        self.layout_combo = QComboBox()
+        for key, spec in LABEL_LAYOUTS.items():
+            self.layout_combo.addItem(spec['label'], key)
+        self.layout_combo.setCurrentIndex(self.layout_combo.findData(DEFAULT_LAYOUT))
+        form.addRow("Format:", self.layout_combo)
+        
+        self.copies_spin = QSpinBox()
+        self.copies_spin.setRange(1, 500)
+        form.addRow("Exemplaires par produit:", self.copies_spin)
+        
+        self.skip_spin = QSpinBox()
+        self.skip_spin.setRange(0, 99)
+        self.skip_spin.setToolTip("Étiquettes déjà décollées sur la première planche")
+        form.addRow("Emplacements déjà utilisés:", self.skip_spin)
+        layout.addLayout(form)
+        
+        # Boutons
+        buttons_layout = QHBoxLayout()
+        generate_btn = QPushButton("🏷️ Générer")
+        generate_btn.setDefault(True)
+        generate_btn.clicked.connect(self.accept)
+        generate_btn.setStyleSheet("background-color: #2ecc71; color: white;")
+        
+        cancel_btn = QPushButton("Annuler")
+        cancel_btn.clicked.connect(self.reject)
+        
+        buttons_layout.addWidget(cancel_btn)
+        buttons_layout.addWidget(generate_btn)
+        layout.addLayout(buttons_layout)
+        
+        self.setLayout(layout)
+        
+    def get_request(self):
+        """Paramètres de génération choisis"""
+        request = {
+            'layout': self.layout_combo.currentData(),
+            'skip': self.skip_spin.value(),
+            'copies': self.copies_spin.value(),
+        }
+        if self.supplier_radio.isChecked():
+            request['supplier_id'] = self.supplier_combo.currentData()
+            if self.received_check.isChecked():
+                request['since'] = self.since_edit.date().toString("yyyy-MM-dd")
+                request['copies'] = None
+        else:
+            request['product_ids'] = self.product_ids
+        return request
+
+class RepricingDialog(QDialog):
+    """Dialogue de modification des prix en masse"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.changes = []
+        self.setWindowTitle("💲 Modifier les Prix")
+        self.setMinimumWidth(650)
+        self.setMinimumHeight(500)
+        self.setup_ui()
+        
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        
+        form = QFormLayout()
+        self.category_combo = QComboBox()
+        self.category_combo.addItem("Toutes les catégories", None)
+        for category in category_manager.get_all_categories():
+            self.category_combo.addItem(category['name'], category['id'])
+        form.addRow("Catégorie:", self.category_combo)
+        
+        self.supplier_combo = QComboBox()
+        self.supplier_combo.addItem("Tous les fournisseurs", None)
+        for supplier in supplier_manager.get_all_suppliers():
+            self.supplier_combo.addItem(supplier['company_name'], supplier['id'])
+        form.addRow("Fournisseur:", self.supplier_combo)
+        
+        self.field_combo = QComboBox()
+        self.field_combo.addItem("Prix de vente", 'selling_price')
+        self.field_combo.addItem("Prix d'achat", 'purchase_price')
+        form.addRow("Prix à modifier:", self.field_combo)
+        
+        self.mode_combo = QComboBox()
+        for key, label in REPRICING_MODES.items():
+            self.mode_combo.addItem(label, key)
+        form.addRow("Calcul:", self.mode_combo)
+        
+        self.percentage_spin = QDoubleSpinBox()
+        self.percentage_spin.setRange(-99.99, 1000)
+        self.percentage_spin.setDecimals(2)
+        self.percentage_spin.setSuffix(" %")
+        form.addRow("Pourcentage:", self.percentage_spin)
+        
+        self.round_spin = QDoubleSpinBox()
+        self.round_spin.setRange(0, 1000)
+        self.round_spin.setDecimals(2)
+        self.round_spin.setSuffix(" DA")
+        self.round_spin.setToolTip("Arrondir au multiple supérieur (0 = au centime)")
+        form.addRow("Arrondi:", self.round_spin)
+        
+        self.reason_edit = QLineEdit()
+        self.reason_edit.setPlaceholderText("Raison (historique des prix)...")
+        form.addRow("Raison:", self.reason_edit)
+        layout.addLayout(form)
+        
+        preview_btn = QPushButton("🔍 Aperçu")
+        preview_btn.clicked.connect(self.preview)
+        layout.addWidget(preview_btn)
+        
+        self.preview_table = QTableWidget()
+        self.preview_table.setColumnCount(3)
+        self.preview_table.setHorizontalHeaderLabels(["Produit", "Ancien Prix", "Nouveau Prix"])
+        self.preview_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.preview_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.preview_table)
+        
+        self.summary_label = QLabel("")
+        layout.addWidget(self.summary_label)
+        
+        buttons_layout = QHBoxLayout()
+        cancel_btn = QPushButton("Annuler")
+        cancel_btn.clicked.connect(self.reject)
+        apply_btn = QPushButton("✅ Appliquer")
+        apply_btn.clicked.connect(self.apply)
+        apply_btn.setStyleSheet("background-color: #2ecc71; color: white;")
+        buttons_layout.addWidget(cancel_btn)
+        buttons_layout.addWidget(apply_btn)
+        layout.addLayout(buttons_layout)
+        
+        self.setLayout(layout)
+        
+    def get_parameters(self):
+        """Paramètres de calcul choisis"""
+        return {
+            'percentage': self.percentage_spin.value(),
+            'field': self.field_combo.currentData(),
+            'mode': self.mode_combo.currentData(),
+            'category_id': self.category_combo.currentData(),
+            'supplier_id': self.supplier_combo.currentData(),
+            'round_to': self.round_spin.value(),
+        }
+        
+    def preview(self):
+        try:
+            self.changes = price_manager.compute_repricing(**self.get_parameters())
+        except ValueError as e:
+            QMessageBox.warning(self, "Erreur", str(e))
+            return
+        
+        # Aperçu limité : le calcul complet est repris à l'application
+        shown = self.changes[:500]
+        self.preview_table.setRowCount(len(shown))
+        for row, change in enumerate(shown):
+            self.preview_table.setItem(row, 0, QTableWidgetItem(change['name']))
+            self.preview_table.setItem(row, 1, QTableWidgetItem(f"{change['old_price']:g} DA"))
+            self.preview_table.setItem(row, 2, QTableWidgetItem(f"{change['new_price']:g} DA"))
+        self.summary_label.setText(f"{len(self.changes)} produit(s) concerné(s)")
+        
+    def apply(self):
+        self.preview()
+        if not self.changes:
+            QMessageBox.information(self, "Information", "Aucun prix à modifier.")
+            return
+        
+        reply = QMessageBox.question(self, "Confirmation",
+                                     f"Modifier le prix de {len(self.changes)} produit(s) ?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        
+        user = auth_manager.get_current_user()
+        success, msg, _ = price_manager.apply_repricing(
+            changed_by=user['id'] if user else None,
+            reason=self.reason_edit.text() or None,
+            **self.get_parameters()
+        )
+        if success:
+            QMessageBox.information(self, "Succès", msg)
+            self.accept()
+        else:
+            QMessageBox.critical(self, "Erreur", msg)
+
 class ProductsPage(QWidget):
     """Page de gestion des produits"""
     
@@ -308,7 +566,7 @@ class ProductsPage(QWidget):
         order_btn = QPushButton("📑 Commande")
         order_btn.setMinimumHeight(50)
         order_btn.setCursor(Qt.PointingHandCursor)
-        order_btn.setToolTip("Générer une liste de commande pour le stock faible")
+        order_btn.setToolTip("Suggestions de commande selon les ventes et le stock")
         order_btn.setStyleSheet("""
             QPushButton {
                 background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
@@ -328,6 +586,54 @@ class ProductsPage(QWidget):
         order_btn.clicked.connect(self.generate_order_report)
         toolbar.addWidget(order_btn)
         
+        # Bouton Étiquettes (planche pour la sélection ou une livraison)
+        labels_btn = QPushButton("🏷️ Étiquettes")
+        labels_btn.setMinimumHeight(50)
+        labels_btn.setCursor(Qt.PointingHandCursor)
+        labels_btn.setToolTip("Imprimer les codes-barres des produits sélectionnés ou d'une livraison")
+        labels_btn.setStyleSheet("""
+            QPushButton {
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
+                    stop:0 #10b981, stop:1 #059669);
+                color: white;
+                border: none;
+                border-radius: 12px;
+                padding: 10px 20px;
+                font-size: 14px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
+                    stop:0 #059669, stop:1 #047857);
+            }
+        """)
+        labels_btn.clicked.connect(self.open_label_dialog)
+        toolbar.addWidget(labels_btn)
+        
+        # Bouton Prix (modification en masse)
+        pricing_btn = QPushButton("💲 Prix")
+        pricing_btn.setMinimumHeight(50)
+        pricing_btn.setCursor(Qt.PointingHandCursor)
+        pricing_btn.setToolTip("Modifier les prix par catégorie, fournisseur ou pourcentage")
+        pricing_btn.setStyleSheet("""
+            QPushButton {
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
+                    stop:0 #8b5cf6, stop:1 #7c3aed);
+                color: white;
+                border: none;
+                border-radius: 12px;
+                padding: 10px 20px;
+                font-size: 14px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background: qlineargradient(x1:0, y1:0, x2:1, y2:0, 
+                    stop:0 #7c3aed, stop:1 #6d28d9);
+            }
+        """)
+        pricing_btn.clicked.connect(self.open_repricing_dialog)
+        toolbar.addWidget(pricing_btn)
+        
         layout.addLayout(toolbar)
         
         # Tableau - Style amélioré
@@ -336,6 +642,7 @@ class ProductsPage(QWidget):
         self.table.setHorizontalHeaderLabels(["Code", "Nom", "Prix Vente", "Stock", "Expiration", "Promotion", "Actions"])
         self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table.customContextMenuRequested.connect(self.show_context_menu)
@@ -375,6 +682,8 @@ class ProductsPage(QWidget):
         
         self.setLayout(layout)
         
+        self.label_worker = None
+        
     def load_products(self):
         search = self.search_input.text()
         filter_mode = self.filter_combo.currentText()
@@ -413,6 +722,8 @@ class ProductsPage(QWidget):
                 item = QTableWidgetItem(str(text))
                 if bg_color:
                     item.setBackground(bg_color)
+                if i == 0:
+                    item.setData(Qt.UserRole, p['id'])
                 self.table.setItem(row, i, item)
                 
             # Boutons Actions
@@ -452,6 +763,8 @@ class ProductsPage(QWidget):
             self.load_products()
             
     def open_edit_dialog(self, product):
+        # La liste ne porte que les colonnes affichées : relire la fiche complète
+        product = product_manager.get_product(product['id']) or product
         dialog = ProductFormDialog(product, parent=self)
         if dialog.exec_():
             self.load_products()
@@ -464,69 +777,60 @@ class ProductsPage(QWidget):
 
     def print_barcode(self, product):
         """Imprimer le code-barres d'un produit"""
+        if not product.get('barcode'):
+            QMessageBox.warning(self, "Erreur", "Ce produit n'a pas de code-barres")
+            return
+        
+        self.start_label_job({'product_ids': [product['id']], 'layout': 'roll_60x35', 'copies': 1})
+    
+    def selected_product_ids(self):
+        """IDs des produits sélectionnés dans le tableau (ordre d'affichage)"""
+        rows = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        ids = []
+        for row in rows:
+            item = self.table.item(row, 0)
+            if item and item.data(Qt.UserRole):
+                ids.append(item.data(Qt.UserRole))
+        return ids
+    
+    def open_repricing_dialog(self):
+        """Ouvrir la modification des prix en masse"""
+        if RepricingDialog(self).exec_():
+            self.load_products()
+            
+    def open_label_dialog(self):
+        """Préparer une planche d'étiquettes"""
+        dialog = LabelSheetDialog(self.selected_product_ids(), parent=self)
+        if dialog.exec_():
+            self.start_label_job(dialog.get_request())
+    
+    def start_label_job(self, request):
+        """Générer les étiquettes en arrière-plan"""
+        if self.label_worker and self.label_worker.isRunning():
+            QMessageBox.information(self, "Étiquettes", "Une génération d'étiquettes est déjà en cours.")
+            return
+        
+        self.label_worker = LabelSheetWorker(request)
+        self.label_worker.finished.connect(self.on_labels_finished)
+        self.label_worker.start()
+    
+    def on_labels_finished(self, success, msg, path):
+        """Ouvrir le PDF des étiquettes"""
+        if not success:
+            QMessageBox.warning(self, "Étiquettes", msg)
+            return
+        
         try:
-            from reportlab.lib.pagesizes import mm
-            from reportlab.pdfgen import canvas
-            from reportlab.graphics.barcode import code128
-            from reportlab.lib.units import mm
             import os
             import subprocess
-            
-            barcode_value = product.get('barcode', '')
-            product_name = product.get('name', 'Produit')
-            price = product.get('selling_price', 0)
-            
-            if not barcode_value:
-                QMessageBox.warning(self, "Erreur", "Ce produit n'a pas de code-barres")
-                return
-            
-            # Créer le dossier si nécessaire
-            import config
-            barcode_dir = config.DATA_DIR / "barcodes"
-            barcode_dir.mkdir(exist_ok=True)
-            
-            # Générer le PDF
-            filename = barcode_dir / f"barcode_{barcode_value}.pdf"
-            
-            # Taille étiquette: 50mm x 30mm
-            width = 60 * mm
-            height = 35 * mm
-            
-            c = canvas.Canvas(str(filename), pagesize=(width, height))
-            
-            # Nom du produit (tronqué si trop long)
-            c.setFont("Helvetica-Bold", 8)
-            name_display = product_name[:25] + "..." if len(product_name) > 25 else product_name
-            c.drawCentredString(width/2, height - 8*mm, name_display)
-            
-            # Code-barres
-            barcode = code128.Code128(barcode_value, barWidth=0.4*mm, barHeight=12*mm)
-            barcode.drawOn(c, 5*mm, 10*mm)
-            
-            # Texte code-barres
-            c.setFont("Helvetica", 6)
-            c.drawCentredString(width/2, 6*mm, barcode_value)
-            
-            # Prix
-            c.setFont("Helvetica-Bold", 10)
-            c.drawCentredString(width/2, 2*mm, f"{price} DA")
-            
-            c.save()
-            
-            # Ouvrir le PDF
             if os.name == 'nt':
-                os.startfile(str(filename))
+                os.startfile(path)
             else:
-                subprocess.run(['xdg-open', str(filename)])
-                
-            logger.info(f"Code-barres généré: {filename}")
-            
-        except ImportError:
-            QMessageBox.warning(self, "Module manquant", 
-                "Le module 'reportlab' est requis pour l'impression des codes-barres.\n\nInstallez-le avec: pip install reportlab")
+                subprocess.Popen(['xdg-open', path])
+            logger.info(f"Étiquettes: {msg}")
         except Exception as e:
-            logger.error(f"Erreur génération code-barres: {e}")
-            QMessageBox.critical(self, "Erreur", f"Impossible de générer le code-barres: {e}")
+            logger.error(f"Erreur ouverture étiquettes: {e}")
+            QMessageBox.information(self, "Étiquettes", f"{msg}\n\nFichier: {path}")
 
     def show_context_menu(self, pos):
         menu = QMenu(self)
@@ -659,8 +963,7 @@ class ProductsPage(QWidget):
         self.load_products()
 
     def generate_order_report(self):
-        """Générer le rapport de commande"""
-        success, msg = generate_reorder_report()
-        if not success:
-            QMessageBox.warning(self, "Attention", msg)
+        """Ouvrir les suggestions de réapprovisionnement"""
+        from ui.reorder_dialog import ReorderDialog
+        ReorderDialog(parent=self).exec_()
 
@@ -8,11 +8,15 @@ from PyQt5.QtCore import Qt
 
 class PurchaseDialog(QDialog):
     """Dialogue d'ajout d'achat fournisseur"""
-    def __init__(self, supplier, supplier_manager, auth_manager, parent=None):
+    def __init__(self, supplier, supplier_manager, auth_manager, parent=None,
+                 amount=None, description=""):
         super().__init__(parent)
         self.supplier = supplier
         self.supplier_manager = supplier_manager
         self.auth_manager = auth_manager
+        # Valeurs pré-remplies (ex: suggestion de réapprovisionnement)
+        self.initial_amount = amount
+        self.initial_description = description
         self.setWindowTitle(f"Ajouter Achat: {supplier['company_name']}")
         self.setMinimumWidth(400)
         self.setup_ui()
@@ -29,7 +33,7 @@ class PurchaseDialog(QDialog):
         self.amount_spin = QDoubleSpinBox()
         self.amount_spin.setRange(0, 999999999)
         self.amount_spin.setSuffix(" DA")
-        self.amount_spin.setValue(1000)
+        self.amount_spin.setValue(self.initial_amount if self.initial_amount else 1000)
         self.amount_spin.setDecimals(2)
         
         self.debt_spin = QDoubleSpinBox()
@@ -40,6 +44,7 @@ class PurchaseDialog(QDialog):
         
         self.notes_edit = QLineEdit()
         self.notes_edit.setPlaceholderText("Description de l'achat...")
+        self.notes_edit.setText(self.initial_description)
         
         form.addRow("Montant total de l'achat:", self.amount_spin)
         form.addRow("Dette à ajouter:", self.debt_spin)
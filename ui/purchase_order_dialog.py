@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Dialogues des commandes fournisseur et de la réception de marchandises
+"""
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel,
+                             QPushButton, QLineEdit, QTableWidget, QTableWidgetItem,
+                             QDoubleSpinBox, QHeaderView, QMessageBox,
+                             QAbstractItemView)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor
+from modules.suppliers.purchase_orders import purchase_order_manager
+from modules.products.product_manager import product_manager
+from core.auth import auth_manager
+
+STATUS_LABELS = {
+    'ordered': ("Commandée", "#3498db"),
+    'partial': ("Partielle", "#f39c12"),
+    'received': ("Reçue", "#27ae60"),
+    'cancelled': ("Annulée", "#7f8c8d"),
+}
+
+
+def current_user_id() -> int:
+    user = auth_manager.get_current_user()
+    return user['id'] if user else 1
+
+
+def money_spin(value: float = 0.0) -> QDoubleSpinBox:
+    spin = QDoubleSpinBox()
+    spin.setRange(0, 999999999)
+    spin.setDecimals(2)
+    spin.setSuffix(" DA")
+    spin.setValue(value or 0.0)
+    return spin
+
+
+def quantity_spin(value: float = 0.0, minimum: float = 0.0, maximum: float = 1000000) -> QDoubleSpinBox:
+    spin = QDoubleSpinBox()
+    spin.setRange(minimum, maximum)
+    spin.setDecimals(3)
+    spin.setValue(value or 0.0)
+    return spin
+
+
+class PurchaseOrderDialog(QDialog):
+    """Saisie d'une commande (ou d'une livraison sans commande)"""
+
+    def __init__(self, supplier, parent=None, lines=None):
+        super().__init__(parent)
+        self.supplier = supplier
+        self.setWindowTitle(f"Commande: {supplier['company_name']}")
+        self.setMinimumWidth(750)
+        self.setMinimumHeight(500)
+        self.setup_ui()
+        for line in lines or []:
+            self.add_line(line['product_id'], line['name'], line['quantity'], line['unit_cost'])
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        info = QLabel(f"Fournisseur: {self.supplier['company_name']}")
+        info.setStyleSheet("font-size: 16px; font-weight: bold; color: #3498db;")
+        layout.addWidget(info)
+
+        # Ajout de produits
+        search_layout = QHBoxLayout()
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Code-barres ou nom du produit, puis Entrée...")
+        self.search_edit.returnPressed.connect(self.add_from_search)
+        search_layout.addWidget(self.search_edit)
+        add_btn = QPushButton("➕ Ajouter")
+        add_btn.clicked.connect(self.add_from_search)
+        search_layout.addWidget(add_btn)
+        layout.addLayout(search_layout)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(5)
+        self.table.setHorizontalHeaderLabels(["Produit", "Quantité", "Coût Unitaire", "Total", ""])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        layout.addWidget(self.table)
+
+        form = QFormLayout()
+        self.total_label = QLabel("0 DA")
+        self.total_label.setStyleSheet("font-weight: bold;")
+        form.addRow("Total:", self.total_label)
+        self.debt_spin = money_spin()
+        form.addRow("Dette à ajouter (réception):", self.debt_spin)
+        self.notes_edit = QLineEdit()
+        form.addRow("Notes:", self.notes_edit)
+        layout.addLayout(form)
+
+        btn_layout = QHBoxLayout()
+        order_btn = QPushButton("📝 Enregistrer la Commande")
+        order_btn.clicked.connect(self.save_order)
+        order_btn.setStyleSheet("background-color: #3498db; color: white; padding: 10px; font-weight: bold;")
+        btn_layout.addWidget(order_btn)
+
+        receive_btn = QPushButton("📦 Réceptionner Maintenant")
+        receive_btn.setToolTip("Livraison sans commande préalable : le stock est mis à jour immédiatement")
+        receive_btn.clicked.connect(self.receive_now)
+        receive_btn.setStyleSheet("background-color: #27ae60; color: white; padding: 10px; font-weight: bold;")
+        btn_layout.addWidget(receive_btn)
+
+        cancel_btn = QPushButton("Annuler")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def add_from_search(self):
+        term = self.search_edit.text().strip()
+        if not term:
+            return
+        product = product_manager.get_product_by_barcode(term)
+        if not product:
+            matches = product_manager.search_products(term)
+            if len(matches) != 1:
+                QMessageBox.information(
+                    self, "Information",
+                    "Aucun produit trouvé." if not matches else
+                    f"{len(matches)} produits correspondent, précisez la recherche."
+                )
+                return
+            product = matches[0]
+        self.add_line(product['id'], product['name'], 1, product['purchase_price'] or 0)
+        self.search_edit.clear()
+
+    def add_line(self, product_id, name, quantity, unit_cost):
+        # Produit déjà présent : augmenter la quantité
+        for row in range(self.table.rowCount()):
+            if self.table.item(row, 0).data(Qt.UserRole) == product_id:
+                spin = self.table.cellWidget(row, 1)
+                spin.setValue(spin.value() + quantity)
+                return
+
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        name_item = QTableWidgetItem(name)
+        name_item.setData(Qt.UserRole, product_id)
+        name_item.setFlags(name_item.flags() & ~Qt.ItemIsEditable)
+        self.table.setItem(row, 0, name_item)
+
+        qty_spin = quantity_spin(quantity, minimum=0.001)
+        qty_spin.valueChanged.connect(self.update_totals)
+        self.table.setCellWidget(row, 1, qty_spin)
+
+        cost_spin = money_spin(unit_cost)
+        cost_spin.valueChanged.connect(self.update_totals)
+        self.table.setCellWidget(row, 2, cost_spin)
+
+        total_item = QTableWidgetItem("")
+        total_item.setFlags(total_item.flags() & ~Qt.ItemIsEditable)
+        self.table.setItem(row, 3, total_item)
+
+        del_btn = QPushButton("🗑️")
+        del_btn.clicked.connect(lambda checked, item=name_item: self.remove_line(item))
+        self.table.setCellWidget(row, 4, del_btn)
+        self.update_totals()
+
+    def remove_line(self, name_item):
+        self.table.removeRow(name_item.row())
+        self.update_totals()
+
+    def get_lines(self):
+        return [
+            {
+                'product_id': self.table.item(row, 0).data(Qt.UserRole),
+                'quantity': self.table.cellWidget(row, 1).value(),
+                'unit_cost': self.table.cellWidget(row, 2).value(),
+            }
+            for row in range(self.table.rowCount())
+        ]
+
+    def update_totals(self):
+        total = 0.0
+        for row, line in enumerate(self.get_lines()):
+            line_total = line['quantity'] * line['unit_cost']
+            self.table.item(row, 3).setText(f"{line_total:g} DA")
+            total += line_total
+        self.total_label.setText(f"{total:g} DA")
+
+    def save_order(self):
+        lines = self.get_lines()
+        if not lines:
+            QMessageBox.warning(self, "Erreur", "Ajoutez au moins un produit")
+            return
+        success, msg, _ = purchase_order_manager.create_order(
+            self.supplier['id'], lines, current_user_id(), self.notes_edit.text() or None
+        )
+        if success:
+            QMessageBox.information(self, "Succès", msg)
+            self.accept()
+        else:
+            QMessageBox.critical(self, "Erreur", msg)
+
+    def receive_now(self):
+        lines = self.get_lines()
+        if not lines:
+            QMessageBox.warning(self, "Erreur", "Ajoutez au moins un produit")
+            return
+        success, msg, _ = purchase_order_manager.receive_direct(
+            self.supplier['id'], lines, current_user_id(),
+            self.debt_spin.value(), self.notes_edit.text() or None
+        )
+        if success:
+            QMessageBox.information(self, "Succès", msg)
+            self.accept()
+        else:
+            QMessageBox.critical(self, "Erreur", msg)
+
+
+class ReceiveOrderDialog(QDialog):
+    """Réception (totale ou partielle) d'une commande"""
+
+    def __init__(self, order_id, parent=None):
+        super().__init__(parent)
+        self.order = purchase_order_manager.get_order(order_id)
+        self.items = [item for item in self.order['items'] if item['quantity_remaining'] > 0]
+        self.setWindowTitle(f"Réception: {self.order['order_number']}")
+        self.setMinimumWidth(700)
+        self.setMinimumHeight(450)
+        self.setup_ui()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        info = QLabel(f"Commande {self.order['order_number']} - {self.order['supplier_name'] or ''}")
+        info.setStyleSheet("font-size: 16px; font-weight: bold; color: #3498db;")
+        layout.addWidget(info)
+
+        self.table = QTableWidget(len(self.items), 4)
+        self.table.setHorizontalHeaderLabels(["Produit", "Reste à Livrer", "Quantité Reçue", "Coût Unitaire"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        for row, item in enumerate(self.items):
+            self.table.setItem(row, 0, QTableWidgetItem(item['product_name'] or f"#{item['product_id']}"))
+            self.table.setItem(row, 1, QTableWidgetItem(str(item['quantity_remaining'])))
+
+            qty_spin = quantity_spin(item['quantity_remaining'], maximum=item['quantity_remaining'])
+            self.table.setCellWidget(row, 2, qty_spin)
+            self.table.setCellWidget(row, 3, money_spin(item['unit_cost']))
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        form = QFormLayout()
+        self.debt_spin = money_spin()
+        form.addRow("Dette à ajouter:", self.debt_spin)
+        self.notes_edit = QLineEdit()
+        form.addRow("Notes:", self.notes_edit)
+        layout.addLayout(form)
+
+        btn_layout = QHBoxLayout()
+        save_btn = QPushButton("📦 Valider la Réception")
+        save_btn.setDefault(True)
+        save_btn.clicked.connect(self.save)
+        save_btn.setStyleSheet("background-color: #27ae60; color: white; padding: 10px; font-weight: bold;")
+        btn_layout.addWidget(save_btn)
+
+        cancel_btn = QPushButton("Annuler")
+        cancel_btn.clicked.connect(self.reject)
+        btn_layout.addWidget(cancel_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def save(self):
+        lines = [
+            {
+                'item_id': item['id'],
+                'quantity': self.table.cellWidget(row, 2).value(),
+                'unit_cost': self.table.cellWidget(row, 3).value(),
+            }
+            for row, item in enumerate(self.items)
+        ]
+        success, msg = purchase_order_manager.receive_order(
+            self.order['id'], current_user_id(), lines,
+            self.debt_spin.value(), self.notes_edit.text() or None
+        )
+        if success:
+            QMessageBox.information(self, "Succès", msg)
+            self.accept()
+        else:
+            QMessageBox.critical(self, "Erreur", msg)
+
+
+class PurchaseOrdersDialog(QDialog):
+    """Commandes d'un fournisseur"""
+
+    def __init__(self, supplier, parent=None):
+        super().__init__(parent)
+        self.supplier = supplier
+        self.orders = []
+        self.setWindowTitle(f"Commandes: {supplier['company_name']}")
+        self.setMinimumWidth(750)
+        self.setMinimumHeight(450)
+        self.setup_ui()
+        self.load_orders()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["N°", "Date", "Statut", "Lignes", "Montant", "Reçu"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.doubleClicked.connect(self.receive_selected)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        new_btn = QPushButton("➕ Nouvelle Commande")
+        new_btn.clicked.connect(self.new_order)
+        btn_layout.addWidget(new_btn)
+
+        receive_btn = QPushButton("📦 Réceptionner")
+        receive_btn.clicked.connect(self.receive_selected)
+        btn_layout.addWidget(receive_btn)
+
+        cancel_order_btn = QPushButton("❌ Annuler la Commande")
+        cancel_order_btn.clicked.connect(self.cancel_selected)
+        btn_layout.addWidget(cancel_order_btn)
+
+        btn_layout.addStretch()
+        close_btn = QPushButton("Fermer")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+        self.setLayout(layout)
+
+    def load_orders(self):
+        self.orders = purchase_order_manager.get_orders(self.supplier['id'])
+        self.table.setRowCount(len(self.orders))
+        for row, order in enumerate(self.orders):
+            label, color = STATUS_LABELS.get(order['status'], (order['status'], "#000000"))
+            status_item = QTableWidgetItem(label)
+            status_item.setForeground(QColor(color))
+
+            self.table.setItem(row, 0, QTableWidgetItem(order['order_number']))
+            self.table.setItem(row, 1, QTableWidgetItem(str(order['order_date'])[:16]))
+            self.table.setItem(row, 2, status_item)
+            self.table.setItem(row, 3, QTableWidgetItem(str(order['item_count'])))
+            self.table.setItem(row, 4, QTableWidgetItem(f"{order['total_amount']:g} DA"))
+            self.table.setItem(row, 5, QTableWidgetItem(f"{order['received_amount']:g} DA"))
+
+    def selected_order(self):
+        row = self.table.currentRow()
+        if row < 0:
+            QMessageBox.information(self, "Information", "Sélectionnez une commande.")
+            return None
+        return self.orders[row]
+
+    def new_order(self):
+        if PurchaseOrderDialog(self.supplier, self).exec_():
+            self.load_orders()
+
+    def receive_selected(self):
+        order = self.selected_order()
+        if not order:
+            return
+        if order['status'] not in ('ordered', 'partial'):
+            QMessageBox.information(self, "Information", "Cette commande n'est plus en attente de livraison.")
+            return
+        if ReceiveOrderDialog(order['id'], self).exec_():
+            self.load_orders()
+
+    def cancel_selected(self):
+        order = self.selected_order()
+        if not order:
+            return
+        reply = QMessageBox.question(self, "Confirmation", f"Annuler la commande {order['order_number']} ?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+        success, msg = purchase_order_manager.cancel_order(order['id'])
+        if success:
+            self.load_orders()
+        else:
+            QMessageBox.warning(self, "Erreur", msg)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Dialogue de réapprovisionnement (suggestions de commande fournisseur)
+"""
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QFormLayout,
+                             QPushButton, QSpinBox, QTreeWidget, QTreeWidgetItem,
+                             QHeaderView, QMessageBox, QProgressBar)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from modules.reports.reorder_report import reorder_engine, open_file
+from modules.suppliers.supplier_manager import supplier_manager
+from core.logger import logger
+import config
+
+
+class ReorderWorker(QThread):
+    """Worker pour les calculs et exports en arrière-plan"""
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, task, *args, **kwargs):
+        super().__init__()
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        try:
+            self.finished.emit(self.task(*self.args, **self.kwargs))
+        except Exception as e:
+            logger.error(f"Erreur réapprovisionnement: {e}")
+            self.failed.emit(str(e))
+
+
+class ReorderDialog(QDialog):
+    """Dialogue des suggestions de commande"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("📑 Réapprovisionnement")
+        self.setMinimumWidth(850)
+        self.setMinimumHeight(550)
+        self.suggestions = []
+        self.groups = []
+        self.worker = None
+        self.setup_ui()
+        self.compute()
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+        stock_config = config.STOCK_CONFIG
+
+        # Paramètres de calcul
+        params_layout = QHBoxLayout()
+        form = QFormLayout()
+
+        self.window_spin = QSpinBox()
+        self.window_spin.setRange(1, 365)
+        self.window_spin.setSuffix(" jours")
+        self.window_spin.setValue(stock_config.get("reorder_window_days", 30))
+        form.addRow("Ventes des derniers:", self.window_spin)
+
+        self.lead_spin = QSpinBox()
+        self.lead_spin.setRange(0, 180)
+        self.lead_spin.setSuffix(" jours")
+        self.lead_spin.setValue(stock_config.get("reorder_lead_time_days", 7))
+        form.addRow("Délai de livraison:", self.lead_spin)
+
+        self.cover_spin = QSpinBox()
+        self.cover_spin.setRange(1, 365)
+        self.cover_spin.setSuffix(" jours")
+        self.cover_spin.setValue(stock_config.get("reorder_cover_days", 14))
+        form.addRow("Stock visé:", self.cover_spin)
+
+        params_layout.addLayout(form)
+        params_layout.addStretch()
+
+        self.compute_btn = QPushButton("🔄 Calculer")
+        self.compute_btn.clicked.connect(self.compute)
+        params_layout.addWidget(self.compute_btn, 0, Qt.AlignBottom)
+        layout.addLayout(params_layout)
+
+        # Suggestions groupées par fournisseur
+        self.tree = QTreeWidget()
+        self.tree.setColumnCount(6)
+        self.tree.setHeaderLabels(["Produit", "Stock", "Ventes/Jour", "Jours de Stock", "Qté Suggérée", "Coût Estimé"])
+        self.tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.tree)
+
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 0)
+        self.progress.setVisible(False)
+        layout.addWidget(self.progress)
+
+        self.summary_label = QLabel("")
+        layout.addWidget(self.summary_label)
+
+        # Sorties
+        btn_layout = QHBoxLayout()
+
+        self.pdf_btn = QPushButton("📄 PDF")
+        self.pdf_btn.clicked.connect(lambda: self.export(reorder_engine.export_pdf))
+        btn_layout.addWidget(self.pdf_btn)
+
+        self.csv_btn = QPushButton("📊 CSV")
+        self.csv_btn.clicked.connect(lambda: self.export(reorder_engine.export_csv))
+        btn_layout.addWidget(self.csv_btn)
+
+        self.purchase_btn = QPushButton("🛒 Commande pré-remplie")
+        self.purchase_btn.setToolTip("Préparer la commande du fournisseur sélectionné")
+        self.purchase_btn.clicked.connect(self.create_purchase)
+        btn_layout.addWidget(self.purchase_btn)
+
+        btn_layout.addStretch()
+
+        close_btn = QPushButton("Fermer")
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(close_btn)
+
+        layout.addLayout(btn_layout)
+        self.setLayout(layout)
+
+    def set_busy(self, busy):
+        """Désactiver les actions pendant un traitement"""
+        self.progress.setVisible(busy)
+        for btn in (self.compute_btn, self.pdf_btn, self.csv_btn, self.purchase_btn):
+            btn.setEnabled(not busy)
+
+    def run_task(self, task, on_finished, *args, **kwargs):
+        """Exécuter un traitement dans un thread"""
+        if self.worker and self.worker.isRunning():
+            return
+        self.set_busy(True)
+        self.worker = ReorderWorker(task, *args, **kwargs)
+        self.worker.finished.connect(on_finished)
+        self.worker.failed.connect(self.on_failed)
+        self.worker.start()
+
+    def compute(self):
+        """Calculer les suggestions"""
+        self.run_task(reorder_engine.compute_suggestions, self.on_computed,
+                      window_days=self.window_spin.value(),
+                      lead_time_days=self.lead_spin.value(),
+                      cover_days=self.cover_spin.value())
+
+    def on_computed(self, suggestions):
+        self.set_busy(False)
+        self.suggestions = suggestions
+        self.groups = reorder_engine.group_by_supplier(suggestions)
+
+        self.tree.clear()
+        for index, group in enumerate(self.groups):
+            parent = QTreeWidgetItem([f"🏢 {group['supplier_name']} ({len(group['items'])})",
+                                      "", "", "", "", f"{group['total_cost']:.2f} DA"])
+            parent.setData(0, Qt.UserRole, index)
+            font = parent.font(0)
+            font.setBold(True)
+            for column in range(6):
+                parent.setFont(column, font)
+
+            for item in group['items']:
+                days = item['days_of_cover']
+                child = QTreeWidgetItem([
+                    item['name'],
+                    f"{item['stock_quantity']:g}",
+                    f"{item['daily_sales']:g}",
+                    f"{days:g}" if days is not None else "-",
+                    str(item['suggested_quantity']),
+                    f"{item['estimated_cost']:.2f} DA",
+                ])
+                child.setData(0, Qt.UserRole, index)
+                parent.addChild(child)
+            self.tree.addTopLevelItem(parent)
+
+        # Dérouler seulement les petites listes
+        if len(suggestions) <= 500:
+            self.tree.expandAll()
+
+        total = sum(group['total_cost'] for group in self.groups)
+        self.summary_label.setText(
+            f"{len(suggestions)} produit(s) à commander chez {len(self.groups)} fournisseur(s) - "
+            f"Coût estimé: {total:.2f} DA"
+        )
+
+    def on_failed(self, message):
+        self.set_busy(False)
+        QMessageBox.critical(self, "Erreur", message)
+
+    def export(self, exporter):
+        """Exporter les suggestions (PDF ou CSV)"""
+        if not self.suggestions:
+            QMessageBox.information(self, "Information", "Aucun produit à commander.")
+            return
+        self.run_task(exporter, self.on_exported, self.suggestions)
+
+    def on_exported(self, result):
+        self.set_busy(False)
+        success, msg, path = result
+        if success:
+            open_file(path)
+        else:
+            QMessageBox.warning(self, "Attention", msg)
+
+    def create_purchase(self):
+        """Ouvrir la commande pré-remplie du fournisseur sélectionné"""
+        current = self.tree.currentItem()
+        if current is None:
+            QMessageBox.information(self, "Information", "Sélectionnez un fournisseur dans la liste.")
+            return
+
+        group = self.groups[current.data(0, Qt.UserRole)]
+        if not group['supplier_id']:
+            QMessageBox.warning(self, "Attention", "Ces produits n'ont pas de fournisseur associé.")
+            return
+
+        supplier = supplier_manager.get_supplier(group['supplier_id'])
+        if not supplier:
+            QMessageBox.warning(self, "Attention", "Fournisseur introuvable.")
+            return
+
+        from ui.purchase_order_dialog import PurchaseOrderDialog
+        purchase = reorder_engine.build_purchase(group)
+        PurchaseOrderDialog(supplier, parent=self, lines=purchase['lines']).exec_()
@@ -8,6 +8,7 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QColor, QFont
 from modules.reports.profit_report import profit_report_manager
+from modules.reports.sales_report import sales_report_manager
 from core.logger import logger
 import datetime
 
@@ -191,8 +192,9 @@ class ReportsPage(QWidget):
         
         # Onglet 3: Ventes par Utilisateur
         self.user_sales_table = QTableWidget()
-        self.user_sales_table.setColumnCount(5)
-        self.user_sales_table.setHorizontalHeaderLabels(["Utilisateur", "Rôle", "Nb Ventes", "CA Total", "Bénéfice"])
+        self.user_sales_table.setColumnCount(9)
+        self.user_sales_table.setHorizontalHeaderLabels(["Utilisateur", "Rôle", "Nb Ventes", "CA Total", "Bénéfice",
+                                                         "Panier Moyen", "Articles/min", "Annulations", "Retours"])
         self.user_sales_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
         self.user_sales_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.user_sales_table.setAlternatingRowColors(True)
@@ -207,8 +209,11 @@ class ReportsPage(QWidget):
         start = self.start_date.date().toString("yyyy-MM-dd")
         end = self.end_date.date().toString("yyyy-MM-dd")
         
+        # Toutes les analyses de la période en une lecture
+        report = profit_report_manager.get_period_report(start, end)
+        
         # 1. Global KPIs
-        stats = profit_report_manager.get_profit_by_period(start, end)
+        stats = report['summary']
         
         self.card_sales.set_value(f"{stats['total_revenue']:,.2f} DA")
         self.card_profit.set_value(f"{stats['net_profit']:,.2f} DA")
@@ -216,7 +221,7 @@ class ReportsPage(QWidget):
         self.card_count.set_value(str(stats['sale_count']))
         
         # 2. Daily Trend
-        trend = profit_report_manager.get_daily_profit_trend(start, end)
+        trend = report['trend']
         self.daily_table.setRowCount(0)
         for day in trend:
             row = self.daily_table.rowCount()
@@ -233,7 +238,7 @@ class ReportsPage(QWidget):
             self.daily_table.setItem(row, 3, profit_item)
             
         # 3. Top Products
-        products = profit_report_manager.get_profit_by_product(start, end)
+        products = report['by_product']
         self.product_table.setRowCount(0)
         for p in products:
             row = self.product_table.rowCount()
@@ -248,31 +253,8 @@ class ReportsPage(QWidget):
         self.load_sales_by_user(start, end)
 
     def load_sales_by_user(self, start_date: str, end_date: str):
-        """Charger les ventes par utilisateur"""
-        from database.db_manager import db
-        
-        query = """
-            SELECT 
-                u.id,
-                u.full_name,
-                u.role,
-                COUNT(s.id) as sale_count,
-                COALESCE(SUM(s.total_amount), 0) as total_revenue,
-                COALESCE(SUM(
-                    (SELECT SUM((si.unit_price - si.purchase_price) * si.quantity)
-                     FROM sale_items si
-                     WHERE si.sale_id = s.id)
-                ), 0) as total_profit
-            FROM users u
-            LEFT JOIN sales s ON u.id = s.cashier_id 
-                AND s.status = 'completed'
-                AND DATE(s.sale_date) BETWEEN ? AND ?
-            WHERE u.is_active = 1
-            GROUP BY u.id, u.full_name, u.role
-            ORDER BY total_revenue DESC
-        """
-        
-        results = db.execute_query(query, (start_date, end_date))
+        """Charger les performances par utilisateur"""
+        results = sales_report_manager.get_cashier_performance(start_date, end_date)
         
         self.user_sales_table.setRowCount(0)
         for user in results:
@@ -293,6 +275,11 @@ class ReportsPage(QWidget):
             else:
                 profit_item.setForeground(QColor("red"))
             self.user_sales_table.setItem(row, 4, profit_item)
+            
+            self.user_sales_table.setItem(row, 5, QTableWidgetItem(f"{user['average_basket']:.2f} DA"))
+            self.user_sales_table.setItem(row, 6, QTableWidgetItem(f"{user['items_per_minute']:g}"))
+            self.user_sales_table.setItem(row, 7, QTableWidgetItem(f"{user['void_count']} ({user['void_rate']:g}%)"))
+            self.user_sales_table.setItem(row, 8, QTableWidgetItem(f"{user['return_count']} ({user['return_rate']:g}%)"))
 
     def refresh(self):
         """Rafraîchir les données"""
@@ -12,7 +12,6 @@ from core.auth import auth_manager
 from core.logger import logger
 from database.db_manager import db
 import config
-import openpyxl
 import os
 from ui.permission_dialog import PermissionDialog
 
@@ -189,6 +188,23 @@ class SettingsPage(QWidget):
         import_group.setLayout(import_form)
         layout.addWidget(import_group)
         
+        # Section Maintenance
+        maintenance_group = QGroupBox("🔧 Maintenance")
+        maintenance_form = QFormLayout()
+        
+        maintenance_info = QLabel("Recalculez les totaux d'achats, le nombre d'achats et les points de fidélité de tous les clients à partir des ventes.")
+        maintenance_info.setStyleSheet("color: gray;")
+        maintenance_info.setWordWrap(True)
+        maintenance_form.addRow(maintenance_info)
+        
+        recompute_btn = QPushButton("🔄 Recalculer les statistiques clients")
+        recompute_btn.setStyleSheet("background-color: #8e44ad; color: white; padding: 12px; font-weight: bold; font-size: 14px;")
+        recompute_btn.clicked.connect(self.recompute_customer_stats)
+        maintenance_form.addRow(recompute_btn)
+        
+        maintenance_group.setLayout(maintenance_form)
+        layout.addWidget(maintenance_group)
+        
         # Section Réinitialisation (DANGER)
         reset_group = QGroupBox("⚠️ Zone Danger - Réinitialisation")
         reset_group.setStyleSheet("""
@@ -261,46 +277,45 @@ class SettingsPage(QWidget):
             if not filename:
                 return
 
-            wb = openpyxl.Workbook()
+            import openpyxl  # Chargé à la demande (démarrage plus rapide)
+            # Écriture seule + lecture par pages : mémoire bornée même avec
+            # des millions de lignes de vente
+            wb = openpyxl.Workbook(write_only=True)
             
             # 1. Produits
-            ws_prod = wb.active
-            ws_prod.title = "Produits"
-            products = db.execute_query("SELECT barcode, name, category, purchase_price, selling_price, stock_quantity, min_stock FROM products")
+            ws_prod = wb.create_sheet("Produits")
             ws_prod.append(["Code-barres", "Nom", "Catégorie", "PA", "PV", "Stock", "Stock Min"])
+            products = db.iter_keyset(
+                "products p LEFT JOIN categories c ON p.category_id = c.id",
+                "p.id, p.barcode, p.name, c.name AS category, p.purchase_price, "
+                "p.selling_price, p.stock_quantity, p.min_stock_level",
+                key="p.id")
             for p in products:
-                ws_prod.append([p['barcode'], p['name'], p.get('category', ''), p['purchase_price'], p['selling_price'], p['stock_quantity'], p.get('min_stock', 0)])
+                ws_prod.append([p['barcode'], p['name'], p['category'] or '', p['purchase_price'], p['selling_price'], p['stock_quantity'], p['min_stock_level'] or 0])
                 
             # 2. Ventes
             ws_sales = wb.create_sheet("Ventes")
-            sales = db.execute_query("SELECT sale_number, total_amount, payment_method, sale_date, customer_id FROM sales")
             ws_sales.append(["N° Vente", "Montant Total", "Paiement", "Date", "Client ID"])
-            for s in sales:
-                ws_sales.append([s['sale_number'], s['total_amount'], s['payment_method'], s['sale_date'], s.get('customer_id', '')])
+            for s in db.iter_keyset("sales", "id, sale_number, total_amount, payment_method, sale_date, customer_id"):
+                ws_sales.append([s['sale_number'], s['total_amount'], s['payment_method'], s['sale_date'], s['customer_id'] or ''])
 
             # 3. Détails Ventes
             ws_items = wb.create_sheet("Details_Ventes")
-            items = db.execute_query("SELECT sale_id, product_id, quantity, unit_price, total FROM sale_items")
             ws_items.append(["ID Vente", "ID Produit", "Quantité", "Prix Unitaire", "Total"])
-            for i in items:
-                ws_items.append([i['sale_id'], i['product_id'], i['quantity'], i['unit_price'], i['total']])
+            for i in db.iter_keyset("sale_items", "id, sale_id, product_id, quantity, unit_price, subtotal"):
+                ws_items.append([i['sale_id'], i['product_id'], i['quantity'], i['unit_price'], i['subtotal']])
 
             # 4. Clients
             ws_cust = wb.create_sheet("Clients")
-            customers = db.execute_query("SELECT full_name, phone, current_credit, total_purchases FROM customers")
             ws_cust.append(["Nom", "Téléphone", "Dette", "Total Achats"])
-            for c in customers:
+            for c in db.iter_keyset("customers", "id, full_name, phone, current_credit, total_purchases"):
                 ws_cust.append([c['full_name'], c['phone'], c['current_credit'], c['total_purchases']])
 
             # 5. Fournisseurs
             ws_sup = wb.create_sheet("Fournisseurs")
-            try:
-                suppliers = db.execute_query("SELECT name, phone, email, address FROM suppliers")
-                ws_sup.append(["Nom", "Téléphone", "Email", "Adresse"])
-                for sup in suppliers:
-                    ws_sup.append([sup['name'], sup.get('phone', ''), sup.get('email', ''), sup.get('address', '')])
-            except:
-                ws_sup.append(["Aucune donnée fournisseur"])
+            ws_sup.append(["Nom", "Téléphone", "Email", "Adresse"])
+            for sup in db.iter_keyset("suppliers", "id, company_name, phone, email, address"):
+                ws_sup.append([sup['company_name'], sup['phone'] or '', sup['email'] or '', sup['address'] or ''])
             
             wb.save(filename)
             logger.info(f"Sauvegarde créée: {filename}")
@@ -310,6 +325,15 @@ class SettingsPage(QWidget):
             logger.error(f"Erreur export excel: {e}")
             QMessageBox.critical(self, "Erreur", f"Échec de l'exportation: {e}")
 
+    def recompute_customer_stats(self):
+        """Recalculer les statistiques de tous les clients"""
+        from modules.customers.customer_manager import customer_manager
+        success, message = customer_manager.recompute_stats()
+        if success:
+            QMessageBox.information(self, "✅ Succès", message)
+        else:
+            QMessageBox.critical(self, "Erreur", message)
+
     def import_data(self):
         """Importer les données depuis une sauvegarde Excel"""
         reply = QMessageBox.warning(self, "⚠️ Attention", 
@@ -326,6 +350,7 @@ class SettingsPage(QWidget):
             if not filename:
                 return
 
+            import openpyxl  # Chargé à la demande (démarrage plus rapide)
             wb = openpyxl.load_workbook(filename)
             imported_counts = {}
             
@@ -433,14 +458,21 @@ class SettingsPage(QWidget):
             # Supprimer toutes les données (garder les utilisateurs et catégories)
             tables_to_clear = [
                 'sale_items',
+                'shifts',
                 'sales',
                 'customer_credit_transactions',
+                'loyalty_transactions',
+                'purchase_order_items',
+                'purchase_orders',
                 'supplier_transactions',
                 'price_history',
+                'stock_movements',
+                'stock_alerts',
                 'products',
                 'customers',
                 'suppliers',
-                'audit_log'
+                'audit_log',
+                'report_cache'
             ]
             
             for table in tables_to_clear:
@@ -449,6 +481,13 @@ class SettingsPage(QWidget):
                 except Exception as e:
                     logger.error(f"Erreur suppression {table}: {e}")
             
+            from modules.reports.report_cache import report_cache
+            report_cache.clear(persistent=False)
+            from modules.reports.metrics_hub import metrics_hub
+            metrics_hub.reload()
+            from modules.products.alert_scheduler import alert_scheduler
+            alert_scheduler.reset()
+            
             logger.info("⚠️ RÉINITIALISATION COMPLÈTE effectuée par l'utilisateur")
             QMessageBox.information(self, "✅ Réinitialisation Terminée", 
                 "Toutes les données ont été supprimées.\n\n"
@@ -597,6 +636,10 @@ class SettingsPage(QWidget):
                 else:
                     db.execute_update("INSERT INTO settings (setting_key, setting_value) VALUES (?, ?)", (key, value))
             
+            # Les en-têtes de ticket en cache seront recompilés
+            from modules.sales.receipt import receipt_generator
+            receipt_generator.invalidate_template()
+            
             QMessageBox.information(self, "Succès", "Paramètres du magasin mis à jour!")
             
         except Exception as e:
@@ -13,6 +13,7 @@ from modules.suppliers.supplier_manager import supplier_manager
 from core.auth import auth_manager
 from core.logger import logger
 from ui.purchase_dialog import PurchaseDialog
+from ui.purchase_order_dialog import PurchaseOrdersDialog
 
 class SupplierFormDialog(QDialog):
     """Dialogue d'ajout/modification de fournisseur"""
@@ -353,6 +354,12 @@ class SuppliersPage(QWidget):
             add_purchase_btn.clicked.connect(lambda checked, x=s: self.open_purchase_dialog(x))
             hbox.addWidget(add_purchase_btn)
             
+            # Commandes et réceptions de marchandises
+            orders_btn = QPushButton("📦")
+            orders_btn.setToolTip("Commandes / Réception")
+            orders_btn.clicked.connect(lambda checked, x=s: self.open_orders_dialog(x))
+            hbox.addWidget(orders_btn)
+            
             if total_debt > 0:
                 pay_btn = QPushButton("💸")
                 pay_btn.setToolTip("Régler Dette")
@@ -400,6 +407,11 @@ class SuppliersPage(QWidget):
         if PurchaseDialog(supplier, supplier_manager, auth_manager, parent=self).exec_():
             self.load_suppliers()
 
+    def open_orders_dialog(self, supplier):
+        """Ouvrir les commandes du fournisseur (les réceptions modifient ses totaux)"""
+        PurchaseOrdersDialog(supplier, parent=self).exec_()
+        self.load_suppliers()
+
     def refresh(self):
         """Rafraîchir les données"""
         self.load_suppliers()